@@ -0,0 +1,96 @@
+"""
+Rendering benchmark for streamed agent runs.
+
+Replays a synthetic run (many small text deltas and a few large tool outputs) through the
+previous rendering (one `console.print` per delta, tool outputs parsed as Markdown) and through
+each renderer of `cli_data_ai.utils.renderers`, and reports events/sec. Output goes to an
+in-memory console forced into terminal mode, so no agent, API key or database is needed.
+
+Usage:
+    poetry run python benchmarks/bench_events_stream.py [--events 20000] [--output-chars 50000]
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+from rich.console import Console
+from rich.markdown import Markdown
+from cli_data_ai.utils.renderers import RENDERERS
+
+WORDS = ["revenue", "customers", "SELECT", "growth", "the", "per", "month", "table", "churn", "average"]
+
+def synthetic_events(n_events: int, output_chars: int, tool_every: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    events = [{"type": "agent_updated", "agent": "SQL Analyst"}]
+    for i in range(n_events):
+        if tool_every and i % tool_every == tool_every - 1:
+            events.append({"type": "tool_call", "name": "sql_query_tool", "arguments": '{"query": "SELECT * FROM sales"}'})
+            rows = "\n".join(f"| {rng.randint(0, 10_000)} | {rng.choice(WORDS)} |" for _ in range(output_chars // 16))
+            events.append({"type": "tool_output", "output": f"| id | name |\n|---|---|\n{rows}"[:output_chars]})
+        else:
+            word = rng.choice(WORDS)
+            events.append({"type": "text_delta", "delta": f"{word}\n" if rng.random() < 0.05 else f"{word} "})
+    events.append({"type": "final_output", "output": "Revenue grew by 12% month over month."})
+    events.append({"type": "run_complete"})
+    return events
+
+def bench_console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, width=120)
+
+def legacy(events: list):
+    """Rendering before the renderers: every delta and tool output printed as it arrives"""
+    console = bench_console()
+    for event in events:
+        if event["type"] == "text_delta":
+            console.print(event["delta"], end="", soft_wrap=True)
+        elif event["type"] == "tool_call":
+            console.print(f"\n🛠️ Tool called: {event['name']}")
+            console.print(f"   Arguments: {event['arguments']}")
+        elif event["type"] == "tool_output":
+            console.print(Markdown(f"\n✅ Tool output: {event['output']}"))
+        elif event["type"] == "final_output":
+            console.print(Markdown(f"\n🏁 Final output:\n{event['output']}"))
+        else:
+            console.print(f"\n🔹 {event['type']}")
+
+def run_renderer(name: str):
+    def run(events: list):
+        if name == "rich":
+            renderer = RENDERERS[name](bench_console())
+        else:
+            renderer = RENDERERS[name](io.StringIO())
+        for event in events:
+            renderer.handle(event)
+        renderer.close()
+    return run
+
+def time_run(run, events: list, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run(events)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000, help="Number of synthetic events")
+    parser.add_argument("--output-chars", type=int, default=50_000, help="Size of each tool output")
+    parser.add_argument("--tool-every", type=int, default=2_000, help="One tool call and output every N events")
+    parser.add_argument("--runs", type=int, default=3, help="Number of timed runs per renderer")
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events, args.output_chars, args.tool_every)
+    candidates = {"legacy (print per event)": legacy, **{name: run_renderer(name) for name in RENDERERS}}
+
+    print(f"{len(events)} events, tool outputs of {args.output_chars} characters, median of {args.runs} runs")
+    baseline = None
+    for label, run in candidates.items():
+        seconds = statistics.median(time_run(run, events, args.runs))
+        rate = len(events) / seconds
+        baseline = baseline or rate
+        print(f"{label:<26} {seconds:8.3f}s {rate:12,.0f} events/sec ({rate / baseline:5.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Startup-time benchmark for the CLI.
+
+Measures how long `--help` takes in a fresh interpreter and checks that importing the CLI
+does not pull in the heavy dependencies, which must only be imported once an agent is selected.
+
+Usage:
+    poetry run python benchmarks/bench_startup.py [--runs 5] [--budget 1.0]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["agents", "openai", "pandas", "numpy", "sklearn", "xgboost"]
+
+def time_command(args: list, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def heavy_modules_imported() -> list:
+    code = (
+        "import sys, cli_data_ai.cli.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.strip()
+    return [m for m in output.split(",") if m]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Number of timed runs")
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum median seconds for `--help`")
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, "-c", "pass"], args.runs)
+    help_timings = time_command([sys.executable, "-m", "cli_data_ai.cli.cli", "--help"], args.runs)
+    median = statistics.median(help_timings)
+
+    print(f"interpreter startup: {statistics.median(baseline):.3f}s (median of {args.runs})")
+    print(f"data-analyst-cli --help: {median:.3f}s (median of {args.runs}, min {min(help_timings):.3f}s)")
+
+    failures = []
+    heavy = heavy_modules_imported()
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if median > args.budget:
+        failures.append(f"--help took {median:.3f}s, budget is {args.budget:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
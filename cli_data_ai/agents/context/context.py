@@ -1,20 +1,43 @@
 from pydantic import BaseModel, ConfigDict
-import pandas as pd
-from agents import RunContextWrapper
 
 class InputData(BaseModel):
     """
     Input data for the agent
     """
     database_name: str
+    database_url: str = ""  # Selects the database backend, e.g. duckdb:///... for DuckDB
     metabase_url: str
     metabase_user_name: str
     metabase_password: str
-    df: pd.DataFrame = None
+    df: object = None  # pandas DataFrame, typed loosely so importing the context does not import pandas
+    input_query: str = None  # Query that produced df, used to stream chunks when df is only a sample
+    input_rows: int = 0  # Rows returned by input_query
+    out_of_core: bool = False  # True when df is a sample of a result set too large for memory
+    memory_budget_mb: float = 1024
     trained_models: dict = {}  # Store all models by name
     trained_model: object = None  # Store the best model
+    best_model_type: str = None  # Name of trained_model, to find its artifacts
+    model_artifacts: dict = {}  # Fitted preprocessing, feature names and target classes by model name
     model_results: list = []  # Optional: store all results
     human_confirmation: bool = False
+    progress_callback: object = None  # Called as (stage, done, total, label) by long running tools
+    interactive: bool = True  # False when nobody can answer confirmation questions, e.g. in the API server
 
     class Config:
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+
+def build_context(**overrides) -> InputData:
+    """Run context of a question, from the settings"""
+    from cli_data_ai.utils.config import get_settings
+    settings = get_settings()
+    return InputData(
+        database_name=settings.DATABASE_NAME, 
+        database_url=settings.DATABASE_URL,
+        metabase_url=settings.METABASE_URL, 
+        metabase_user_name=settings.METABASE_USER_NAME, 
+        metabase_password=settings.METABASE_PASSWORD, 
+        df=None, 
+        trained_models={},
+        trained_model=None, model_results=[],
+        **overrides,
+    )
@@ -2,9 +2,11 @@ import json
 import os
 from pydantic import BaseModel
 from agents import Agent, FunctionTool, RunContextWrapper
-from cli_data_ai.tools.dashboard.metabase.tools import login_visualisation_tool, create_metabase_chart, create_metabase_dashboard, append_chart_to_metabase_dashboard
+from cli_data_ai.tools.dashboard.metabase.tools import login_visualisation_tool, create_metabase_chart, create_metabase_charts, create_metabase_dashboard, append_chart_to_metabase_dashboard, append_charts_to_metabase_dashboard
 from cli_data_ai.utils.config import get_settings
+from cli_data_ai.llm.router import model_for
 from cli_data_ai.agents.data_analysts.instructions.prompts import DASHBOARD_ANALYST_INSTRUCTIONS
+from cli_data_ai.tools.output import fetch_output
 
 def create_dashboard_analyst():
     settings = get_settings()
@@ -15,10 +17,7 @@ def create_dashboard_analyst():
         
     return Agent(
         name="Visualisation agent",
-        tools=[login_visualisation_tool, create_metabase_chart, create_metabase_dashboard, append_chart_to_metabase_dashboard],  
-        model="gpt-4.1",
+        tools=[login_visualisation_tool, create_metabase_chart, create_metabase_charts, create_metabase_dashboard, append_chart_to_metabase_dashboard, append_charts_to_metabase_dashboard, fetch_output],  
+        model=model_for("dashboard_analyst"),
         instructions=DASHBOARD_ANALYST_INSTRUCTIONS
-    )
-
-# Create the agent instance
-dashboard_analyst = create_dashboard_analyst()
\ No newline at end of file
+    )
\ No newline at end of file
@@ -34,13 +34,26 @@ Your task is to:
 
 ---
 
+4. **Fan-out Mode (several charts or independent results)**:
+   - When the request needs several queries that do not depend on each other (e.g. a dashboard with 5 charts),
+     call `sql_fan_out` ONCE with one self-contained task per query instead of calling the SQL Agent repeatedly.
+     The tasks run concurrently and each result reports its duration.
+   - Then call the Visualization Agent ONCE with all the resulting SQL strings (and chart names/types),
+     asking it to create all charts in one batch and add them to the dashboard together.
+   - If a task failed, retry only that task with the SQL Agent.
+
+---
+
 ✅ Summary Workflow:
 
-- For visual requests:
+- For a single visual request:
   1. ➤ **Call SQL Agent** to produce query.
   2. ➤ **Call Visualization Agent** with that SQL string to build a chart or update a dashboard.
+- For several charts:
+  1. ➤ **Call `sql_fan_out`** with all the independent SQL tasks.
+  2. ➤ **Call Visualization Agent** once with all the SQL strings.
 
-Always maintain this strict sequence to ensure correct collaboration between agents.
+Always produce the SQL before the visualisation to ensure correct collaboration between agents.
 """
 
 DATA_ANALYST_INSTRUCTIONS = """
@@ -53,25 +66,32 @@ You can:
 - Create, drop, update, insert, and delete records in database tables.
 
 TOOLS AND CAPABILITIES:
-- `sql_query_tool`: Run a SQL query and return up to 10 rows of results.
+- `sql_query_tool`: Run a read-only SQL query and return up to 10 rows of results. Set `keep_dataset` to true only when the full result is needed by another agent (e.g. training data for the data scientist): the tool then also returns the dataset ID of the full result. Report that ID as `dataset_id` in your output together with the query that produced it (null if none).
 - `describe_database`: List all tables and their columns.
+- `search_schema`: List only the tables relevant to a question, with their columns and join conditions. Prefer it over `describe_database` to find the tables a query needs, and raise `top_k` if a table is missing.
 - `profile_database`: Describe distinct values and types for each column.
 - `create_table`: Create a new table given a SQL CREATE TABLE statement.
 - `drop_table`: Drop an existing table by name.
 - `update_records`: Modify records using an SQL UPDATE statement.
 - `insert_record`: Add new records to a table using an SQL INSERT statement.
 - `delete_records`: Remove records from a table using a SQL DELETE statement.
+- `execute_write_batch`: Run many INSERT/UPDATE/DELETE statements in a single transaction.
+- `execute_many`: Run one parameterized statement (with `?` placeholders) for many rows in a single transaction.
+- `undo_last_change`: Revert the most recent change made by the write tools. Call it once without confirmation to see the change it would revert, then ask for human confirmation.
 - `ask_for_confirmation`: Ask for human confirmation before taking an action.
 
 REASONING RULES:
-- Before creating, updating, or deleting data, validate the table and column names using `describe_database`.
+- Before creating, updating, or deleting data, validate the table and column names using `search_schema` or `describe_database`.
 - If inserting or updating values, make sure they match expected column types and constraints.
 - After executing a query, always assess if the result is useful:
     - If the query succeeds but returns few or no rows, suspect the query might be incomplete or based on a wrong assumption.
     - In such cases, call `describe_database` or `profile_database` to improve your understanding before retrying.
 - Avoid providing final answers based on 0-result queries unless you've validated the schema and data conditions.
 - Only drop tables when explicitly asked and with caution.
-- For any action that modifies the database (drop existing tables or create new tables, delete records, update or insert records), ALWAYS ask for human confirmation using the `ask_for_confirmation` tool.
+- For any action that modifies the database (drop existing tables or create new tables, delete records, update or insert records), ALWAYS ask for human confirmation using the `ask_for_confirmation` tool. A confirmation is used up by the next write, ask again before each one.
+- For bulk edits touching more than one statement or row set, prefer `execute_write_batch` or `execute_many` over repeated single-statement tools:
+    - First call them with `dry_run=True` to report how many rows the batch would affect.
+    - Then ask for ONE human confirmation for the whole batch, summarising the dry-run counts, and run it with `dry_run=False`.
 
 Your goal is to provide clear, accurate insights or actions based on user intent and the current state of the database.
 """
@@ -94,6 +114,9 @@ DASHBOARD_ANALYST_INSTRUCTIONS = """
     "3. Determine User Intent:\n"
     "   - If the user wants a chart only, create the chart.\n"
     "   - If the user wants a new dashboard, create it and add chart(s).\n"
-    "   - If the user wants to add to an existing dashboard, locate the dashboard and append the chart(s).\n\n"
+    "   - If the user wants to add to an existing dashboard, locate the dashboard and append the chart(s).\n"
+    "4. Several Charts:\n"
+    "   - When given several SQL queries, create all the charts with one `create_metabase_charts` call and add them\n"
+    "     to the dashboard with one `append_charts_to_metabase_dashboard` call, instead of one call per chart.\n\n"
     "Be precise and efficient. Your goal is to help users gain insight from their data using the most appropriate visual tools."
 """
\ No newline at end of file
@@ -1,17 +1,26 @@
 import json
 import os
+from typing import Optional
 from pydantic import BaseModel
 from agents import Agent, FunctionTool, RunContextWrapper
-from cli_data_ai.tools.db.sqlite.tools import describe_database, profile_database, sql_query_tool, create_table, drop_table, update_records, insert_record, delete_records
+from cli_data_ai.tools.db.sqlite.tools import describe_database, search_schema, profile_database, sql_query_tool, create_table, drop_table, update_records, insert_record, delete_records, execute_write_batch, execute_many, undo_last_change
 from cli_data_ai.tools.safeguards.human_in_the_loop import ask_for_confirmation
 from cli_data_ai.utils.config import get_settings
+from cli_data_ai.llm.router import model_for
 from cli_data_ai.agents.data_analysts.instructions.prompts import DATA_ANALYST_INSTRUCTIONS
+from cli_data_ai.tools.output import fetch_output
 
 class SQLOutput(BaseModel):
     sql_query: str
     query_results: str
+    dataset_id: Optional[str] = None  # ID returned by `sql_query_tool` for the full result of sql_query
 
-def create_sql_analyst():
+READ_ONLY_TOOLS = [describe_database, search_schema, profile_database, sql_query_tool, fetch_output]
+READ_ONLY_NOTE = "\nIn this session you can only read the database: the write tools listed above are not available."
+WRITE_TOOLS = [create_table, drop_table, update_records, insert_record, delete_records, execute_write_batch, execute_many, undo_last_change, ask_for_confirmation]
+
+def create_sql_analyst(read_only: bool = False):
+    """SQL agent, without the write tools and the confirmation prompt when `read_only`"""
     settings = get_settings()
 
     # Explicitly set the environment variable from settings
@@ -20,11 +29,8 @@ def create_sql_analyst():
         
     return Agent(
         name="SQL agent",
-        tools=[describe_database, profile_database, sql_query_tool, create_table, drop_table, update_records, insert_record, delete_records, ask_for_confirmation],
-        model="gpt-4.1",
-        instructions=DATA_ANALYST_INSTRUCTIONS,
+        tools=READ_ONLY_TOOLS if read_only else READ_ONLY_TOOLS + WRITE_TOOLS,
+        model=model_for("sql_analyst"),
+        instructions=DATA_ANALYST_INSTRUCTIONS + (READ_ONLY_NOTE if read_only else ""),
         output_type=SQLOutput,
-    )
-
-# Create the agent instance
-sql_analyst = create_sql_analyst()
\ No newline at end of file
+    )
\ No newline at end of file
@@ -1,11 +1,69 @@
+import asyncio
 import json
 import os
+import time
+from typing import List
 from pydantic import BaseModel
-from agents import Agent, FunctionTool, RunContextWrapper
-from cli_data_ai.agents.data_analysts.sql_analyst import sql_analyst
-from cli_data_ai.agents.data_analysts.dashboard_analyst import dashboard_analyst
+from agents import Agent, FunctionTool, RunContextWrapper, Runner, function_tool
+from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.agents.data_analysts.sql_analyst import create_sql_analyst
+from cli_data_ai.agents.data_analysts.dashboard_analyst import create_dashboard_analyst
 from cli_data_ai.utils.config import get_settings
+from cli_data_ai.llm.router import model_for
 from cli_data_ai.agents.data_analysts.instructions.prompts import DATA_MANAGER_INSTRUCTIONS
+from cli_data_ai.tools.output import fetch_output, shape_output
+
+# Independent SQL tasks run concurrently, bounded to limit load on the LLM API and the database
+MAX_PARALLEL_SQL_TASKS = 4
+SQL_TASK_MAX_TURNS = 10
+
+def create_sql_fan_out_tool(sql_analyst: Agent):
+    """
+    Tool running several independent SQL tasks with the SQL agent at the same time.
+    `sql_analyst` should be read-only (see `create_sql_analyst`): branches cannot ask for
+    confirmation, and each runs on its own copy of the context.
+    """
+
+    @function_tool
+    @shape_output()
+    async def sql_fan_out(wrapper: RunContextWrapper[InputData], tasks: List[str]) -> str:
+        """
+        Runs several independent SQL tasks concurrently with the SQL agent, e.g. one query per chart of a dashboard.
+        Only use it for read-only tasks that do not depend on each other's results.
+
+        Args:
+            tasks: One self-contained instruction per query, e.g. "SQL query for the monthly revenue by country".
+
+        Returns:
+            A JSON object with, per task: task, sql_query, query_results, dataset_id, seconds (or error),
+            plus the total wall-clock seconds.
+        """
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_SQL_TASKS)
+
+        async def run_task(task: str) -> dict:
+            async with semaphore:
+                start = time.perf_counter()
+                # A confirmation given in one branch must not authorize another branch's writes
+                context = wrapper.context.model_copy(update={"human_confirmation": False, "interactive": False})
+                try:
+                    result = await Runner.run(sql_analyst, task, context=context, max_turns=SQL_TASK_MAX_TURNS)
+                    output = result.final_output
+                    branch = {
+                        "task": task,
+                        "sql_query": output.sql_query,
+                        "query_results": output.query_results,
+                        "dataset_id": output.dataset_id,
+                    }
+                except Exception as e:
+                    branch = {"task": task, "error": str(e)}
+                branch["seconds"] = round(time.perf_counter() - start, 2)
+                return branch
+
+        start = time.perf_counter()
+        branches = await asyncio.gather(*(run_task(task) for task in tasks))
+        return json.dumps({"tasks": branches, "total_seconds": round(time.perf_counter() - start, 2)})
+
+    return sql_fan_out
 
 def create_team():
     settings = get_settings()
@@ -13,22 +71,24 @@ def create_team():
     # Explicitly set the environment variable from settings
     if settings.OPENAI_API_KEY:
         os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+
+    sql_analyst = create_sql_analyst()
+    dashboard_analyst = create_dashboard_analyst()
         
     return Agent(
         name="Manager agent", 
-        model="gpt-4.1",
+        model=model_for("manager"),
         instructions=DATA_MANAGER_INSTRUCTIONS,
         tools=[
             sql_analyst.as_tool(
                 tool_name="sql_agent",
                 tool_description="SQL agent to inspect database and execute SQL queries",
             ),
+            create_sql_fan_out_tool(create_sql_analyst(read_only=True)),
+            fetch_output,
             dashboard_analyst.as_tool(
                 tool_name="visualisation_agent",
                 tool_description="Visualisation agent to create chart via metabase card questions as well as creating dashboards with those charts",
             )
         ]
-    )
-
-# Create the agent instance
-manager = create_team()
\ No newline at end of file
+    )
\ No newline at end of file
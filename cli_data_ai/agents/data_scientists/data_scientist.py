@@ -2,11 +2,13 @@ import json
 import os
 from pydantic import BaseModel
 from agents import Agent, FunctionTool, RunContextWrapper
-from cli_data_ai.tools.ml.tools import get_input_data, choose_model, run_model, model_card_report, feature_importance, select_best_model
+from cli_data_ai.tools.ml.tools import get_input_data, choose_model, run_model, evaluate_models, tune_model, model_card_report, feature_importance, select_best_model, score_table, register_model, refresh_model
 from cli_data_ai.agents.data_analysts.sql_analyst import create_sql_analyst
 from cli_data_ai.utils.config import get_settings
+from cli_data_ai.llm.router import model_for
 from cli_data_ai.agents.data_scientists.instructions.prompts import DATA_SCIENTIST_INSTRUCTIONS
-from cli_data_ai.agents.data_scientists.tripwires.ds_tripwires import ml_report_guardrail_naive, ml_report_guardrail_complete, MLReport
+from cli_data_ai.agents.data_scientists.tripwires.ds_tripwires import ml_report_guardrail_tiered, MLReport
+from cli_data_ai.tools.output import fetch_output
 
 def create_data_scientist():
     settings = get_settings()
@@ -27,15 +29,18 @@ def create_data_scientist():
             get_input_data, 
             choose_model, 
             run_model, 
+            evaluate_models,
+            tune_model,
             model_card_report,
             select_best_model,
-            feature_importance
+            feature_importance,
+            score_table,
+            register_model,
+            refresh_model,
+            fetch_output,
         ],  
-        model="gpt-4.1",
+        model=model_for("data_scientist"),
         instructions=DATA_SCIENTIST_INSTRUCTIONS,
-        output_guardrails=[ml_report_guardrail_complete],
+        output_guardrails=[ml_report_guardrail_tiered],
         output_type=MLReport,
-)
-
-# Create the agent instance
-data_scientist = create_data_scientist()
\ No newline at end of file
+)
\ No newline at end of file
@@ -1,3 +1,8 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
 from pydantic import BaseModel
 from agents import (
     Agent,
@@ -7,6 +12,7 @@ from agents import (
     Runner,
     output_guardrail,
 )
+from functools import lru_cache
 from typing import Optional
 
 class MLReport(BaseModel): 
@@ -20,20 +26,45 @@ class MLReportOutput(BaseModel):
     is_ml_report: bool
 
 # Implementing Guardrails
-guardrail_agent = Agent(
-    name="Guardrail check",
-    instructions="""
-    Examine the output and ensure it includes the appropriate section of an ML report:
-    - Baseline model results
-    - Best model
-    - Feature Importance (this is optional)
-    - Next steps (optional)
-    """,
-    output_type=MLReportOutput,
-)
+@lru_cache(maxsize=None)
+def guardrail_agent() -> Agent:
+    """Built on first use, the model route is read from the settings"""
+    from cli_data_ai.llm.router import model_for
+    return Agent(
+        name="Guardrail check",
+        instructions="""
+        Examine the output and ensure it includes the appropriate section of an ML report:
+        - Baseline model results
+        - Best model
+        - Feature Importance (this is optional)
+        - Next steps (optional)
+        When the model results of the run are given, also check that the models and scores in the
+        report are consistent with them (rounded values and percentages are fine).
+        """,
+        model=model_for("guardrail_agent"),
+        output_type=MLReportOutput,
+    )
 
-@output_guardrail
-async def ml_report_guardrail_naive(ctx: RunContextWrapper, agent: Agent, output: MLReport) -> GuardrailFunctionOutput:
+# Guardrail verdicts by hash of the report, so identical reports are not re-checked
+VERDICT_CACHE_SIZE = 256
+_verdict_cache = OrderedDict()
+_verdict_lock = threading.Lock()
+
+def _cached_verdict(report_hash: str):
+    with _verdict_lock:
+        verdict = _verdict_cache.get(report_hash)
+        if verdict is not None:
+            _verdict_cache.move_to_end(report_hash)
+        return verdict
+
+def _cache_verdict(report_hash: str, verdict):
+    with _verdict_lock:
+        _verdict_cache[report_hash] = verdict
+        while len(_verdict_cache) > VERDICT_CACHE_SIZE:
+            _verdict_cache.popitem(last=False)
+
+def structural_errors(output: MLReport) -> list:
+    """Deterministic checks on the presence of the report sections"""
     errors = []
 
     # Check required fields
@@ -48,6 +79,47 @@ async def ml_report_guardrail_naive(ctx: RunContextWrapper, agent: Agent, output
     if output.next_steps is not None and not output.next_steps.strip():
         errors.append("`next_steps` is present but empty.")
 
+    return errors
+
+def _mentions_score(text: str, score: float) -> bool:
+    """True if the text contains the score, either as a ratio (0.8734) or a percentage (87.34%)"""
+    for number in re.findall(r"-?\d+(?:\.\d+)?", text):
+        value = float(number)
+        if abs(value - score) < 5e-3 or abs(value - score * 100) < 0.5:
+            return True
+    return False
+
+def context_checks(ctx: RunContextWrapper, output: MLReport):
+    """
+    Validate the report against what was actually trained in this run.
+    Returns (errors, ambiguities): errors are definite failures, ambiguities
+    are claims that cannot be confirmed locally and need the LLM guardrail.
+    """
+    errors, ambiguities = [], []
+    context = ctx.context
+    model_results = getattr(context, "model_results", None) or []
+    trained_models = getattr(context, "trained_models", None) or {}
+
+    if not model_results or not trained_models:
+        return errors, ["No model results in context to validate the report against."]
+
+    best_model = output.best_model.lower()
+    if not any(name.lower() in best_model or name.replace("_", " ").lower() in best_model for name in trained_models):
+        errors.append(f"`best_model` does not name any trained model ({', '.join(trained_models)}).")
+
+    for result in model_results:
+        name = str(result.get("model", ""))
+        if name.lower() not in output.baseline_model_results.lower() and name.replace("_", " ").lower() not in output.baseline_model_results.lower():
+            ambiguities.append(f"Model `{name}` is not mentioned in `baseline_model_results`.")
+        elif "score" in result and not _mentions_score(output.baseline_model_results, float(result["score"])):
+            ambiguities.append(f"Score of `{name}` ({result['score']:.4f}) not found in `baseline_model_results`.")
+
+    return errors, ambiguities
+
+@output_guardrail
+async def ml_report_guardrail_naive(ctx: RunContextWrapper, agent: Agent, output: MLReport) -> GuardrailFunctionOutput:
+    errors = structural_errors(output)
+
     is_valid = len(errors) == 0
 
     return GuardrailFunctionOutput(
@@ -55,18 +127,62 @@ async def ml_report_guardrail_naive(ctx: RunContextWrapper, agent: Agent, output
         tripwire_triggered=not is_valid,
     )
 
-@output_guardrail
-async def ml_report_guardrail_complete(ctx: RunContextWrapper, agent: Agent, output: MLReport) -> GuardrailFunctionOutput:
-    report_summary = (
+def _report_summary(output: MLReport) -> str:
+    return (
         f"Baseline model results:\n{output.baseline_model_results}\n\n"
         f"Best model:\n{output.best_model}\n\n"
         f"Feature importance:\n{output.feature_importance or 'None'}\n\n"
         f"Next steps:\n{output.next_steps or 'None'}"
     )
 
-    result = await Runner.run(guardrail_agent, report_summary, context=ctx.context)
+def _results_summary(model_results: list) -> str:
+    """Model, type and scores of each result, without the bulky fields"""
+    keys = ("model", "type", "score", "score_std", "rows", "eliminated")
+    return json.dumps([{key: result[key] for key in keys if key in result} for result in model_results], default=str)
 
+async def _llm_verdict(ctx: RunContextWrapper, prompt: str) -> GuardrailFunctionOutput:
+    result = await Runner.run(guardrail_agent(), prompt, context=ctx.context)
     return GuardrailFunctionOutput(
         output_info=result.final_output,
         tripwire_triggered=not result.final_output.is_ml_report,  # Negate since tripwire means failure
-    )
\ No newline at end of file
+    )
+
+@output_guardrail
+async def ml_report_guardrail_complete(ctx: RunContextWrapper, agent: Agent, output: MLReport) -> GuardrailFunctionOutput:
+    return await _llm_verdict(ctx, _report_summary(output))
+
+@output_guardrail
+async def ml_report_guardrail_tiered(ctx: RunContextWrapper, agent: Agent, output: MLReport) -> GuardrailFunctionOutput:
+    """
+    Run the cheap local checks first and only escalate to the LLM guardrail when they are inconclusive.
+    Verdicts are cached by hash of the report and of the model results.
+    """
+    # The verdict also depends on the results the report is checked against
+    model_results = getattr(ctx.context, "model_results", None) or []
+    report_hash = hashlib.sha256((output.model_dump_json() + json.dumps(model_results, default=str)).encode()).hexdigest()
+    cached = _cached_verdict(report_hash)
+    if cached is not None:
+        return cached
+
+    errors = structural_errors(output)
+    ambiguities = []
+    if not errors:
+        context_errors, ambiguities = context_checks(ctx, output)
+        errors.extend(context_errors)
+
+    if errors:
+        verdict = GuardrailFunctionOutput(output_info={"tier": "local", "errors": errors}, tripwire_triggered=True)
+    elif not ambiguities:
+        verdict = GuardrailFunctionOutput(output_info={"tier": "local", "errors": "All checks passed."}, tripwire_triggered=False)
+    else:
+        # The LLM gets what the local checks could not confirm and the results to check it against
+        prompt = (
+            f"{_report_summary(output)}\n\n"
+            f"Model results of the run:\n{_results_summary(model_results)}\n\n"
+            "Issues to resolve:\n" + "\n".join(f"- {ambiguity}" for ambiguity in ambiguities)
+        )
+        verdict = await _llm_verdict(ctx, prompt)
+        verdict.output_info = {"tier": "llm", "ambiguities": ambiguities, "llm_verdict": verdict.output_info}
+
+    _cache_verdict(report_hash, verdict)
+    return verdict
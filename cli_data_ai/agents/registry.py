@@ -0,0 +1,22 @@
+from functools import lru_cache
+from importlib import import_module
+
+# Agents are referenced by "module:factory" so that neither the agent modules nor their
+# heavy dependencies (openai, pandas, sklearn, ...) are imported until an agent is selected
+AGENT_FACTORIES = {
+    "SQL Analyst": "cli_data_ai.agents.data_analysts.sql_analyst:create_sql_analyst",
+    "Data Manager": "cli_data_ai.agents.data_analysts.team:create_team",
+    "Data Scientist": "cli_data_ai.agents.data_scientists.data_scientist:create_data_scientist",
+    # Add more agents here as they become available
+}
+
+def agent_names() -> list:
+    """Names of the available agents, in display order"""
+    return list(AGENT_FACTORIES.keys())
+
+@lru_cache(maxsize=None)
+def get_agent(name: str):
+    """Import and construct the agent on first use, then return the same instance"""
+    module_path, factory_name = AGENT_FACTORIES[name].split(":")
+    factory = getattr(import_module(module_path), factory_name)
+    return factory()
@@ -1,33 +1,24 @@
 import typer
-from agents import Runner
-from cli_data_ai.agents.data_analysts.sql_analyst import sql_analyst
-from cli_data_ai.agents.data_analysts.dashboard_analyst import dashboard_analyst
-from cli_data_ai.agents.data_analysts.team import manager
-from cli_data_ai.agents.data_scientists.data_scientist import data_scientist
 import asyncio
 import os
-from cli_data_ai.utils.config import settings, get_settings
+import signal
+import sys
+from cli_data_ai.utils.config import get_settings
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.syntax import Syntax
 import json
 from cli_data_ai.memory.memory import SharedMemoryManager
-from cli_data_ai.utils.events_stream import stream_events
-from cli_data_ai.agents.context.context import InputData
-import pandas as pd
+from cli_data_ai.agents.registry import agent_names, get_agent
+from cli_data_ai.utils.threads import run_in_daemon_thread
+
+# Agents, the OpenAI Agents SDK and the data science stack are imported lazily
+# (see cli_data_ai.agents.registry) so that `--help` and the agent menu start fast
 
 app = typer.Typer(help="Data Analyst CLI", invoke_without_command=True)
 console = Console()
 
-# Define available agents
-AGENTS = {
-    "SQL Analyst": sql_analyst,
-    "Data Manager": manager,
-    "Data Scientist": data_scientist,
-    # Add more agents here as they become available
-}
-
 def clear_screen():
     """Clear the terminal screen."""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -37,16 +28,18 @@ def select_agent() -> tuple:
     Display agent selection menu and return the selected agent and its name.
     """
     console.print("\n[bold blue]Available Agents:[/bold blue]")
-    for idx, agent_name in enumerate(AGENTS.keys(), 1):
+    names = agent_names()
+    for idx, agent_name in enumerate(names, 1):
         console.print(f"{idx}. {agent_name}")
 
     while True:
         try:
             agent_idx = typer.prompt("Select an agent by number", type=int)
-            agent_names = list(AGENTS.keys())
-            if 1 <= agent_idx <= len(agent_names):
-                selected_name = agent_names[agent_idx - 1]
-                return AGENTS[selected_name], selected_name
+            if 1 <= agent_idx <= len(names):
+                selected_name = names[agent_idx - 1]
+                with console.status(f"[bold green]Loading {selected_name}...[/bold green]"):
+                    selected_agent = get_agent(selected_name)
+                return selected_agent, selected_name
             console.print("[red]Invalid selection. Please try again.[/red]")
         except ValueError:
             console.print("[red]Please enter a valid number.[/red]")
@@ -58,14 +51,64 @@ def display_help():
     console.print("  [green]help[/green]   - Show this help message")
     console.print("  [green]clear[/green]  - Clear the terminal screen")
     console.print("  [green]memory[/green] - Load previous conversation memory")
+    console.print("  [green]stats[/green]  - Show model latency/cost per agent and tool output sizes")
+    console.print("  [green]undo[/green]   - Revert the last change made to the database")
     console.print("  [green]exit[/green]   - Exit the program")
     console.print("  [green]quit[/green]   - Exit the program")
     console.print("  [green]q[/green]      - Exit the program")
+    console.print("  [green]Ctrl-C[/green] - Cancel the question being answered")
     console.print("\n[bold blue]Question Format:[/bold blue]")
     console.print("  Add [green]--s[/green] at the end of your question for streaming response")
     console.print("  Example: [dim]What are the top 5 customers? --s[/dim]")
     console.print("\n[dim]Or just type your question to get started![/dim]")
 
+def display_stats():
+    """Show the metrics of the model routes and of the tool outputs for this session."""
+    from rich.table import Table
+    from cli_data_ai.llm.router import route_metrics
+    from cli_data_ai.tools.output import output_stats
+
+    routes = Table(title="Model routes")
+    for column in ["Route", "Calls", "Failures", "Escalations", "Mean s", "Tokens in/out", "Cost $"]:
+        routes.add_column(column)
+    for route, m in route_metrics().items():
+        routes.add_row(
+            route, str(m["calls"]), str(m["failures"]), str(m["escalations"]), f"{m['mean_seconds']:.2f}",
+            f"{m['input_tokens']}/{m['output_tokens']}", f"{m['cost_usd']:.4f}",
+        )
+    console.print(routes)
+
+    from cli_data_ai.llm.cache import response_cache
+    cache = response_cache()
+    if cache is not None:
+        cache_stats = cache.stats()
+        console.print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+    outputs = Table(title="Tool outputs")
+    for column in ["Tool", "Calls", "Raw chars", "Sent chars", "Cut"]:
+        outputs.add_column(column)
+    for tool, m in output_stats().items():
+        outputs.add_row(tool, str(m["calls"]), str(m["raw_chars"]), str(m["shaped_chars"]), str(m["stored"]))
+    console.print(outputs)
+
+def undo_last():
+    """Revert the last change made by the database write tools, after confirmation."""
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.tools.db.backends import get_backend
+    from cli_data_ai.tools.db.undo import describe_change, last_change, undo_last_change
+    try:
+        backend = get_backend(build_context())
+        change = last_change(backend)
+        if change is None:
+            console.print("[yellow]Nothing to undo.[/yellow]")
+            return
+        console.print(f"\n[bold blue]Last change:[/bold blue] {describe_change(change)}")
+        if not typer.confirm("Revert it?"):
+            return
+        console.print(f"[green]✓ {undo_last_change(backend)}[/green]")
+    except Exception as e:
+        console.print(f"[red]❌ Error undoing the last change, nothing was reverted: {str(e)}[/red]")
+
 def load_memory() -> SharedMemoryManager:
     """Load conversation memory if it exists."""
     memory = SharedMemoryManager()
@@ -77,6 +120,29 @@ def load_memory() -> SharedMemoryManager:
         console.print(f"[red]❌ Error loading memory: {str(e)}[/red]")
         return SharedMemoryManager()
 
+def emit_events(agent_name: str, question: str, target: str, max_turns: int = 20):
+    """
+    Run the question with NDJSON events written to `target` ("-" for stdout or "unix:<path>")
+    instead of the formatted console output.
+    """
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.utils.events_stream import stream_events
+    from cli_data_ai.utils.renderers import event_sink
+    try:
+        renderer = event_sink(target)
+    except (ValueError, OSError) as e:
+        typer.secho(f"❌ Error: {str(e)}", fg=typer.colors.RED, bold=True, err=True)
+        raise typer.Exit(1)
+    # Events on stdout leave no room for prompts, and scheduled runs have nobody to answer them
+    context = build_context(interactive=target != "-" and sys.stdin.isatty())
+    try:
+        asyncio.run(stream_events(get_agent(agent_name), question, context=context, max_turns=max_turns, renderer=renderer))
+    except Exception:
+        # The error was already emitted as an event
+        raise typer.Exit(1)
+
+EVENTS_OPTION_HELP = "Stream NDJSON events to '-' (stdout) or 'unix:<socket path>' instead of formatted output"
+
 @app.callback()
 def main(ctx: typer.Context):
     """
@@ -101,10 +167,13 @@ def init(
     initialize(cfg)
 
 @app.command(name="ask_data_analyst")
-def ask(question: str):
+def ask(question: str, events: str = typer.Option(None, "--events", help=EVENTS_OPTION_HELP)):
     """
     Ask a natural language question to analyze your data.
     """
+    if events:
+        emit_events("SQL Analyst", question, events)
+        return
     try:        
         # Display the question in a nice panel
         console.print(Panel(
@@ -115,7 +184,8 @@ def ask(question: str):
         
         # Show a spinner while processing
         with console.status("[bold green]Analyzing your data...[/bold green]"):
-            answer = asyncio.run(Runner.run(sql_analyst, input=question))
+            from agents import Runner
+            answer = asyncio.run(Runner.run(get_agent("SQL Analyst"), input=question))
         
         # Format and display the SQL query if present
         if hasattr(answer.final_output, 'sql_query') and answer.final_output.sql_query:
@@ -141,10 +211,13 @@ def ask(question: str):
         raise typer.Exit(1)
 
 @app.command(name="ask_data_manager")
-def ask(question: str):
+def ask(question: str, events: str = typer.Option(None, "--events", help=EVENTS_OPTION_HELP)):
     """
     Ask a natural language question to visualise your data.
     """
+    if events:
+        emit_events("Data Manager", question, events)
+        return
     try:        
         # Display the question in a nice panel
         console.print(Panel(
@@ -155,7 +228,8 @@ def ask(question: str):
         
         # Show a spinner while processing
         with console.status("[bold green]Creating visualisations for your data...[/bold green]"):
-            answer = asyncio.run(Runner.run(manager, input=question))
+            from agents import Runner
+            answer = asyncio.run(Runner.run(get_agent("Data Manager"), input=question))
         
         # Format and display the SQL query if present
         if answer.final_output:
@@ -168,11 +242,93 @@ def ask(question: str):
         typer.secho(f"❌ Error: {str(e)}", fg=typer.colors.RED, bold=True)
         raise typer.Exit(1)
 
+@app.command()
+def stream(
+    question: str,
+    agent: str = typer.Option("SQL Analyst", help="Agent answering the question, e.g. 'Data Scientist'"),
+    events: str = typer.Option("-", "--events", help=EVENTS_OPTION_HELP),
+    max_turns: int = typer.Option(20, help="Maximum number of agent turns"),
+):
+    """
+    Ask any agent a question and stream the run as NDJSON events, for schedulers and dashboards.
+    """
+    if agent not in agent_names():
+        typer.secho(f"❌ Unknown agent: {agent} (available: {', '.join(agent_names())})", fg=typer.colors.RED, bold=True, err=True)
+        raise typer.Exit(1)
+    emit_events(agent, question, events, max_turns=max_turns)
+
+@app.command()
+def undo():
+    """
+    Revert the last change made to the database by the agents.
+    """
+    undo_last()
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Interface to listen on"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    max_concurrency: int = typer.Option(4, help="Maximum number of questions answered at the same time"),
+    max_queue: int = typer.Option(32, help="Maximum number of questions waiting, further requests get 429"),
+):
+    """
+    Serve the agents over HTTP and WebSocket from one warm process.
+    """
+    try:
+        import uvicorn
+        from cli_data_ai.server.app import create_app
+    except ImportError:
+        typer.secho("❌ The server needs FastAPI and uvicorn: poetry install --extras server", fg=typer.colors.RED, bold=True)
+        raise typer.Exit(1)
+    uvicorn.run(create_app(max_concurrency=max_concurrency, max_queue=max_queue), host=host, port=port)
+
+class QuestionCancelled(Exception):
+    pass
+
+async def run_cancellable(coro):
+    """Run a question as a task that Ctrl-C cancels without ending the session"""
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(coro)
+    try:
+        loop.add_signal_handler(signal.SIGINT, task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass  # No signal handlers on Windows event loops, Ctrl-C ends the session there
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if task.cancelled() and not asyncio.current_task().cancelling():
+            raise QuestionCancelled() from None
+        raise
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError):
+            pass
+
 @app.command()
 def interactive():
     """
     Start an interactive session with a data analyst agent.
     """
+    # One event loop for the whole session, so clients, caches and background tasks
+    # created while answering a question are still there for the next one
+    try:
+        asyncio.run(interactive_session())
+    except KeyboardInterrupt:
+        console.print("\n[bold green]Thank you for using Data Analyst CLI! Goodbye! 👋[/bold green]")
+
+def prefetch(agent_name: str, previous_tasks: list = None) -> list:
+    """Start the background warm-up for the agent (see utils.prefetch), replacing the previous one"""
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.utils.prefetch import cancel_prefetch, start_prefetch
+    cancel_prefetch(previous_tasks or [])
+    try:
+        return start_prefetch(agent_name, build_context())
+    except Exception:
+        # Missing settings are reported when the first question is asked
+        return []
+
+async def interactive_session():
     console.print(Panel(
         "[bold green]Welcome to Data Analyst CLI Interactive Mode![/bold green]\n"
         "You can ask questions about your data and get AI-powered analysis.",
@@ -180,16 +336,22 @@ def interactive():
     ))
     
     # Initial agent selection
-    selected_agent, agent_name = select_agent()
+    selected_agent, agent_name = await run_in_daemon_thread(select_agent)
     console.print(f"\nSelected agent: [bold blue]{agent_name}[/bold blue]")
+    # Warm the schema catalog, connections and logins while the user types the first question
+    prefetch_tasks = prefetch(agent_name)
     display_help()
 
     # Initialize memory
     memory = SharedMemoryManager()
 
+    from agents import Runner
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.utils.events_stream import stream_events
+
     while True:
         try:
-            question = typer.prompt("\n>>")
+            question = await run_in_daemon_thread(typer.prompt, "\n>>")
             question = question.strip()
             
             # Check for streaming marker
@@ -207,8 +369,9 @@ def interactive():
                 break
             elif question.lower() == "switch":
                 console.print("\n[bold blue]Switching agent...[/bold blue]")
-                selected_agent, agent_name = select_agent()
+                selected_agent, agent_name = await run_in_daemon_thread(select_agent)
                 console.print(f"\nSwitched to agent: [bold blue]{agent_name}[/bold blue]")
+                prefetch_tasks = prefetch(agent_name, prefetch_tasks)
                 display_help()
                 continue
             elif question.lower() == "help":
@@ -226,6 +389,12 @@ def interactive():
             elif question.lower() == "memory":
                 memory = load_memory()
                 continue
+            elif question.lower() == "stats":
+                display_stats()
+                continue
+            elif question.lower() == "undo":
+                await run_in_daemon_thread(undo_last)
+                continue
 
             # Display the question in a nice panel
             console.print(Panel(
@@ -237,24 +406,16 @@ def interactive():
             memory.append_user(question)
             question = memory.get_chat_input()
 
-            data_context = InputData(
-                database_name=settings.DATABASE_NAME, 
-                metabase_url=settings.METABASE_URL, 
-                metabase_user_name=settings.METABASE_USER_NAME, 
-                metabase_password=settings.METABASE_PASSWORD, 
-                df=pd.DataFrame(), 
-                trained_models={},
-                trained_model=None, model_results=[]
-            )
+            data_context = build_context()
             max_turns = 20
 
             if is_streaming:
-                asyncio.run(stream_events(selected_agent, question, context=data_context, max_turns=max_turns))
+                await run_cancellable(stream_events(selected_agent, question, context=data_context, max_turns=max_turns))
                 continue
             
             # Show a spinner while processing
             with console.status(f"[bold green]{agent_name} is analyzing your data...[/bold green]"):
-                answer = asyncio.run(Runner.run(selected_agent, input=question, context=data_context, max_turns=max_turns))
+                answer = await run_cancellable(Runner.run(selected_agent, input=question, context=data_context, max_turns=max_turns))
             
             # Format and display the SQL query if present
             if hasattr(answer.final_output, 'sql_query') and answer.final_output.sql_query and agent_name == "SQL Analyst":
@@ -319,6 +480,12 @@ def interactive():
                 else:
                     memory.append_assistant(str(answer.final_output))
 
+        except QuestionCancelled:
+            console.print("\n[yellow]Question cancelled.[/yellow]")
+        except typer.Abort:
+            # End of input (Ctrl-D) at the prompt
+            console.print("\n[bold green]Thank you for using Data Analyst CLI! Goodbye! 👋[/bold green]")
+            break
         except Exception as e:
             console.print(f"\n[red]❌ Error: {str(e)}[/red]")
             console.print("[yellow]You can try asking your question differently or type 'help' for available commands.[/yellow]")
@@ -0,0 +1,169 @@
+"""
+Disk-backed cache of model responses.
+
+With `LLM_CACHE=true` in the settings, every model call is keyed by a hash of the model name,
+the instructions, the input items (conversation, tool calls and tool outputs), the model
+settings, the tool and output schemas, the handoffs and any other argument of the call but the
+tracing configuration. Arguments are bound by name against the wrapped model's signature, so
+the key does not depend on how the SDK passes them. A call whose key was answered less than
+`LLM_CACHE_TTL_SECONDS` ago returns the stored response without calling the API, so replayed
+sessions and repeated scheduled runs skip the network. Streamed calls store and replay their
+events.
+
+Responses are stored pickled in a SQLite file (`LLM_CACHE_PATH`). The cache is meant for
+development and replays: a cached answer is returned even if the model would now answer
+differently.
+"""
+import dataclasses
+import hashlib
+import inspect
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from agents import Model, ModelResponse
+
+CACHE_TABLE = "responses"
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return str(value)
+
+def _tool_schema(tool) -> dict:
+    return {
+        "name": getattr(tool, "name", type(tool).__name__),
+        "parameters": getattr(tool, "params_json_schema", None),
+    }
+
+def _output_schema(output_schema):
+    if output_schema is None:
+        return None
+    try:
+        return output_schema.json_schema()
+    except Exception:
+        # Plain text output
+        return str(output_schema)
+
+KEYED_ARGUMENTS = ("system_instructions", "input", "model_settings", "tools", "output_schema", "handoffs")
+UNKEYED_ARGUMENTS = ("tracing",)  # Do not change the answer
+
+def call_arguments(method, args: tuple, kwargs: dict) -> dict:
+    """Arguments of a call to `method` by parameter name, whether passed by position or keyword"""
+    bound = inspect.signature(method).bind(*args, **kwargs)
+    return dict(bound.arguments)
+
+def cache_key(model_name: str, mode: str, arguments: dict) -> str:
+    """sha256 of everything the answer of the model depends on, `arguments` as of `call_arguments`"""
+    payload = {
+        "model": model_name,
+        "mode": mode,
+        "instructions": arguments.get("system_instructions"),
+        "input": arguments.get("input"),
+        "settings": arguments.get("model_settings"),
+        "tools": [_tool_schema(tool) for tool in arguments.get("tools") or []],
+        "output_schema": _output_schema(arguments.get("output_schema")),
+        "handoffs": [getattr(handoff, "tool_name", str(handoff)) for handoff in arguments.get("handoffs") or []],
+        # e.g. previous_response_id, and arguments added by later SDK releases
+        "other": {
+            name: value for name, value in arguments.items()
+            if name not in KEYED_ARGUMENTS and name not in UNKEYED_ARGUMENTS
+        },
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (key TEXT PRIMARY KEY, created REAL, value BLOB);")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, key: str):
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute(f"SELECT created, value FROM {CACHE_TABLE} WHERE key = ?;", (key,)).fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            if row is None or time.time() - row[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(row[1])
+
+    def put(self, key: str, value):
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {CACHE_TABLE} (key, created, value) VALUES (?, ?, ?);",
+                (key, time.time(), pickle.dumps(value)),
+            )
+            # Expired entries are removed as new ones come in
+            conn.execute(f"DELETE FROM {CACHE_TABLE} WHERE created < ?;", (time.time() - self.ttl_seconds,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class CachedModel(Model):
+    """Answers from the cache when the same call was made before, otherwise calls the model"""
+    def __init__(self, name: str, model: Model, cache: ResponseCache):
+        self.name = name
+        self.model = model
+        self.cache = cache
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        key = cache_key(self.name, "response", call_arguments(self.model.get_response, args, kwargs))
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        response = await self.model.get_response(*args, **kwargs)
+        self.cache.put(key, response)
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        key = cache_key(self.name, "stream", call_arguments(self.model.stream_response, args, kwargs))
+        events = self.cache.get(key)
+        if events is not None:
+            for event in events:
+                yield event
+            return
+        events = []
+        async for event in self.model.stream_response(*args, **kwargs):
+            events.append(event)
+            yield event
+        # Only complete streams are stored
+        self.cache.put(key, events)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def response_cache():
+    """The cache configured in the settings, None when it is disabled"""
+    global _cache
+    from cli_data_ai.utils.config import get_settings
+    settings = get_settings()
+    if not settings.LLM_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(settings.LLM_CACHE_PATH, settings.LLM_CACHE_TTL_SECONDS)
+        return _cache
@@ -0,0 +1,222 @@
+"""
+Model routing per agent.
+
+Each agent role is served by a model tier: "large" for the agents writing SQL and driving the
+analysis, "small" for the visualisation agent and the guardrail, whose steps are simple.
+The tiers map to models of the configured provider (`Settings.LLM_PROVIDER`), and
+`Settings.AGENT_MODELS` overrides the model of any role, e.g. `{"guardrail_agent": "gpt-4.1-nano"}`.
+
+Within an agent, a step can be routed to another model with a `<role>.<step>` key, the steps
+being "turn" (answering the message the agent was given) and "tool_output" (reading the outputs
+of the tools it called), e.g. `{"sql_analyst.tool_output": "gpt-4.1-mini"}` keeps SQL generation
+on the large model and lets a smaller one read the query results.
+
+Models on the small tier are wrapped in `EscalatingModel`: a step that fails (API error,
+rate limit, timeout) is retried once on the large model of the provider. Every route records
+its calls, failures, escalations, latency, tokens and estimated cost, see `route_metrics()`.
+With `LLM_CACHE` enabled the models answer from the response cache first (see `llm.cache`).
+"""
+import threading
+import time
+from functools import lru_cache
+from agents import Model, ModelResponse, OpenAIChatCompletionsModel, OpenAIResponsesModel
+from openai import AsyncOpenAI
+from cli_data_ai.utils.config import get_settings
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+STEPS = ("turn", "tool_output")
+
+AGENT_TIERS = {
+    "sql_analyst": "large",
+    "manager": "large",
+    "data_scientist": "large",
+    "dashboard_analyst": "small",
+    "guardrail_agent": "small",
+}
+TIER_MODELS = {
+    "openai": {"large": "gpt-4.1", "small": "gpt-4.1-mini"},
+    "groq": {"large": "llama-3.3-70b-versatile", "small": "llama-3.1-8b-instant"},
+}
+# USD per million input / output tokens, for the cost estimate of the metrics
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+_metrics = {}  # (role, model) -> counters
+_metrics_lock = threading.Lock()
+
+def _route(role: str, model: str) -> dict:
+    # Called with _metrics_lock held
+    return _metrics.setdefault((role, model), {
+        "calls": 0, "failures": 0, "escalations": 0, "seconds": 0.0,
+        "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+    })
+
+def _record(role: str, model: str, seconds: float, usage=None, failed: bool = False):
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    with _metrics_lock:
+        metrics = _route(role, model)
+        metrics["calls"] += 1
+        metrics["failures"] += failed
+        metrics["seconds"] += seconds
+        metrics["input_tokens"] += input_tokens
+        metrics["output_tokens"] += output_tokens
+        metrics["cost_usd"] += (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+def _record_escalation(role: str, model: str):
+    with _metrics_lock:
+        _route(role, model)["escalations"] += 1
+
+def route_metrics() -> dict:
+    """{"role/model": counters} with the mean latency per call"""
+    with _metrics_lock:
+        return {
+            f"{role}/{model}": {
+                **metrics,
+                "seconds": round(metrics["seconds"], 3),
+                "mean_seconds": round(metrics["seconds"] / metrics["calls"], 3) if metrics["calls"] else 0.0,
+                "cost_usd": round(metrics["cost_usd"], 6),
+            }
+            for (role, model), metrics in _metrics.items()
+        }
+
+
+class RoutedModel(Model):
+    """Model of a route, recording the metrics of each call"""
+    def __init__(self, role: str, name: str, model: Model):
+        self.role = role
+        self.name = name
+        self.model = model
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        start = time.perf_counter()
+        try:
+            response = await self.model.get_response(*args, **kwargs)
+        except Exception:
+            _record(self.role, self.name, time.perf_counter() - start, failed=True)
+            raise
+        _record(self.role, self.name, time.perf_counter() - start, usage=response.usage)
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        start = time.perf_counter()
+        usage = None
+        try:
+            async for event in self.model.stream_response(*args, **kwargs):
+                if getattr(event, "type", None) == "response.completed":
+                    usage = getattr(event.response, "usage", None)
+                yield event
+        except Exception:
+            _record(self.role, self.name, time.perf_counter() - start, failed=True)
+            raise
+        _record(self.role, self.name, time.perf_counter() - start, usage=usage)
+
+
+class EscalatingModel(Model):
+    """Tries the primary (cheaper) model first and retries a failed step on the fallback model"""
+    def __init__(self, primary: RoutedModel, fallback: RoutedModel):
+        self.primary = primary
+        self.fallback = fallback
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        try:
+            return await self.primary.get_response(*args, **kwargs)
+        except Exception:
+            _record_escalation(self.primary.role, self.primary.name)
+            return await self.fallback.get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        started = False
+        try:
+            async for event in self.primary.stream_response(*args, **kwargs):
+                started = True
+                yield event
+            return
+        except Exception:
+            # Events already sent cannot be taken back, only a stream failing upfront escalates
+            if started:
+                raise
+            _record_escalation(self.primary.role, self.primary.name)
+        async for event in self.fallback.stream_response(*args, **kwargs):
+            yield event
+
+
+def step_of(input) -> str:
+    """Step a model call is made for, from the last item of its input"""
+    if isinstance(input, list) and input:
+        last = input[-1]
+        kind = last.get("type") if isinstance(last, dict) else getattr(last, "type", None)
+        if kind == "function_call_output":
+            return "tool_output"
+    return "turn"
+
+
+class StepRoutedModel(Model):
+    """Sends each call to the model of its step (see `step_of`), or to the agent's model"""
+    def __init__(self, default: Model, steps: dict):
+        self.default = default
+        self.steps = steps
+
+    def _model(self, args, kwargs) -> Model:
+        input = kwargs["input"] if "input" in kwargs else args[1]
+        return self.steps.get(step_of(input), self.default)
+
+    async def get_response(self, *args, **kwargs) -> ModelResponse:
+        return await self._model(args, kwargs).get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        async for event in self._model(args, kwargs).stream_response(*args, **kwargs):
+            yield event
+
+
+def provider() -> str:
+    return get_settings().LLM_PROVIDER or "openai"
+
+@lru_cache(maxsize=None)
+def _client(provider_name: str) -> AsyncOpenAI:
+    """One client, and connection pool, per provider for all the agents"""
+    settings = get_settings()
+    if provider_name == "groq":
+        return AsyncOpenAI(base_url=GROQ_BASE_URL, api_key=settings.GROQ_API_KEY)
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+def _model(name: str) -> Model:
+    from cli_data_ai.llm.cache import CachedModel, response_cache
+    provider_name = provider()
+    if provider_name == "groq":
+        # Groq serves the Chat Completions API only
+        model = OpenAIChatCompletionsModel(model=name, openai_client=_client(provider_name))
+    else:
+        model = OpenAIResponsesModel(model=name, openai_client=_client(provider_name))
+    cache = response_cache()
+    return CachedModel(f"{provider_name}/{name}", model, cache) if cache is not None else model
+
+def model_name(role: str) -> str:
+    """Model configured for an agent role"""
+    overrides = get_settings().AGENT_MODELS or {}
+    if role in overrides:
+        return overrides[role]
+    return TIER_MODELS[provider()][AGENT_TIERS.get(role, "large")]
+
+def _routed_model(role: str, name: str) -> Model:
+    """Model `name` serving `role`, escalating to the large model on failure when it is a smaller one"""
+    routed = RoutedModel(role, name, _model(name))
+    large = TIER_MODELS[provider()]["large"]
+    if name == large:
+        return routed
+    return EscalatingModel(routed, RoutedModel(role, large, _model(large)))
+
+def model_for(role: str) -> Model:
+    """Model of an agent role, with its per-step routes when some are configured"""
+    overrides = get_settings().AGENT_MODELS or {}
+    steps = {step: overrides[f"{role}.{step}"] for step in STEPS if f"{role}.{step}" in overrides}
+    model = _routed_model(role, model_name(role))
+    if not steps:
+        return model
+    return StepRoutedModel(model, {step: _routed_model(f"{role}.{step}", name) for step, name in steps.items()})
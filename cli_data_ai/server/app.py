@@ -0,0 +1,211 @@
+"""
+HTTP/WebSocket API serving the agents from one long-lived process.
+
+The agents are built once at startup and the settings, connections and caches of the tools
+(prepared data, stored datasets, model artifacts) stay warm between requests:
+
+- POST /ask: run one question and return its final output.
+- POST /stream: same, streamed as NDJSON events (see `utils.renderers.JsonlRenderer`).
+- POST /batch: several questions, run concurrently within the server's limits.
+- WS /ws: one JSON question per message, events sent back as JSON messages.
+- GET /health: agents, runs in progress and queued.
+
+At most `max_concurrency` runs are in progress, up to `max_queue` more wait for a slot and
+further requests are rejected with 429. Runs cannot ask for confirmation, so destructive tools
+are refused.
+
+Requires the `server` extra (FastAPI and uvicorn).
+"""
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from cli_data_ai.agents.registry import agent_names, get_agent
+from cli_data_ai.utils.renderers import Renderer
+
+MAX_CONCURRENCY = 4
+MAX_QUEUE = 32
+MAX_TURNS = 20
+
+
+class AskRequest(BaseModel):
+    question: str
+    agent: str = "SQL Analyst"
+    max_turns: int = MAX_TURNS
+
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    agent: str = "SQL Analyst"
+    max_turns: int = MAX_TURNS
+
+
+class AskResponse(BaseModel):
+    agent: str
+    output: object = None
+    error: Optional[str] = None
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class RunLimiter:
+    """Semaphore over the runs, with a bounded number of requests waiting for a slot"""
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.running = 0
+        self.queued = 0
+
+    async def __aenter__(self):
+        if self.semaphore.locked() and self.queued >= self.max_queue:
+            raise ServerBusy(f"{self.running} runs in progress and {self.queued} queued, try again later")
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self.semaphore.release()
+
+
+class QueueRenderer(Renderer):
+    """Puts the events of a run on an asyncio queue, None marks the end of the run"""
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+        self.loop = asyncio.get_running_loop()
+
+    def handle(self, event: dict):
+        # Progress events may come from worker threads of the tools
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+def _check_agent(name: str):
+    if name not in agent_names():
+        raise HTTPException(status_code=404, detail=f"Unknown agent: {name} (available: {', '.join(agent_names())})")
+
+async def run_question(question: str, agent_name: str, max_turns: int):
+    """Final output of the agent for the question, as a dict for structured outputs"""
+    from agents import Runner
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.utils.events_stream import serialize
+    result = await Runner.run(
+        get_agent(agent_name), input=question, context=build_context(interactive=False), max_turns=max_turns,
+    )
+    return serialize(result.final_output)
+
+async def stream_question(question: str, agent_name: str, max_turns: int):
+    """Async iterator over the events of the run"""
+    from cli_data_ai.agents.context.context import build_context
+    from cli_data_ai.utils.events_stream import stream_events
+    queue = asyncio.Queue()
+    run = asyncio.create_task(stream_events(
+        get_agent(agent_name), question, context=build_context(interactive=False),
+        max_turns=max_turns, renderer=QueueRenderer(queue),
+    ))
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+        # Errors were already sent as events
+        await asyncio.gather(run, return_exceptions=True)
+    finally:
+        run.cancel()
+
+def create_app(max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE) -> FastAPI:
+    from contextlib import asynccontextmanager
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        from cli_data_ai.utils.config import get_settings
+        get_settings()
+        for name in agent_names():
+            get_agent(name)
+        app.state.limiter = RunLimiter(max_concurrency, max_queue)
+        yield
+
+    app = FastAPI(title="Data Analyst API", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        limiter = app.state.limiter
+        return {"agents": agent_names(), "running": limiter.running, "queued": limiter.queued}
+
+    @app.post("/ask", response_model=AskResponse)
+    async def ask(request: AskRequest):
+        _check_agent(request.agent)
+        try:
+            async with app.state.limiter:
+                output = await run_question(request.question, request.agent, request.max_turns)
+        except ServerBusy as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        except Exception as e:
+            return AskResponse(agent=request.agent, error=str(e))
+        return AskResponse(agent=request.agent, output=output)
+
+    @app.post("/batch", response_model=List[AskResponse])
+    async def batch(request: BatchRequest):
+        _check_agent(request.agent)
+        limiter = app.state.limiter
+        if len(request.questions) > max_concurrency + max_queue - limiter.running - limiter.queued:
+            raise HTTPException(status_code=429, detail="Not enough free slots for the batch, try again later")
+
+        async def answer(question: str) -> AskResponse:
+            try:
+                async with limiter:
+                    output = await run_question(question, request.agent, request.max_turns)
+            except Exception as e:
+                return AskResponse(agent=request.agent, error=str(e))
+            return AskResponse(agent=request.agent, output=output)
+
+        return await asyncio.gather(*(answer(question) for question in request.questions))
+
+    @app.post("/stream")
+    async def stream(request: AskRequest):
+        _check_agent(request.agent)
+        limiter = app.state.limiter
+        if limiter.semaphore.locked() and limiter.queued >= max_queue:
+            raise HTTPException(status_code=429, detail="Server busy, try again later")
+
+        async def lines():
+            try:
+                async with limiter:
+                    async for event in stream_question(request.question, request.agent, request.max_turns):
+                        yield json.dumps(event, default=str) + "\n"
+            except ServerBusy as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.websocket("/ws")
+    async def websocket(ws: WebSocket):
+        await ws.accept()
+        try:
+            while True:
+                try:
+                    request = AskRequest(**await ws.receive_json())
+                except (ValueError, TypeError) as e:
+                    await ws.send_json({"type": "error", "error": f"Invalid request: {e}"})
+                    continue
+                if request.agent not in agent_names():
+                    await ws.send_json({"type": "error", "error": f"Unknown agent: {request.agent}"})
+                    continue
+                try:
+                    async with app.state.limiter:
+                        async for event in stream_question(request.question, request.agent, request.max_turns):
+                            await ws.send_text(json.dumps(event, default=str))
+                except ServerBusy as e:
+                    await ws.send_json({"type": "error", "error": str(e)})
+        except WebSocketDisconnect:
+            pass
+
+    return app
@@ -1,23 +1,74 @@
 from agents import function_tool
+import json
 import requests 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from agents import Agent, RunContextWrapper, Runner, function_tool
 from pydantic import BaseModel
 from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.tools.output import shape_output
+
+MAX_PARALLEL_REQUESTS = 4
+SESSION_TTL_SECONDS = 12 * 3600  # Metabase sessions last 14 days by default, renewed well before
+# Sessions can still end earlier (Metabase restarted, shorter MAX_SESSION_AGE): requests answered
+# 401 drop the cached token, log in again and are retried once
+
+_sessions = {}  # (metabase_url, user_name) -> (session_token, login time)
+_sessions_lock = threading.Lock()
+
+class ChartSpec(BaseModel):
+    sql_query: str
+    name: str
+    display: str  # 'table', 'bar', 'line', 'pie', 'scatter' or 'area'
 
 @function_tool  
+@shape_output()
 def login_visualisation_tool(wrapper: RunContextWrapper[InputData]) -> str:
     
     """Logins into the Visualisation Tool: Metabase
     Returns the session token needed to create object usch as chart cards inside Metabase
     """
-    url = f"{wrapper.context.metabase_url}/api/session"
-    payload = {"username": wrapper.context.metabase_user_name, "password": wrapper.context.metabase_password}
-    response = requests.post(url, json=payload)
+    context = wrapper.context
+    return metabase_session(context.metabase_url, context.metabase_user_name, context.metabase_password)
+
+def metabase_session(metabase_url: str, user_name: str, password: str) -> str:
+    """Session token for the user, logging in only when there is no recent one"""
+    key = (metabase_url, user_name)
+    with _sessions_lock:
+        cached = _sessions.get(key)
+        if cached is not None and time.time() - cached[1] < SESSION_TTL_SECONDS:
+            return cached[0]
+        url = f"{metabase_url}/api/session"
+        payload = {"username": user_name, "password": password}
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+        session_token = response.json()["id"]
+        _sessions[key] = (session_token, time.time())
+        return session_token
+
+def _forget_session(metabase_url: str, user_name: str, session_token: str):
+    """Drop the cached session if it is still the expired one, another thread may have renewed it"""
+    key = (metabase_url, user_name)
+    with _sessions_lock:
+        cached = _sessions.get(key)
+        if cached is not None and cached[0] == session_token:
+            del _sessions[key]
+
+def _metabase_request(context: InputData, method: str, path: str, session_token: str, **kwargs):
+    """Call the Metabase API with the session, logging in again once if it has expired"""
+    url = f"{context.metabase_url}{path}"
+    response = requests.request(method, url, headers={"X-Metabase-Session": session_token}, **kwargs)
+    if response.status_code == 401:
+        _forget_session(context.metabase_url, context.metabase_user_name, session_token)
+        session_token = metabase_session(context.metabase_url, context.metabase_user_name, context.metabase_password)
+        response = requests.request(method, url, headers={"X-Metabase-Session": session_token}, **kwargs)
     response.raise_for_status()
-    session_token = response.json()["id"]
-    return session_token
+    return response
 
 @function_tool
+@shape_output()
 def create_metabase_chart(wrapper: RunContextWrapper[InputData],session_token: str, sql_query: str, name: str, display: str) -> str:
     """Create a Metabase chart via creating a SQL Card question and returns the corresponding url
 
@@ -27,9 +78,11 @@ def create_metabase_chart(wrapper: RunContextWrapper[InputData],session_token: s
         name: Name of the chart
         display: Visualisation type for the chart, can be one of the following: 'table', 'bar', 'line', 'pie', 'scatter', 'area'
     """
-    url = f"{wrapper.context.metabase_url}/api/card"
-    headers = {"X-Metabase-Session": session_token}
+    card = _create_card(wrapper.context, session_token, sql_query, name, display)
+    card_url = f"localhost:3000/card/{card['id']}"
+    return card_url
 
+def _create_card(context: InputData, session_token: str, sql_query: str, name: str, display: str) -> dict:
     payload = {
         "name": name,
         "dataset_query": {
@@ -41,14 +94,33 @@ def create_metabase_chart(wrapper: RunContextWrapper[InputData],session_token: s
         "visualization_settings": {}
     }
 
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
-    card = response.json()
-    
-    card_url = f"localhost:3000/card/{card['id']}"
-    return card_url
+    return _metabase_request(context, "POST", "/api/card", session_token, json=payload).json()
+
+@function_tool
+@shape_output()
+def create_metabase_charts(wrapper: RunContextWrapper[InputData], session_token: str, charts: List[ChartSpec]) -> str:
+    """Create several Metabase charts at once (SQL Card questions created in parallel), e.g. all the charts of a dashboard
+
+    Args:
+        session_token: Token ID for the session returned after login
+        charts: One entry per chart with its sql_query, name and display type
+            ('table', 'bar', 'line', 'pie', 'scatter', 'area')
+
+    Returns:
+        A JSON list with, per chart: name, card_id and url, or name and error.
+    """
+    def create(chart: ChartSpec) -> dict:
+        try:
+            card = _create_card(wrapper.context, session_token, chart.sql_query, chart.name, chart.display)
+            return {"name": chart.name, "card_id": card["id"], "url": f"localhost:3000/card/{card['id']}"}
+        except Exception as e:
+            return {"name": chart.name, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as pool:
+        return json.dumps(list(pool.map(create, charts)))
 
 @function_tool
+@shape_output()
 def create_metabase_dashboard(wrapper: RunContextWrapper[InputData],session_token: str, name: str, description: str) -> int:
     """Create a Metabase Dashboard and return the corresponding ID
 
@@ -57,14 +129,12 @@ def create_metabase_dashboard(wrapper: RunContextWrapper[InputData],session_toke
         name: Name for the dashboard
         description: Description of the dashboard
     """
-    url = f"{wrapper.context.metabase_url}/api/dashboard"
-    headers = {"X-Metabase-Session": session_token}
     payload = {"name": name, "description": description}
-    response = requests.post(url, headers=headers, json=payload)
-    response.raise_for_status()
+    response = _metabase_request(wrapper.context, "POST", "/api/dashboard", session_token, json=payload)
     return response.json()["id"]
 
 @function_tool
+@shape_output()
 def add_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],session_token: str, dashboard_id: int, card_id: int) -> str:
     """Add a Metabase chart (its SQL Card) to the Dashboard and return the corresponding dashboard url
 
@@ -73,8 +143,6 @@ def add_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],sessio
         dashboard_id: ID for the dashboard
         card_id: ID of the Metabase Card
     """
-    url = f"{wrapper.context.metabase_url}/api/dashboard/{dashboard_id}/cards"
-    headers = {"X-Metabase-Session": session_token}
     payload = {
       "cards": [
         {
@@ -89,12 +157,12 @@ def add_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],sessio
         }
       ],
     }
-    response = requests.put(url, headers=headers, json=payload)
-    response.raise_for_status()
+    _metabase_request(wrapper.context, "PUT", f"/api/dashboard/{dashboard_id}/cards", session_token, json=payload)
     dashboard_url = f"{wrapper.context.metabase_url}/dashboard/{dashboard_id}"
     return dashboard_url
 
 @function_tool
+@shape_output()
 def append_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],session_token: str, dashboard_id: int, card_id: int) -> str:
     """Add a Metabase chart (its SQL Card) to the Dashboard and return the corresponding dashboard url
     
@@ -104,11 +172,7 @@ def append_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],ses
         card_id: ID of the Metabase Card
     """   
     # Step 1: Fetch current dashboard layout
-    url = f"{wrapper.context.metabase_url}/api/dashboard/{dashboard_id}"
-    headers = {"X-Metabase-Session": session_token}
-    response = requests.get(url, headers=headers)
-    
-    response.raise_for_status()
+    response = _metabase_request(wrapper.context, "GET", f"/api/dashboard/{dashboard_id}", session_token)
     dashboard_data = response.json()
     existing_cards = dashboard_data.get("dashcards", [])
     
@@ -146,12 +210,42 @@ def append_chart_to_metabase_dashboard(wrapper: RunContextWrapper[InputData],ses
     }
     
     # Step 5: PUT full layout
-    put_url = f"{wrapper.context.metabase_url}/api/dashboard/{dashboard_id}/cards"
     payload = {
         "cards": existing_cards + [new_layout_card],
     }
     
-    put_response = requests.put(put_url, headers=headers, json=payload)
-    put_response.raise_for_status()
+    _metabase_request(wrapper.context, "PUT", f"/api/dashboard/{dashboard_id}/cards", session_token, json=payload)
     dashboard_url = f"{wrapper.context.metabase_url}/dashboard/{dashboard_id}"
-    return dashboard_url
\ No newline at end of file
+    return dashboard_url
+
+@function_tool
+@shape_output()
+def append_charts_to_metabase_dashboard(wrapper: RunContextWrapper[InputData], session_token: str, dashboard_id: int, card_ids: List[int]) -> str:
+    """Add several Metabase charts (their SQL Cards) to the Dashboard in one update and return the dashboard url.
+    Charts are laid out two per row below the existing ones.
+
+    Args:
+        session_token: Token ID for the session returned after login
+        dashboard_id: ID for the dashboard
+        card_ids: IDs of the Metabase Cards, in display order
+    """
+    response = _metabase_request(wrapper.context, "GET", f"/api/dashboard/{dashboard_id}", session_token)
+    existing_cards = response.json().get("dashcards", [])
+
+    first_row = max((card.get("row", 0) + card.get("size_y", 10) for card in existing_cards), default=0)
+    new_cards = [
+        {
+            "id": -(idx + 1),  # negative ids create new dashboard cards
+            "card_id": card_id,
+            "col": 12 * (idx % 2),
+            "row": first_row + 10 * (idx // 2),
+            "size_x": 12,
+            "size_y": 10,
+            "parameter_mappings": [],
+            "visualization_settings": {},
+        }
+        for idx, card_id in enumerate(card_ids)
+    ]
+
+    _metabase_request(wrapper.context, "PUT", f"/api/dashboard/{dashboard_id}/cards", session_token, json={"cards": existing_cards + new_cards})
+    return f"{wrapper.context.metabase_url}/dashboard/{dashboard_id}"
@@ -0,0 +1,105 @@
+"""
+In-process store of query results shared between the agents' tools.
+
+`sql_query_tool`, when asked to keep the dataset, registers the full result of the query as an
+Arrow table under a dataset ID (DuckDB hands its result over as Arrow directly), and the ID
+travels in the SQL agent's output instead of the rows. The data scientist's `get_input_data` then builds its DataFrame from the
+stored table without running the query again or parsing text.
+
+Without `pyarrow` installed, or for columns mixing types, the results are stored as pandas
+DataFrames. The store keeps the
+most recent datasets within `DATASET_STORE_MB`, results larger than `DATASET_MAX_ROWS` are not
+registered.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+DATASET_MAX_ROWS = 200_000
+DATASET_STORE_MB = 512
+ARROW_BATCH_ROWS = 50_000
+
+_datasets = OrderedDict()  # dataset_id -> {"table", "query", "rows", "nbytes"}
+_lock = threading.Lock()
+
+def _arrow_table(cursor, rows):
+    """Build a columnar table from DB-API rows"""
+    columns = [desc[0] for desc in cursor.description]
+    try:
+        import pyarrow as pa
+    except ImportError:
+        import pandas as pd
+        return pd.DataFrame(rows, columns=columns)
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    try:
+        return pa.table({name: pa.array(column) for name, column in zip(columns, values)})
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns can mix types (e.g. 1 and 'a'), which Arrow rejects: keep object columns
+        import pandas as pd
+        return pd.DataFrame(rows, columns=columns)
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _nbytes(table) -> int:
+    if hasattr(table, "nbytes"):
+        return table.nbytes
+    return int(table.memory_usage(deep=True).sum())
+
+def fetch_result(backend, cursor, preview_rows: int = 10):
+    """
+    Fetch the result of the query executed on the cursor, up to DATASET_MAX_ROWS + 1 rows.
+
+    Returns:
+        (preview, table) with the first `preview_rows` rows as tuples and the full result as a
+        table, or None as table when the result is larger than DATASET_MAX_ROWS.
+    """
+    if backend.name == "duckdb" and _has_pyarrow():
+        # DuckDB streams its result as Arrow record batches, no conversion to Python rows
+        import pyarrow as pa
+        batches, n_rows = [], 0
+        for batch in cursor.fetch_record_batch(ARROW_BATCH_ROWS):
+            batches.append(batch)
+            n_rows += batch.num_rows
+            if n_rows > DATASET_MAX_ROWS:
+                break
+        table = pa.Table.from_batches(batches, schema=batches[0].schema) if batches else None
+        if table is None:
+            return [], None
+        preview = [tuple(row.values()) for row in table.slice(0, preview_rows).to_pylist()]
+        return preview, table if n_rows <= DATASET_MAX_ROWS else None
+
+    rows = cursor.fetchmany(DATASET_MAX_ROWS + 1)
+    if len(rows) > DATASET_MAX_ROWS:
+        return rows[:preview_rows], None
+    return rows[:preview_rows], _arrow_table(cursor, rows)
+
+def register(table, query: str) -> str:
+    """Store a result table and return its dataset ID"""
+    dataset_id = f"ds_{uuid.uuid4().hex[:8]}"
+    with _lock:
+        _datasets[dataset_id] = {"table": table, "query": query, "rows": len(table), "nbytes": _nbytes(table)}
+        # Evict the oldest datasets beyond the memory budget, always keeping the new one
+        while len(_datasets) > 1 and sum(d["nbytes"] for d in _datasets.values()) > DATASET_STORE_MB * 1024 ** 2:
+            _datasets.popitem(last=False)
+    return dataset_id
+
+def get(dataset_id: str) -> dict:
+    """Return {table, query, rows, nbytes} for the dataset, or None when unknown or evicted"""
+    with _lock:
+        dataset = _datasets.get(dataset_id)
+        if dataset is not None:
+            _datasets.move_to_end(dataset_id)
+        return dataset
+
+def to_pandas(dataset_id: str):
+    """DataFrame view of a stored dataset (zero-copy for numeric Arrow columns without nulls)"""
+    dataset = get(dataset_id)
+    if dataset is None:
+        return None
+    table = dataset["table"]
+    return table.to_pandas() if hasattr(table, "to_pandas") else table
@@ -0,0 +1,139 @@
+import sqlite3
+from urllib.parse import urlparse
+
+# Tables managed by the CLI itself (query log, summary tables, ...) are hidden from the agents
+INTERNAL_TABLE_PREFIX = "_cli_"
+
+class DatabaseBackend:
+    """
+    Base class for the database engines the SQL and ML tools can run on.
+
+    Every backend works on the same SQLite file (`<database_name>.sqlite`),
+    the engine only changes how queries are executed against it.
+    """
+    name = "base"
+
+    def __init__(self, database_name: str):
+        self.database_name = database_name
+        self.path = f"{database_name}.sqlite"
+
+    def connect(self, read_only: bool = False):
+        raise NotImplementedError
+
+    def cursor(self, conn):
+        return conn.cursor()
+
+    def stream_cursor(self, conn):
+        """Second cursor on the connection, to read a result set while writing with `cursor`"""
+        return conn.cursor()
+
+    def list_tables(self, cursor) -> list:
+        raise NotImplementedError
+
+    def table_columns(self, cursor, table: str) -> list:
+        """Return a list of (column_name, type) tuples for the table"""
+        cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+        return [(col[1], col[2]) for col in cursor.fetchall()]
+
+    def rowcount(self, cursor) -> int:
+        """Rows affected by the last write statement executed on the cursor"""
+        return cursor.rowcount
+
+    def rollback(self, conn):
+        """Roll back the open transaction, if there is one"""
+        if conn.in_transaction:
+            conn.rollback()
+
+
+class SQLiteBackend(DatabaseBackend):
+    name = "sqlite"
+
+    def connect(self, read_only: bool = False):
+        if read_only:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return sqlite3.connect(self.path)
+
+    def list_tables(self, cursor) -> list:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        return [row[0] for row in cursor.fetchall() if not row[0].startswith(INTERNAL_TABLE_PREFIX)]
+
+
+class DuckDBBackend(DatabaseBackend):
+    """
+    Runs queries on DuckDB's vectorized columnar engine with the SQLite file attached,
+    which is much faster than SQLite for aggregate-heavy analytical queries.
+    """
+    name = "duckdb"
+    alias = "db"
+
+    def connect(self, read_only: bool = False):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DuckDB backend selected but `duckdb` is not installed. Run `pip install duckdb`.") from e
+
+        conn = duckdb.connect()
+        options = "TYPE sqlite, READ_ONLY" if read_only else "TYPE sqlite"
+        conn.execute(f"ATTACH '{self.path}' AS {self.alias} ({options});")
+        conn.execute(f"USE {self.alias};")
+        return conn
+
+    def cursor(self, conn):
+        # DuckDB cursors are new connections that would lose the `USE` above,
+        # the connection itself implements the DB-API cursor methods we need
+        return conn
+
+    def stream_cursor(self, conn):
+        # A DuckDB cursor is a separate connection to the same database instance, the attached
+        # SQLite file is shared but the default catalog has to be selected again
+        cursor = conn.cursor()
+        cursor.execute(f"USE {self.alias};")
+        return cursor
+
+    def list_tables(self, cursor) -> list:
+        cursor.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_catalog = ? AND table_type = 'BASE TABLE';",
+            [self.alias],
+        )
+        return [row[0] for row in cursor.fetchall() if not row[0].startswith(INTERNAL_TABLE_PREFIX)]
+
+    def rollback(self, conn):
+        import duckdb
+        try:
+            conn.rollback()
+        except duckdb.TransactionException:
+            # Statements run outside BEGIN are committed automatically, there is nothing to undo
+            pass
+
+    def rowcount(self, cursor) -> int:
+        # DuckDB returns the number of affected rows as the statement result
+        try:
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except Exception:
+            return -1
+
+
+BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+}
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name so it can be safely interpolated in a SQL statement"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def backend_name_from_url(database_url: str) -> str:
+    """
+    Infer the engine from DATABASE_URL, e.g. `duckdb:///data/app.sqlite` selects DuckDB.
+    Plain paths and `sqlite://` URLs select SQLite.
+    """
+    scheme = urlparse(database_url or "").scheme.lower()
+    # Handle SQLAlchemy style dialects such as `duckdb+sqlite://`
+    scheme = scheme.split("+")[0]
+    return scheme if scheme in BACKENDS else "sqlite"
+
+def get_backend(context) -> DatabaseBackend:
+    """Return the database backend configured for the given agent context"""
+    backend_cls = BACKENDS[backend_name_from_url(getattr(context, "database_url", ""))]
+    return backend_cls(context.database_name)
@@ -0,0 +1,382 @@
+"""
+Materialized summary tables for aggregate queries the agents run repeatedly.
+
+Every aggregate query executed through `sql_query_tool` is counted in a query log.
+Once a query has been run `MATERIALIZE_AFTER_RUNS` times its result is stored in a
+managed summary table and later runs of the same query read from it instead.
+
+On every run the high-water marks of the source tables (`transaction_id` or `timestamp`,
+plus the row count) are read again and compared with the ones stored at the last refresh, so
+writes from other processes are seen whatever the file modification times say. A summary is
+refreshed when they moved, or when the data version of the database (see
+`profiler.database_version`) changed since the last check, which covers rows rewritten in place.
+Single table queries made only of SUM/COUNT/MIN/MAX aggregates, without subqueries, are
+refreshed incrementally from the rows above the old high-water mark. Any other query, or a
+source changed without moving its high-water mark, is recomputed in full. The write tools call
+`invalidate_summaries` for the tables they change in place, so an update applied together with
+appends is not merged as new rows; changes made outside the CLI are assumed to be appends when
+the high-water mark moved.
+
+Only queries whose ORDER BY / LIMIT tail refers to output columns by name or position are
+served from a summary table, any other tail would not mean the same thing there.
+"""
+import hashlib
+import json
+import re
+import threading
+from datetime import datetime, timezone
+from cli_data_ai.tools.db.backends import INTERNAL_TABLE_PREFIX, quote_identifier
+from cli_data_ai.tools.db.profiler import database_version, metadata_write
+
+MATERIALIZE_AFTER_RUNS = 3
+WATERMARK_COLUMNS = ("transaction_id", "timestamp")
+LOG_TABLE = f"{INTERNAL_TABLE_PREFIX}mv_query_log"
+REGISTRY_TABLE = f"{INTERNAL_TABLE_PREFIX}mv_registry"
+SUMMARY_PREFIX = f"{INTERNAL_TABLE_PREFIX}mv_"
+
+_fresh = {}  # (database path, query) -> data version the summary was last checked at
+_fresh_lock = threading.Lock()
+
+ORDER_TERM_RE = re.compile(r'(\w+|"[^"]+"|\d+)(\s+(ASC|DESC))?(\s+NULLS\s+(FIRST|LAST))?', re.I)
+LIMIT_RE = re.compile(r"LIMIT\s+\d+(\s*(,|OFFSET)\s*\d+)?", re.I)
+AGGREGATE_RE = re.compile(r"\b(SUM|COUNT|MIN|MAX|AVG|TOTAL|GROUP_CONCAT|STRING_AGG|MEDIAN)\s*\(", re.I)
+
+
+def normalize_query(query: str) -> str:
+    """Key used to recognise repeated queries: whitespace collapsed, trailing `;` removed"""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+def _top_level_mask(sql: str) -> list:
+    """For each character, True when it sits outside parentheses and string literals"""
+    mask, depth, quote = [], 0, None
+    for ch in sql:
+        if quote:
+            mask.append(False)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in ("'", '"'):
+            quote = ch
+            mask.append(False)
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        mask.append(depth == 0 and ch not in "()")
+    return mask
+
+def _find_top_level(sql: str, mask: list, pattern: str) -> list:
+    return [m for m in re.finditer(pattern, sql, re.I) if mask[m.start()]]
+
+def _split_top_level(sql: str, mask: list, start: int, end: int) -> list:
+    items, item_start = [], start
+    for i in range(start, end):
+        if sql[i] == "," and mask[i]:
+            items.append(sql[item_start:i].strip())
+            item_start = i + 1
+    items.append(sql[item_start:end].strip())
+    return items
+
+def _classify_select_item(item: str) -> str:
+    """
+    Return the aggregate function (SUM, COUNT, MIN, MAX) when the item is a single
+    decomposable aggregate, "key" for plain group columns and "complex" otherwise.
+    """
+    m = re.match(r"\s*(SUM|COUNT|MIN|MAX)\s*\(", item, re.I)
+    if m:
+        # Find the parenthesis closing the aggregate call
+        depth = 0
+        for i in range(m.end() - 1, len(item)):
+            if item[i] == "(":
+                depth += 1
+            elif item[i] == ")":
+                depth -= 1
+                if depth == 0:
+                    break
+        inner = item[m.end():i]
+        rest = item[i + 1:]
+        if re.fullmatch(r"\s*((AS\s+)?[\w\"]+)?\s*", rest, re.I) and not re.match(r"\s*DISTINCT\b", inner, re.I):
+            return m.group(1).upper()
+    return "complex" if AGGREGATE_RE.search(item) else "key"
+
+def parse_aggregate_query(query: str):
+    """
+    Return a description of the query if it is an aggregate SELECT we can materialize, else None.
+    The trailing ORDER BY / LIMIT is kept apart and applied when reading the summary table.
+    """
+    sql = query.strip().rstrip(";").strip()
+    if not re.match(r"SELECT\b", sql, re.I) or not AGGREGATE_RE.search(sql):
+        return None
+
+    mask = _top_level_mask(sql)
+    if len(_find_top_level(sql, mask, r"\bSELECT\b")) != 1 or _find_top_level(sql, mask, r"\b(UNION|INTERSECT|EXCEPT)\b"):
+        return None
+    from_matches = _find_top_level(sql, mask, r"\bFROM\b")
+    if not from_matches:
+        return None
+
+    tail_matches = _find_top_level(sql, mask, r"\b(ORDER\s+BY|LIMIT)\b")
+    core_end = tail_matches[0].start() if tail_matches else len(sql)
+    core, tail = sql[:core_end].strip(), sql[core_end:].strip()
+    mask = mask[:len(core)]
+
+    select_start = re.match(r"SELECT\s+", core, re.I).end()
+    items = _split_top_level(core, mask, select_start, from_matches[0].start())
+    roles = [_classify_select_item(item) for item in items]
+    where = _find_top_level(core, mask, r"\bWHERE\b")
+    from_end = next(
+        (m.start() for m in _find_top_level(core, mask, r"\b(WHERE|GROUP\s+BY|HAVING)\b") if m.start() > from_matches[0].start()),
+        len(core),
+    )
+    from_items = _split_top_level(core, mask, from_matches[0].end(), from_end)
+    # Tables of comma joins and of subqueries anywhere in the query are sources as well
+    names = re.findall(r"\b(?:FROM|JOIN)\s+([\w\"]+)", core, re.I)
+    names += [m.group(1) for m in (re.match(r"([\w\"]+)", item) for item in from_items[1:]) if m]
+    sources = sorted({name.strip('"') for name in names})
+    nested_select = len(re.findall(r"\bSELECT\b", core, re.I)) > 1
+
+    group_by = _find_top_level(core, mask, r"\bGROUP\s+BY\b")
+    group_keys = []
+    if group_by:
+        group_end = next((m.start() for m in _find_top_level(core, mask, r"\bHAVING\b")), len(core))
+        group_keys = _split_top_level(core, mask, group_by[0].end(), group_end)
+
+    incremental = (
+        len(sources) == 1
+        and len(from_items) == 1
+        and not nested_select
+        and not _find_top_level(core, mask, r"\b(JOIN|HAVING)\b")
+        and not re.match(r"DISTINCT\b", core[select_start:], re.I)
+        and "complex" not in roles
+        and roles.count("key") == len(group_keys)
+    )
+    return {
+        "core": core,
+        "tail": tail,
+        "roles": roles,
+        "sources": sources,
+        "incremental": incremental,
+        "where_end": where[0].end() if where else None,
+        "group_start": group_by[0].start() if group_by else len(core),
+    }
+
+def _tail_reads_output(tail: str, columns: list) -> bool:
+    """
+    True when the ORDER BY / LIMIT tail only names output columns or positions, so it keeps
+    its meaning when applied to the summary table instead of the original query.
+    """
+    if not tail:
+        return True
+    names = {column.lower() for column in columns}
+    order_by = re.match(r"ORDER\s+BY\s+", tail, re.I)
+    if order_by:
+        mask = _top_level_mask(tail)
+        limit = _find_top_level(tail, mask, r"\bLIMIT\b")
+        terms_end = limit[0].start() if limit else len(tail)
+        for term in _split_top_level(tail, mask, order_by.end(), terms_end):
+            m = ORDER_TERM_RE.fullmatch(term)
+            if not m:
+                return False
+            ref = m.group(1)
+            if ref.isdigit():
+                if not 1 <= int(ref) <= len(columns):
+                    return False
+            elif ref.strip('"').lower() not in names:
+                return False
+        tail = tail[terms_end:].strip()
+    return not tail or bool(LIMIT_RE.fullmatch(tail))
+
+def _delta_query(spec: dict, watermark_column: str) -> str:
+    """Rewrite the aggregate so it only reads rows above the high-water mark"""
+    core, condition = spec["core"], f"{quote_identifier(watermark_column)} > ?"
+    group_start = spec["group_start"]
+    if spec["where_end"] is None:
+        return f"{core[:group_start]} WHERE {condition} {core[group_start:]}"
+    where_end = spec["where_end"]
+    return f"{core[:where_end]} ({core[where_end:group_start]}) AND {condition} {core[group_start:]}"
+
+def _merge(role: str, old, new):
+    if old is None:
+        return new
+    if new is None:
+        return old
+    if role in ("SUM", "COUNT"):
+        return old + new
+    if role == "MIN":
+        return min(old, new)
+    return max(old, new)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _ensure_metadata(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {LOG_TABLE} (query TEXT PRIMARY KEY, run_count INTEGER, last_run TEXT, eligible INTEGER DEFAULT 1);"
+    )
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {REGISTRY_TABLE} ("
+        "query TEXT PRIMARY KEY, sql TEXT, summary_table TEXT, watermarks TEXT, "
+        "created_at TEXT, refreshed_at TEXT, refresh_count INTEGER, hits INTEGER);"
+    )
+
+def _log_query(cursor, key: str) -> int:
+    """Count one more run of the query and return its run count (0 if it cannot be materialized)"""
+    cursor.execute(f"SELECT run_count, eligible FROM {LOG_TABLE} WHERE query = ?;", [key])
+    row = cursor.fetchone()
+    if row and not row[1]:
+        return 0
+    run_count = (row[0] if row else 0) + 1
+    if row:
+        cursor.execute(f"UPDATE {LOG_TABLE} SET run_count = ?, last_run = ? WHERE query = ?;", [run_count, _now(), key])
+    else:
+        cursor.execute(f"INSERT INTO {LOG_TABLE} (query, run_count, last_run) VALUES (?, ?, ?);", [key, run_count, _now()])
+    return run_count
+
+def _watermarks(backend, cursor, sources: list) -> dict:
+    """Current high-water mark of each source table: {table: {column, max, count}}"""
+    watermarks = {}
+    for table in sources:
+        columns = [name for name, _ in backend.table_columns(cursor, table)]
+        column = next((c for c in WATERMARK_COLUMNS if c in columns), None)
+        max_sql = f"MAX({quote_identifier(column)})" if column else "NULL"
+        cursor.execute(f"SELECT {max_sql}, COUNT(*) FROM {quote_identifier(table)};")
+        max_value, count = cursor.fetchone()
+        watermarks[table] = {"column": column, "max": max_value, "count": count}
+    return watermarks
+
+def invalidate_summaries(backend, conn, tables=None):
+    """
+    Make the summaries reading any of `tables` (all of them when None) recompute in full on
+    their next run. Called by the write tools after changes that may rewrite existing rows.
+    """
+    with metadata_write(backend.path):
+        cursor = backend.cursor(conn)
+        _ensure_metadata(cursor)
+        cursor.execute(f"SELECT query, sql FROM {REGISTRY_TABLE} WHERE watermarks IS NOT NULL;")
+        changed = {table.lower() for table in tables or []}
+        stale = [
+            key for key, sql in cursor.fetchall()
+            if tables is None or changed & {source.lower() for source in parse_aggregate_query(sql)["sources"]}
+        ]
+        for key in stale:
+            cursor.execute(f"UPDATE {REGISTRY_TABLE} SET watermarks = NULL WHERE query = ?;", [key])
+        conn.commit()
+    with _fresh_lock:
+        for key in stale:
+            _fresh.pop((backend.path, key), None)
+
+def _full_refresh(cursor, summary_table: str, spec: dict):
+    cursor.execute(f"DROP TABLE IF EXISTS {summary_table};")
+    cursor.execute(f"CREATE TABLE {summary_table} AS {spec['core']};")
+
+def _incremental_refresh(cursor, summary_table: str, spec: dict, old: dict) -> bool:
+    """Merge the aggregates of the rows above the old high-water mark into the summary table"""
+    if not old["column"] or old["max"] is None:
+        return False
+    table = spec["sources"][0]
+    cursor.execute(
+        f"SELECT COUNT(*) FROM {quote_identifier(table)} WHERE {quote_identifier(old['column'])} > ?;",
+        [old["max"]],
+    )
+    new_rows = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table)};")
+    if cursor.fetchone()[0] - old["count"] != new_rows:
+        # Rows were deleted or back-filled below the high-water mark
+        return False
+
+    roles = spec["roles"]
+    key_idx = [i for i, role in enumerate(roles) if role == "key"]
+    cursor.execute(f"SELECT * FROM {summary_table};")
+    merged = {tuple(row[i] for i in key_idx): list(row) for row in cursor.fetchall()}
+    cursor.execute(_delta_query(spec, old["column"]), [old["max"]])
+    for row in cursor.fetchall():
+        key = tuple(row[i] for i in key_idx)
+        if key not in merged:
+            merged[key] = list(row)
+            continue
+        current = merged[key]
+        for i, role in enumerate(roles):
+            if role != "key":
+                current[i] = _merge(role, current[i], row[i])
+
+    placeholders = ", ".join("?" for _ in roles)
+    cursor.execute(f"DELETE FROM {summary_table};")
+    cursor.executemany(f"INSERT INTO {summary_table} VALUES ({placeholders});", list(merged.values()))
+    return True
+
+def _retire(cursor, key: str, summary_table: str):
+    """Drop the summary of a query that cannot be served from it and stop logging the query"""
+    cursor.execute(f"DROP TABLE IF EXISTS {summary_table};")
+    cursor.execute(f"DELETE FROM {REGISTRY_TABLE} WHERE query = ?;", [key])
+    cursor.execute(f"UPDATE {LOG_TABLE} SET eligible = 0 WHERE query = ?;", [key])
+
+def materialized_query(backend, conn, query: str) -> str:
+    """
+    Log an aggregate query and return the SQL that should actually be executed:
+    the original query, or a read of its (refreshed) summary table.
+    """
+    spec = parse_aggregate_query(query)
+    if spec is None:
+        return query
+    # Only internal tables are written, the caches keyed on the data version stay valid
+    with metadata_write(backend.path):
+        return _serve_from_summary(backend, conn, query, spec)
+
+def _serve_from_summary(backend, conn, query: str, spec: dict) -> str:
+    version = database_version(backend.path)
+    cursor = backend.cursor(conn)
+    _ensure_metadata(cursor)
+    key = normalize_query(query)
+    cursor.execute(f"SELECT summary_table, watermarks, refresh_count, hits FROM {REGISTRY_TABLE} WHERE query = ?;", [key])
+    entry = cursor.fetchone()
+
+    if entry is None:
+        run_count = _log_query(cursor, key)
+        conn.commit()
+        if run_count < MATERIALIZE_AFTER_RUNS:
+            return query
+        summary_table = SUMMARY_PREFIX + hashlib.sha1(key.encode()).hexdigest()[:12]
+        watermarks = _watermarks(backend, cursor, spec["sources"])
+        _full_refresh(cursor, summary_table, spec)
+        columns = [name for name, _ in backend.table_columns(cursor, summary_table)]
+        if not _tail_reads_output(spec["tail"], columns):
+            _retire(cursor, key, summary_table)
+            conn.commit()
+            return query
+        cursor.execute(
+            f"INSERT INTO {REGISTRY_TABLE} (query, sql, summary_table, watermarks, created_at, refreshed_at, refresh_count, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0, 0);",
+            [key, query, summary_table, json.dumps(watermarks, default=str), _now(), _now()],
+        )
+        conn.commit()
+    else:
+        summary_table, stored_watermarks, refresh_count, hits = entry
+        columns = [name for name, _ in backend.table_columns(cursor, summary_table)]
+        if not _tail_reads_output(spec["tail"], columns):
+            # Registered before the tail was checked
+            _retire(cursor, key, summary_table)
+            conn.commit()
+            return query
+        with _fresh_lock:
+            version_seen = _fresh.get((backend.path, key)) == version
+        old = json.loads(stored_watermarks) if stored_watermarks else None
+        watermarks = json.loads(json.dumps(_watermarks(backend, cursor, spec["sources"]), default=str))
+        if old is None or watermarks != old or not version_seen:
+            # Same high-water marks with a new data version: rows may have changed in place
+            refreshed = (
+                old is not None and watermarks != old and spec["incremental"]
+                and _incremental_refresh(cursor, summary_table, spec, old[spec["sources"][0]])
+            )
+            if not refreshed:
+                _full_refresh(cursor, summary_table, spec)
+            refresh_count += 1
+        cursor.execute(
+            f"UPDATE {REGISTRY_TABLE} SET watermarks = ?, refreshed_at = ?, refresh_count = ?, hits = ? WHERE query = ?;",
+            [json.dumps(watermarks), _now(), refresh_count, hits + 1, key],
+        )
+        conn.commit()
+
+    with _fresh_lock:
+        _fresh[(backend.path, key)] = version
+    return f"SELECT * FROM {summary_table} {spec['tail']}".strip()
@@ -0,0 +1,198 @@
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cli_data_ai.tools.db.backends import DatabaseBackend, quote_identifier
+
+MAX_UNIQUE_VALUES = 20
+COLUMN_GROUP_SIZE = 16  # Columns whose distinct counts are computed in the same table scan
+
+_catalog = {}  # (kind, backend, path) -> (database version, result)
+_catalog_locks = {}
+_catalog_lock = threading.Lock()
+_metadata_versions = {}  # path -> (file version after the last metadata write, data version before it)
+_versions_lock = threading.Lock()
+
+def default_workers() -> int:
+    return min(8, (os.cpu_count() or 1) + 1)
+
+class ReadOnlyConnectionPool:
+    """
+    Hands out one read-only connection per worker thread, so concurrent
+    queries never share a connection.
+    """
+    def __init__(self, backend: DatabaseBackend):
+        self.backend = backend
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def cursor(self):
+        if not hasattr(self._local, "cursor"):
+            conn = self.backend.connect(read_only=True)
+            with self._lock:
+                self._connections.append(conn)
+            self._local.cursor = self.backend.cursor(conn)
+        return self._local.cursor
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+class _Progress:
+    """Thread-safe counter forwarding (done, total, label) to the progress callback"""
+    def __init__(self, callback, total: int, stage: str):
+        self.callback = callback
+        self.total = total
+        self.stage = stage
+        self.done = 0
+        self._lock = threading.Lock()
+
+    def step(self, label: str):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.done += 1
+            done = self.done
+        self.callback(self.stage, done, self.total, label)
+
+def _run_parallel(pool: ReadOnlyConnectionPool, tasks: list, max_workers: int, progress: _Progress) -> list:
+    """Run `task(cursor)` callables on the pool and return their results in submission order"""
+    results = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(lambda t=task: t[1](pool.cursor())): idx for idx, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            progress.step(tasks[idx][0])
+    return results
+
+def describe_tables(backend: DatabaseBackend, max_workers: int = None, progress_callback=None) -> dict:
+    """Return {table: [{column_name, type}]} reading each table schema on a worker thread"""
+    max_workers = max_workers or default_workers()
+    pool = ReadOnlyConnectionPool(backend)
+    try:
+        tables = backend.list_tables(pool.cursor())
+        progress = _Progress(progress_callback, len(tables), "describe")
+        tasks = [(table, lambda cursor, table=table: backend.table_columns(cursor, table)) for table in tables]
+        columns = _run_parallel(pool, tasks, max_workers, progress)
+    finally:
+        pool.close()
+
+    return {
+        table: [{"column_name": name, "type": col_type} for name, col_type in table_columns]
+        for table, table_columns in zip(tables, columns)
+    }
+
+def _profile_column_group(cursor, table: str, group: list) -> list:
+    """Profile a group of columns of the same table with a single scan for the distinct counts"""
+    quoted_table = quote_identifier(table)
+    counts_sql = ", ".join(f"COUNT(DISTINCT {quote_identifier(name)})" for name, _ in group)
+    cursor.execute(f"SELECT {counts_sql} FROM {quoted_table};")
+    distinct_counts = cursor.fetchone()
+
+    group_info = []
+    for (column_name, col_type), distinct_count in zip(group, distinct_counts):
+        # If not too many distinct values, fetch them
+        sample_values = []
+        if distinct_count <= MAX_UNIQUE_VALUES:
+            cursor.execute(f"SELECT DISTINCT {quote_identifier(column_name)} FROM {quoted_table} LIMIT {MAX_UNIQUE_VALUES};")
+            sample_values = [row[0] for row in cursor.fetchall()]
+
+        group_info.append({
+            "column_name": column_name,
+            "type": col_type,
+            "distinct_count": distinct_count,
+            "sample_values": sample_values
+        })
+    return group_info
+
+def profile_tables(backend: DatabaseBackend, max_workers: int = None, progress_callback=None) -> dict:
+    """
+    Return {table: [{column_name, type, distinct_count, sample_values}]}.
+    Work is fanned out per table and per group of columns across read-only connections.
+    """
+    max_workers = max_workers or default_workers()
+    pool = ReadOnlyConnectionPool(backend)
+    try:
+        tables = backend.list_tables(pool.cursor())
+        progress = _Progress(progress_callback, len(tables), "schema")
+        schema_tasks = [(table, lambda cursor, table=table: backend.table_columns(cursor, table)) for table in tables]
+        schemas = _run_parallel(pool, schema_tasks, max_workers, progress)
+
+        groups = []
+        for table, columns in zip(tables, schemas):
+            for start in range(0, len(columns), COLUMN_GROUP_SIZE):
+                groups.append((table, columns[start:start + COLUMN_GROUP_SIZE]))
+
+        progress = _Progress(progress_callback, len(groups), "profile")
+        profile_tasks = [
+            (table, lambda cursor, table=table, group=group: _profile_column_group(cursor, table, group))
+            for table, group in groups
+        ]
+        profiles = _run_parallel(pool, profile_tasks, max_workers, progress)
+    finally:
+        pool.close()
+
+    db_profile = {table: [] for table in tables}
+    for (table, _), group_info in zip(groups, profiles):
+        db_profile[table].extend(group_info)
+    return db_profile
+
+def _file_version(path: str) -> tuple:
+    """Modification times of the database file and its WAL, which change with every write"""
+    version = []
+    for file in (path, f"{path}-wal"):
+        try:
+            version.append(os.stat(file).st_mtime_ns)
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+def database_version(path: str) -> tuple:
+    """
+    Version of the data in the database: the file version, except that the CLI's own writes
+    to its internal tables (query log, summary tables, model registry) do not change it.
+    """
+    version = _file_version(path)
+    with _versions_lock:
+        alias = _metadata_versions.get(path)
+    if alias is not None and alias[0] == version:
+        return alias[1]
+    return version
+
+@contextmanager
+def metadata_write(path: str):
+    """
+    Block writing only to internal `_cli_` tables: the data version seen before the block is
+    kept afterwards, so the caches keyed on it are not recomputed.
+    """
+    before = database_version(path)
+    try:
+        yield
+    finally:
+        after = _file_version(path)
+        if after != before:
+            with _versions_lock:
+                _metadata_versions[path] = (after, before)
+
+def catalog(backend: DatabaseBackend, kind: str, progress_callback=None) -> dict:
+    """
+    Cached `describe_tables` (kind "schema") or `profile_tables` (kind "profile") result,
+    recomputed when the data in the database has changed since. Concurrent calls for the same entry,
+    e.g. a background prefetch and the agent's tool call, wait for a single computation.
+    """
+    compute = {"schema": describe_tables, "profile": profile_tables}[kind]
+    key = (kind, backend.name, backend.path)
+    with _catalog_lock:
+        lock = _catalog_locks.setdefault(key, threading.Lock())
+    with lock:
+        version = database_version(backend.path)
+        cached = _catalog.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        result = compute(backend, progress_callback=progress_callback)
+        _catalog[key] = (version, result)
+        return result
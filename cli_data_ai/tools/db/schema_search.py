@@ -0,0 +1,221 @@
+"""
+Question-driven schema summaries for wide databases.
+
+Instead of the full `describe_database` output, `search_schema` returns only the tables most
+relevant to the question, ranked with BM25 over their names, column names and the `--`
+comments of their CREATE statements, plus the join paths between them taken from the
+foreign keys (`PRAGMA foreign_key_list`). Columns named `<table>_id` are treated as foreign
+keys to `<table>` (or its plural) when none are declared. The summary is cut to a token budget.
+
+The index is built from the cached schema catalog and rebuilt when the data in the database
+changes (writes to the CLI's internal tables do not count, see `profiler.database_version`).
+"""
+import math
+import re
+import threading
+from collections import Counter, deque
+from cli_data_ai.tools.db.backends import SQLiteBackend, quote_identifier
+from cli_data_ai.tools.db.profiler import catalog, database_version
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TABLE_NAME_WEIGHT = 3  # A match on the table name counts as much as this many column matches
+MAX_JOIN_HOPS = 3
+CHARS_PER_TOKEN = 4  # Rough estimate used for the budget
+STOPWORDS = {
+    "a", "an", "and", "are", "by", "each", "for", "from", "give", "how", "in", "is", "list", "me",
+    "many", "much", "of", "on", "or", "per", "show", "the", "to", "what", "which", "who", "with",
+}
+
+_indexes = {}  # (backend, path) -> (database version, SchemaIndex)
+_indexes_lock = threading.Lock()
+
+def _stem(token: str) -> str:
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens, snake_case and camelCase names split into words"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    return [_stem(token) for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+def _table_comments(sql: str) -> str:
+    return " ".join(re.findall(r"--([^\n]*)", sql or ""))
+
+def _foreign_keys(cursor, tables: dict) -> list:
+    """(table, column, referenced table, referenced column, inferred) for every foreign key"""
+    edges = []
+    for table in tables:
+        cursor.execute(f"PRAGMA foreign_key_list({quote_identifier(table)});")
+        for row in cursor.fetchall():
+            # id, seq, table, from, to, on_update, on_delete, match
+            if row[2] in tables:
+                edges.append((table, row[3], row[2], row[4] or "rowid", False))
+
+    declared = {(table, column) for table, column, *_ in edges}
+    for table, columns in tables.items():
+        for column, _ in columns:
+            match = re.fullmatch(r"(\w+)_id", column.lower())
+            if not match or (table, column) in declared:
+                continue
+            for candidate in (match.group(1), f"{match.group(1)}s", f"{match.group(1)[:-1]}ies"):
+                target = next((t for t in tables if t.lower() == candidate and t != table), None)
+                if target is None:
+                    continue
+                target_columns = {c.lower(): c for c, _ in tables[target]}
+                target_column = target_columns.get(column.lower()) or target_columns.get("id")
+                if target_column:
+                    edges.append((table, column, target, target_column, True))
+                break
+    return edges
+
+
+class SchemaIndex:
+    def __init__(self, tables: dict, comments: dict, foreign_keys: list):
+        """
+        Args:
+            tables: {table: [(column, type)]}
+            comments: {table: comment text}
+            foreign_keys: see `_foreign_keys`
+        """
+        self.tables = tables
+        self.comments = comments
+        self.docs = {}
+        for table, columns in tables.items():
+            tokens = tokenize(table) * TABLE_NAME_WEIGHT + tokenize(comments.get(table, ""))
+            for column, _ in columns:
+                tokens += tokenize(column)
+            self.docs[table] = Counter(tokens)
+        self.lengths = {table: sum(doc.values()) for table, doc in self.docs.items()}
+        self.avg_length = sum(self.lengths.values()) / max(len(self.lengths), 1)
+        self.document_frequency = Counter(token for doc in self.docs.values() for token in doc)
+
+        self.graph = {table: [] for table in tables}  # table -> [(other table, join condition, inferred)]
+        for table, column, target, target_column, inferred in foreign_keys:
+            condition = f"{table}.{column} = {target}.{target_column}"
+            self.graph[table].append((target, condition, inferred))
+            self.graph[target].append((table, condition, inferred))
+
+    def rank(self, question: str) -> list:
+        """[(table, score)] with a positive BM25 score, best first"""
+        n_docs = len(self.docs)
+        scores = {}
+        for token in set(tokenize(question)):
+            frequency = self.document_frequency.get(token)
+            if not frequency:
+                continue
+            idf = math.log(1 + (n_docs - frequency + 0.5) / (frequency + 0.5))
+            for table, doc in self.docs.items():
+                tf = doc.get(token)
+                if not tf:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[table] / self.avg_length)
+                scores[table] = scores.get(table, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+    def join_path(self, source: str, target: str) -> list:
+        """Shortest list of (table, condition, inferred) steps from source to target, None if too far"""
+        previous = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            table, hops = queue.popleft()
+            if table == target:
+                path = []
+                while previous[table] is not None:
+                    parent, condition, inferred = previous[table]
+                    path.append((table, condition, inferred))
+                    table = parent
+                return path[::-1]
+            if hops == MAX_JOIN_HOPS:
+                continue
+            for other, condition, inferred in self.graph[table]:
+                if other not in previous:
+                    previous[other] = (table, condition, inferred)
+                    queue.append((other, hops + 1))
+        return None
+
+    def summary(self, question: str, top_k: int = 5, token_budget: int = 1500) -> str:
+        """Relevant tables with their columns, join paths and other table names within the budget"""
+        ranked = [table for table, _ in self.rank(question)][:top_k]
+        if not ranked:
+            lines = [f"No table matches the question ({len(self.tables)} tables)."]
+        else:
+            # Tables on the join paths between the relevant ones are needed to write the query
+            joins, bridges = [], []
+            for table in ranked[1:]:
+                for step_table, condition, inferred in self.join_path(ranked[0], table) or []:
+                    join = f"{condition} (inferred)" if inferred else condition
+                    if join not in joins:
+                        joins.append(join)
+                    if step_table not in ranked and step_table not in bridges:
+                        bridges.append(step_table)
+
+            question_tokens = set(tokenize(question))
+            selected = ranked + bridges
+            lines = [f"Relevant tables ({len(selected)} of {len(self.tables)}):"]
+            for table in selected:
+                lines.append(self._describe(table, question_tokens))
+            if joins:
+                lines.append("Joins:")
+                lines.extend(joins)
+
+        budget = token_budget * CHARS_PER_TOKEN
+        output, used = [], 0
+        for line in lines:
+            if used + len(line) + 1 > budget:
+                output.append(f"[… cut to the {token_budget} token budget]")
+                break
+            output.append(line)
+            used += len(line) + 1
+        else:
+            shown = {table for table in self.tables if any(line.startswith(f"{table}(") for line in output)}
+            others = [table for table in self.tables if table not in shown]
+            if others:
+                remaining = budget - used - len("Other tables: ")
+                names = []
+                for table in others:
+                    remaining -= len(table) + 2
+                    if remaining < 0:
+                        names.append(f"… {len(others) - len(names)} more")
+                        break
+                    names.append(table)
+                output.append("Other tables: " + ", ".join(names))
+        return "\n".join(output)
+
+    def _describe(self, table: str, question_tokens: set) -> str:
+        # Columns matching the question first, so they survive a cut of very wide tables
+        columns = sorted(self.tables[table], key=lambda c: not question_tokens & set(tokenize(c[0])))
+        text = f"{table}({', '.join(f'{name} {col_type}'.strip() for name, col_type in columns)})"
+        comment = self.comments.get(table, "").strip()
+        return f"{text} -- {comment}" if comment else text
+
+
+def build_index(backend) -> SchemaIndex:
+    schema = catalog(backend, "schema")
+    tables = {table: [(c["column_name"], c["type"]) for c in columns] for table, columns in schema.items()}
+    # The database is always a SQLite file, foreign keys and CREATE statements are read from it directly
+    conn = SQLiteBackend(backend.database_name).connect(read_only=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
+        comments = {name: _table_comments(sql) for name, sql in cursor.fetchall() if name in tables}
+        foreign_keys = _foreign_keys(cursor, tables)
+    finally:
+        conn.close()
+    return SchemaIndex(tables, comments, foreign_keys)
+
+def schema_index(backend) -> SchemaIndex:
+    """Index of the database, cached until the data in the database changes"""
+    key = (backend.name, backend.path)
+    version = database_version(backend.path)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    index = build_index(backend)
+    with _indexes_lock:
+        _indexes[key] = (version, index)
+    return index
@@ -1,84 +1,99 @@
 from agents import function_tool
-import sqlite3
+import json
+from typing import List
 from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.tools.db.backends import INTERNAL_TABLE_PREFIX, get_backend
+from cli_data_ai.tools.db.materialize import materialized_query
+from cli_data_ai.tools.db.profiler import catalog
+from cli_data_ai.tools.db.schema_search import schema_index
+from cli_data_ai.tools.db.undo import ChangeRecorder, describe_change, last_change, undo_last_change as undo_change
+from cli_data_ai.tools.datasets import DATASET_MAX_ROWS, fetch_result, register as register_dataset
 from agents import RunContextWrapper
+from cli_data_ai.tools.output import shape_output
+from cli_data_ai.tools.safeguards.human_in_the_loop import take_confirmation
+
+def _internal_tables_error(*statements) -> str:
+    """Error when a statement names one of the CLI's internal tables (query log, model registry, ...), else None"""
+    if any(INTERNAL_TABLE_PREFIX in str(statement).lower() for statement in statements):
+        return f"❌ Tables prefixed with {INTERNAL_TABLE_PREFIX} are managed by the CLI and cannot be queried or changed."
+    return None
 
 @function_tool  
-def sql_query_tool(wrapper: RunContextWrapper[InputData],query: str) -> str:
+@shape_output()
+def sql_query_tool(wrapper: RunContextWrapper[InputData],query: str, keep_dataset: bool = False) -> str:
     
-    """Executes a query SQL statement and return the results
+    """Executes a query SQL statement and return the results (first 10 rows). With `keep_dataset`
+    the full result is fetched and the ID of the dataset holding it is returned as well, which
+    other tools can load without re-running the query. The statement runs on a read-only
+    connection, changes go through the write tools and their confirmation.
 
     Args:
         query: The SQL query to execute to retrieve the desired results
+        keep_dataset: Fetch and keep the full result (up to 200,000 rows) for another agent, e.g. training data
     """
-    cursor = sqlite3.connect(f"{wrapper.context.database_name}.sqlite").cursor()
+    error = _internal_tables_error(query)
+    if error:
+        return error
+    backend = get_backend(wrapper.context)
+    executed = query
+    conn = backend.connect()
+    try:
+        # Repeated aggregate queries are served from managed summary tables, the only writes made here
+        executed = materialized_query(backend, conn, query)
+    except Exception:
+        backend.rollback(conn)
+    finally:
+        conn.close()
+    conn = backend.connect(read_only=True)
+    cursor = backend.cursor(conn)
     try:
-        cursor.execute(query)
-        rows = cursor.fetchmany(10)
-        return str(rows)
+        cursor.execute(executed)
+        if cursor.description is None or not keep_dataset:
+            return str(cursor.fetchmany(10))
+        rows, table = fetch_result(backend, cursor)
+        if table is None:
+            reason = f"the result has more than {DATASET_MAX_ROWS:,} rows" if rows else "the query returned no rows"
+            return f"{rows}\nNo dataset was kept ({reason}): report dataset_id as null, other tools have to run the query themselves."
+        # The full result is kept in memory so other agents can use it without re-running the query
+        dataset_id = register_dataset(table, query)
+        return f"{rows}\nDataset ID: {dataset_id} ({len(table)} rows)"
     except Exception as e:
         return f"Error executing query: {e}"
+    finally:
+        conn.close()
 
 @function_tool
+@shape_output(max_chars=8_000)
 def describe_database(wrapper: RunContextWrapper[InputData]) -> str:
     """Describe the DataBase schema by listing tables available and their attributes
     """
-    cursor = sqlite3.connect(f"{wrapper.context.database_name}.sqlite").cursor()
-    # List all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [row[0] for row in cursor.fetchall()]
-    
-    db_description = {}
+    backend = get_backend(wrapper.context)
+    return catalog(backend, "schema", progress_callback=wrapper.context.progress_callback)
 
-    for table in tables:
-        cursor.execute(f"PRAGMA table_info({table});")
-        columns = cursor.fetchall()
-        db_description[table] = [{"column_name": col[1], "type": col[2]} for col in columns]
+@function_tool
+@shape_output()
+def search_schema(wrapper: RunContextWrapper[InputData], question: str, top_k: int = 5, token_budget: int = 1500) -> str:
+    """Find the tables relevant to a question, with their columns and the joins between them.
+    Much smaller than `describe_database` on databases with many tables.
 
-    return db_description
+    Args:
+        question: The user's question, or the entities and measures it is about
+        top_k: Maximum number of relevant tables to return (tables needed to join them are added)
+        token_budget: Approximate maximum size of the answer in tokens
+    """
+    backend = get_backend(wrapper.context)
+    return schema_index(backend).summary(question, top_k=top_k, token_budget=token_budget)
 
 @function_tool
+@shape_output(max_chars=8_000)
 def profile_database(wrapper: RunContextWrapper[InputData]) -> str:    
     """Describe in detail the possible values that the columns of the tables in the DataBase can assume. For example possible transaction types etc
     """
-    cursor = sqlite3.connect(f"{wrapper.context.database_name}.sqlite").cursor()
-    # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [row[0] for row in cursor.fetchall()]
-    max_unique_values = 20
-    db_profile = {}
-
-    for table in tables:
-        table_info = []
-        cursor.execute(f"PRAGMA table_info({table});")
-        columns = cursor.fetchall()
-
-        for col in columns:
-            column_name = col[1]
-            col_type = col[2]
-
-            # Try to detect distinct values if it's TEXT or looks categorical
-            cursor.execute(f"SELECT COUNT(DISTINCT {column_name}) FROM {table};")
-            distinct_count = cursor.fetchone()[0]
-
-            # If not too many distinct values, fetch them
-            sample_values = []
-            if distinct_count <= max_unique_values:
-                cursor.execute(f"SELECT DISTINCT {column_name} FROM {table} LIMIT {max_unique_values};")
-                sample_values = [row[0] for row in cursor.fetchall()]
-
-            table_info.append({
-                "column_name": column_name,
-                "type": col_type,
-                "distinct_count": distinct_count,
-                "sample_values": sample_values
-            })
-
-        db_profile[table] = table_info
-
-    return db_profile
+    backend = get_backend(wrapper.context)
+    return catalog(backend, "profile", progress_callback=wrapper.context.progress_callback)
 
 @function_tool
+@shape_output()
 def create_table(wrapper: RunContextWrapper[InputData], create_query: str) -> str:
     """
     Create a new table in the database using a CREATE TABLE AS SELECT SQL statement.
@@ -86,21 +101,31 @@ def create_table(wrapper: RunContextWrapper[InputData], create_query: str) -> st
     Args:
         create_query: The SQL query to create the table.
     """
+    error = _internal_tables_error(create_query)
+    if error:
+        return error
+    conn = None
     try:
-        if wrapper.context.human_confirmation:
-            conn = sqlite3.connect(f"{wrapper.context.database_name}.sqlite")
-            cursor = conn.cursor()
+        if take_confirmation(wrapper.context):
+            backend = get_backend(wrapper.context)
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            recorder = ChangeRecorder(backend, conn, "create_table")
+            recorder.before(cursor, create_query)
             cursor.execute(create_query)
             conn.commit()
+            recorder.save()
             return "✅ Table created successfully."
         else:
             return "❌ Human confirmation required. Please confirm the action."
     except Exception as e:
         return f"❌ Error creating table: {e}"
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 @function_tool
+@shape_output()
 def drop_table(wrapper: RunContextWrapper[InputData], table_name: str) -> str:
     """
     Drop a table from the database.
@@ -108,21 +133,30 @@ def drop_table(wrapper: RunContextWrapper[InputData], table_name: str) -> str:
     Args:
         table_name: Name of the table to be dropped.
     """
+    error = _internal_tables_error(table_name)
+    if error:
+        return error
+    conn = None
     try:
-        if wrapper.context.human_confirmation:
-            conn = sqlite3.connect(f"{wrapper.context.database_name}.sqlite")
-            cursor = conn.cursor()
-            cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+        if take_confirmation(wrapper.context):
+            backend = get_backend(wrapper.context)
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            recorder = ChangeRecorder(backend, conn, "drop_table")
+            recorder.drop(cursor, table_name)
             conn.commit()
+            recorder.save()
             return f"✅ Table '{table_name}' dropped successfully."
         else:
             return "❌ Human confirmation required. Please confirm the action."
     except Exception as e:
         return f"❌ Error dropping table: {e}"
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 @function_tool
+@shape_output()
 def update_records(wrapper: RunContextWrapper[InputData], update_query: str) -> str:
     """
     Update records in a table using a valid UPDATE SQL query.
@@ -130,21 +164,32 @@ def update_records(wrapper: RunContextWrapper[InputData], update_query: str) ->
     Args:
         update_query: SQL UPDATE statement with WHERE clause recommended.
     """
+    error = _internal_tables_error(update_query)
+    if error:
+        return error
+    conn = None
     try:
-        if wrapper.context.human_confirmation:
-            conn = sqlite3.connect(f"{wrapper.context.database_name}.sqlite")
-            cursor = conn.cursor()
+        if take_confirmation(wrapper.context):
+            backend = get_backend(wrapper.context)
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            recorder = ChangeRecorder(backend, conn, "update_records")
+            recorder.before(cursor, update_query)
             cursor.execute(update_query)
+            rows_affected = backend.rowcount(cursor)
             conn.commit()
-            return f"✅ Records updated successfully. Rows affected: {cursor.rowcount}"
+            recorder.save()
+            return f"✅ Records updated successfully. Rows affected: {rows_affected}"
         else:
             return "❌ Human confirmation required. Please confirm the action."
     except Exception as e:
         return f"❌ Error updating records: {e}"
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 @function_tool
+@shape_output()
 def insert_record(wrapper: RunContextWrapper[InputData], insert_query: str) -> str:
     """
     Insert new record(s) into a table using a valid INSERT INTO SQL statement.
@@ -152,21 +197,31 @@ def insert_record(wrapper: RunContextWrapper[InputData], insert_query: str) -> s
     Args:
         insert_query: SQL INSERT statement.
     """
+    error = _internal_tables_error(insert_query)
+    if error:
+        return error
+    conn = None
     try:
-        if wrapper.context.human_confirmation:
-            conn = sqlite3.connect(f"{wrapper.context.database_name}.sqlite")
-            cursor = conn.cursor()
+        if take_confirmation(wrapper.context):
+            backend = get_backend(wrapper.context)
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            recorder = ChangeRecorder(backend, conn, "insert_record")
+            recorder.before(cursor, insert_query)
             cursor.execute(insert_query)
             conn.commit()
-            return f"✅ Record inserted successfully. Row ID: {cursor.lastrowid}"
+            recorder.save()
+            return f"✅ Record inserted successfully. Row ID: {getattr(cursor, 'lastrowid', None)}"
         else:
             return "❌ Human confirmation required. Please confirm the action."
     except Exception as e:
         return f"❌ Error inserting record: {e}"
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 @function_tool
+@shape_output()
 def delete_records(wrapper: RunContextWrapper[InputData], delete_query: str) -> str:
     """
     Delete record(s) from a table using a valid DELETE SQL statement.
@@ -174,16 +229,135 @@ def delete_records(wrapper: RunContextWrapper[InputData], delete_query: str) ->
     Args:
         delete_query: SQL DELETE statement with WHERE clause recommended.
     """
+    error = _internal_tables_error(delete_query)
+    if error:
+        return error
+    conn = None
     try:
-        if wrapper.context.human_confirmation:
-            conn = sqlite3.connect(f"{wrapper.context.database_name}.sqlite")
-            cursor = conn.cursor()
+        if take_confirmation(wrapper.context):
+            backend = get_backend(wrapper.context)
+            conn = backend.connect()
+            cursor = backend.cursor(conn)
+            recorder = ChangeRecorder(backend, conn, "delete_records")
+            recorder.before(cursor, delete_query)
             cursor.execute(delete_query)
+            rows_affected = backend.rowcount(cursor)
             conn.commit()
-            return f"✅ Records deleted successfully. Rows affected: {cursor.rowcount}"
+            recorder.save()
+            return f"✅ Records deleted successfully. Rows affected: {rows_affected}"
         else:
             return "❌ Human confirmation required. Please confirm the action."
     except Exception as e:
         return f"❌ Error deleting records: {e}"
     finally:
-        conn.close()
\ No newline at end of file
+        if conn is not None:
+            conn.close()
+
+def _run_write_batch(wrapper: RunContextWrapper[InputData], tool: str, run_statements, dry_run: bool) -> str:
+    """
+    Run `run_statements(backend, cursor, recorder)` inside a single transaction. The callable
+    snapshots each statement with the undo recorder before running it and returns a list of
+    (statement, rows_affected) tuples. Dry runs are rolled back, real runs are committed as one
+    undoable change and consume the human confirmation, like every write tool.
+    """
+    if not dry_run and not take_confirmation(wrapper.context):
+        return "❌ Human confirmation required. Please confirm the action."
+
+    backend = get_backend(wrapper.context)
+    conn = backend.connect()
+    cursor = backend.cursor(conn)
+    recorder = ChangeRecorder(backend, conn, tool)
+    try:
+        cursor.execute("BEGIN;")
+        counts = run_statements(backend, cursor, recorder)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+            recorder.save()
+    except Exception as e:
+        conn.rollback()
+        return f"❌ Error executing batch, no changes were applied: {e}"
+    finally:
+        conn.close()
+
+    total = sum(count for _, count in counts)
+    lines = [f"- {statement[:80]}: {count} rows" for statement, count in counts]
+    if dry_run:
+        header = f"🔍 Dry run: the batch would affect {total} rows (rolled back)."
+    else:
+        header = f"✅ Batch committed in a single transaction. Rows affected: {total}"
+    return "\n".join([header] + lines)
+
+@function_tool
+@shape_output()
+def execute_write_batch(wrapper: RunContextWrapper[InputData], statements: List[str], dry_run: bool) -> str:
+    """
+    Execute many INSERT, UPDATE or DELETE statements in a single transaction.
+    Either all statements are applied or none of them.
+
+    Args:
+        statements: List of SQL write statements, executed in order.
+        dry_run: If true, only report the rows each statement would affect and roll back.
+    """
+    error = _internal_tables_error(*statements)
+    if error:
+        return error
+
+    def run_statements(backend, cursor, recorder):
+        counts = []
+        for statement in statements:
+            recorder.before(cursor, statement)
+            cursor.execute(statement)
+            counts.append((statement, backend.rowcount(cursor)))
+        return counts
+
+    return _run_write_batch(wrapper, "execute_write_batch", run_statements, dry_run)
+
+@function_tool
+@shape_output()
+def execute_many(wrapper: RunContextWrapper[InputData], statement: str, rows_json: str, dry_run: bool) -> str:
+    """
+    Execute one parameterized write statement for many rows in a single transaction.
+
+    Args:
+        statement: SQL statement with `?` placeholders, e.g. INSERT INTO users (name, age) VALUES (?, ?)
+        rows_json: JSON list of rows, each row being a list of values matching the placeholders.
+        dry_run: If true, only report the rows the statement would affect and roll back.
+    """
+    try:
+        rows = json.loads(rows_json)
+    except json.JSONDecodeError as e:
+        return f"❌ Invalid rows_json: {e}"
+    if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+        return "❌ rows_json must be a JSON list of lists."
+    error = _internal_tables_error(statement)
+    if error:
+        return error
+
+    def run_statements(backend, cursor, recorder):
+        recorder.before(cursor, statement, params_list=rows)
+        cursor.executemany(statement, rows)
+        return [(f"{statement} x {len(rows)}", backend.rowcount(cursor))]
+
+    return _run_write_batch(wrapper, "execute_many", run_statements, dry_run)
+
+@function_tool
+@shape_output()
+def undo_last_change(wrapper: RunContextWrapper[InputData]) -> str:
+    """
+    Revert the most recent change made by the write tools (create, drop, insert, update, delete,
+    batches, tables written by `score_table`), restoring the rows or tables from the snapshot taken before it.
+    Requires human confirmation, ask for it with a description of the change to revert.
+    """
+    backend = get_backend(wrapper.context)
+    if not take_confirmation(wrapper.context):
+        change = last_change(backend)
+        if change is None:
+            return "Nothing to undo."
+        return f"❌ Human confirmation required to undo: {describe_change(change)}"
+    try:
+        result = undo_change(backend)
+    except Exception as e:
+        return f"❌ Error undoing the last change, nothing was reverted: {e}"
+    return f"✅ {result}"
@@ -0,0 +1,325 @@
+"""
+Undo snapshots and journal of the destructive SQL tools.
+
+Before a write statement runs, in the same transaction, only what is needed to revert it is kept:
+
+- UPDATE / DELETE: the rows matching the statement's WHERE clause, with their rowid, are copied
+  to a shadow table. When the rows cannot be selected on their own (UPDATE ... FROM, tables
+  without rowid) the whole table is copied instead.
+- INSERT: the highest rowid of the table, the new rows are the ones above it.
+- DROP TABLE: the table is copied to a shadow table with its rowids, and the DDL of the table,
+  its indexes and its triggers is kept, then the table is really dropped. Renaming it instead
+  would rewrite the foreign keys, views and triggers referencing it to point at the shadow table.
+- CREATE TABLE: the name of the new table, undone by dropping it.
+
+Shadow tables are named `_cli_undo_<change>_<step>` and hidden from the agents like every
+internal table. Each committed change is appended to a JSONL journal next to the database
+(`<database>.undo.jsonl`), undoing a change appends an "undone" line. Only the last
+`UNDO_MAX_CHANGES` changes keep their snapshots. Saving or undoing a change also invalidates
+the summary tables (see `materialize`) of the tables whose rows it may have rewritten.
+
+Snapshots are taken on the SQLite backend only, DuckDB writes are journaled as not undoable.
+Inserts with explicit rowids below the high-water mark and INSERT OR REPLACE overwrites are not
+reverted.
+"""
+import json
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from cli_data_ai.tools.db.backends import INTERNAL_TABLE_PREFIX, quote_identifier
+from cli_data_ai.tools.db.materialize import _find_top_level, _top_level_mask, invalidate_summaries
+from cli_data_ai.tools.db.profiler import metadata_write
+
+UNDO_PREFIX = f"{INTERNAL_TABLE_PREFIX}undo_"
+UNDO_MAX_CHANGES = 20
+ROWID_COLUMN = "_cli_rowid"
+
+_TABLE = r"(?P<table>\"[^\"]+\"|\[[^\]]+\]|`[^`]+`|[\w.]+)"
+UPDATE_RE = re.compile(rf"^\s*UPDATE\s+(?:OR\s+\w+\s+)?{_TABLE}\s+SET\s", re.I)
+DELETE_RE = re.compile(rf"^\s*DELETE\s+FROM\s+{_TABLE}", re.I)
+INSERT_RE = re.compile(rf"^\s*(?:INSERT|REPLACE)\s+(?:OR\s+\w+\s+)?INTO\s+{_TABLE}", re.I)
+CREATE_RE = re.compile(rf"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?{_TABLE}", re.I)
+UPSERT_RE = re.compile(r"^\s*REPLACE\b|\bOR\s+REPLACE\b|\bON\s+CONFLICT\b", re.I)
+
+_journal_lock = threading.Lock()
+
+def journal_path(backend) -> str:
+    return f"{backend.database_name}.undo.jsonl"
+
+def _unquote(name: str) -> str:
+    if name[:1] in "\"[`":
+        return name[1:-1]
+    return name
+
+def _where_clause(statement: str):
+    """(condition, placeholders before it) of the top-level WHERE, None when there is none"""
+    sql = statement.strip().rstrip(";")
+    mask = _top_level_mask(sql)
+    where = _find_top_level(sql, mask, r"\bWHERE\b")
+    if not where:
+        return None
+    start = where[0].end()
+    # Rows beyond a LIMIT are captured too, restoring rows that did not change is harmless
+    end_matches = [m for m in _find_top_level(sql, mask, r"\b(RETURNING|ORDER\s+BY|LIMIT)\b") if m.start() > start]
+    end = end_matches[0].start() if end_matches else len(sql)
+    return sql[start:end].strip(), sql[:start].count("?")
+
+def _table_exists(cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?;", (table,))
+    return cursor.fetchone() is not None
+
+def _table_ddl(cursor, table: str) -> list:
+    """CREATE statements of the table, then of its indexes and triggers"""
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+        "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END;",
+        (table,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _columns(cursor, table: str) -> list:
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+    return [row[1] for row in cursor.fetchall()]
+
+
+class ChangeRecorder:
+    """
+    Takes the undo snapshots of the statements run on one connection, then journals them as
+    one change once the transaction is committed:
+
+        recorder = ChangeRecorder(backend, conn, "update_records")
+        recorder.before(cursor, statement)
+        cursor.execute(statement)
+        conn.commit()
+        recorder.save()
+    """
+    def __init__(self, backend, conn, tool: str):
+        self.backend = backend
+        self.conn = conn
+        self.tool = tool
+        self.enabled = backend.name == "sqlite"
+        self.change_id = f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}_{uuid.uuid4().hex[:6]}"
+        self.steps = []
+
+    def _shadow(self) -> str:
+        return f"{UNDO_PREFIX}{self.change_id}_{len(self.steps)}"
+
+    def _begin(self, cursor):
+        # The snapshot DDL must be part of the write's transaction, sqlite3 only opens one for DML
+        if not self.conn.in_transaction:
+            cursor.execute("BEGIN;")
+
+    def before(self, cursor, statement: str, params_list: list = None):
+        """Snapshot what `statement` (run once, or once per params of `params_list`) will change"""
+        if not self.enabled:
+            self.steps.append({"kind": "unrecorded", "statement": statement[:200]})
+            return
+        self._begin(cursor)
+        for pattern, capture in ((UPDATE_RE, self._rows), (DELETE_RE, self._rows), (INSERT_RE, self._insert), (CREATE_RE, self._create)):
+            match = pattern.match(statement)
+            if match:
+                capture(cursor, _unquote(match.group("table")), statement, params_list)
+                return
+        self.steps.append({"kind": "unrecorded", "statement": statement[:200]})
+
+    def _rows(self, cursor, table: str, statement: str, params_list):
+        shadow = self._shadow()
+        quoted, quoted_shadow = quote_identifier(table), quote_identifier(shadow)
+        where = _where_clause(statement)
+        try:
+            cursor.execute("SAVEPOINT undo_capture;")
+            if where is None:
+                cursor.execute(f"CREATE TABLE {quoted_shadow} AS SELECT rowid AS {ROWID_COLUMN}, * FROM {quoted};")
+            else:
+                condition, skipped = where
+                cursor.execute(f"CREATE TABLE {quoted_shadow} AS SELECT rowid AS {ROWID_COLUMN}, * FROM {quoted} WHERE 0;")
+                # The first snapshot of a row is its state before the change
+                insert = (
+                    f"INSERT INTO {quoted_shadow} SELECT rowid, * FROM {quoted} WHERE ({condition}) "
+                    f"AND rowid NOT IN (SELECT {ROWID_COLUMN} FROM {quoted_shadow});"
+                )
+                for params in params_list or [[]]:
+                    cursor.execute(insert, list(params)[skipped:])
+            cursor.execute("RELEASE undo_capture;")
+            kind = "rows"
+        except Exception:
+            cursor.execute("ROLLBACK TO undo_capture;")
+            cursor.execute("RELEASE undo_capture;")
+            cursor.execute(f"CREATE TABLE {quoted_shadow} AS SELECT * FROM {quoted};")
+            kind = "table"
+        self.steps.append({"kind": kind, "table": table, "shadow": shadow, "statement": statement[:200]})
+
+    def _insert(self, cursor, table: str, statement: str, params_list):
+        cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {quote_identifier(table)};")
+        self.steps.append({"kind": "insert", "table": table, "high_water": cursor.fetchone()[0], "statement": statement[:200]})
+
+    def _create(self, cursor, table: str, statement: str, params_list):
+        if not _table_exists(cursor, table):
+            self.steps.append({"kind": "create", "table": table, "statement": statement[:200]})
+
+    def drop(self, cursor, table: str):
+        """Drop the table, after copying it and its DDL to a shadow table when undo is enabled"""
+        table = _unquote(table.strip())
+        if self.enabled and _table_exists(cursor, table):
+            self._begin(cursor)
+            shadow = self._shadow()
+            quoted, quoted_shadow = quote_identifier(table), quote_identifier(shadow)
+            try:
+                cursor.execute("SAVEPOINT undo_capture;")
+                cursor.execute(f"CREATE TABLE {quoted_shadow} AS SELECT rowid AS {ROWID_COLUMN}, * FROM {quoted};")
+                cursor.execute("RELEASE undo_capture;")
+            except Exception:
+                # Tables without rowid
+                cursor.execute("ROLLBACK TO undo_capture;")
+                cursor.execute("RELEASE undo_capture;")
+                cursor.execute(f"CREATE TABLE {quoted_shadow} AS SELECT * FROM {quoted};")
+            self.steps.append({
+                "kind": "drop", "table": table, "shadow": shadow, "ddl": _table_ddl(cursor, table),
+                "statement": f"DROP TABLE {table}",
+            })
+        elif not self.enabled:
+            self.steps.append({"kind": "unrecorded", "statement": f"DROP TABLE {table}"})
+        cursor.execute(f"DROP TABLE IF EXISTS {quote_identifier(table)};")
+
+    def modified_tables(self):
+        """Tables whose existing rows the change may have rewritten, None when unknown"""
+        tables = []
+        for step in self.steps:
+            if step["kind"] == "unrecorded":
+                return None
+            if step["kind"] != "insert" or UPSERT_RE.search(step["statement"]):
+                tables.append(step["table"])
+        return tables
+
+    def save(self):
+        """Journal the change and invalidate the summaries it makes stale, call after the commit"""
+        if not self.steps:
+            return
+        tables = self.modified_tables()
+        if tables is None or tables:
+            invalidate_summaries(self.backend, self.conn, tables)
+        entry = {
+            "change_id": self.change_id,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "tool": self.tool,
+            "steps": self.steps,
+        }
+        _append(self.backend, entry)
+        _expire_old_changes(self.backend)
+
+
+def _append(backend, entry: dict):
+    with _journal_lock:
+        with open(journal_path(backend), "a", encoding="utf-8") as journal:
+            journal.write(json.dumps(entry, default=str) + "\n")
+
+def _read_journal(backend) -> list:
+    try:
+        with open(journal_path(backend), encoding="utf-8") as journal:
+            return [json.loads(line) for line in journal if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def _open_changes(backend) -> list:
+    """Changes still undoable, oldest first"""
+    entries = _read_journal(backend)
+    closed = {entry.get("undone") or entry.get("expired") for entry in entries if "change_id" not in entry}
+    return [entry for entry in entries if "change_id" in entry and entry["change_id"] not in closed]
+
+def _drop_shadows(cursor, change: dict):
+    for step in change["steps"]:
+        if step.get("shadow"):
+            cursor.execute(f"DROP TABLE IF EXISTS {quote_identifier(step['shadow'])};")
+
+def _expire_old_changes(backend):
+    """Drop the snapshots of the changes beyond the last UNDO_MAX_CHANGES"""
+    changes = _open_changes(backend)
+    expired = changes[:-UNDO_MAX_CHANGES]
+    if not expired:
+        return
+    with metadata_write(backend.path):
+        conn = backend.connect()
+        try:
+            cursor = backend.cursor(conn)
+            for change in expired:
+                _drop_shadows(cursor, change)
+            conn.commit()
+        finally:
+            conn.close()
+    for change in expired:
+        _append(backend, {"expired": change["change_id"], "time": datetime.now(timezone.utc).isoformat()})
+
+def last_change(backend) -> dict:
+    """Most recent change that can still be undone, or None"""
+    changes = _open_changes(backend)
+    return changes[-1] if changes else None
+
+def describe_change(change: dict) -> str:
+    statements = "; ".join(step["statement"] for step in change["steps"])
+    return f"{change['tool']} at {change['time']}: {statements}"
+
+def _revert_step(cursor, step: dict):
+    table = quote_identifier(step["table"])
+    kind = step["kind"]
+    if kind == "rows":
+        shadow = quote_identifier(step["shadow"])
+        columns = [c for c in _columns(cursor, step["shadow"]) if c != ROWID_COLUMN]
+        column_list = ", ".join(quote_identifier(c) for c in columns)
+        cursor.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT {ROWID_COLUMN} FROM {shadow});")
+        cursor.execute(f"INSERT INTO {table} (rowid, {column_list}) SELECT {ROWID_COLUMN}, {column_list} FROM {shadow};")
+    elif kind == "table":
+        cursor.execute(f"DELETE FROM {table};")
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {quote_identifier(step['shadow'])};")
+    elif kind == "insert":
+        cursor.execute(f"DELETE FROM {table} WHERE rowid > ?;", (step["high_water"],))
+    elif kind == "create":
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
+    elif kind == "drop":
+        if _table_exists(cursor, step["table"]):
+            raise ValueError(f"A table named {step['table']} exists again, drop or rename it first")
+        shadow = quote_identifier(step["shadow"])
+        if "ddl" not in step:
+            # Journaled when drops were renames
+            cursor.execute(f"ALTER TABLE {shadow} RENAME TO {table};")
+            return
+        table_ddl, *other_ddl = step["ddl"]
+        cursor.execute(table_ddl)
+        shadow_columns = _columns(cursor, step["shadow"])
+        column_list = ", ".join(quote_identifier(c) for c in shadow_columns if c != ROWID_COLUMN)
+        if ROWID_COLUMN in shadow_columns:
+            cursor.execute(f"INSERT INTO {table} (rowid, {column_list}) SELECT {ROWID_COLUMN}, {column_list} FROM {shadow};")
+        else:
+            cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {shadow};")
+        for ddl in other_ddl:
+            cursor.execute(ddl)
+
+def undo_last_change(backend) -> str:
+    """Revert the most recent undoable change in one transaction, returns a description"""
+    change = last_change(backend)
+    if change is None:
+        return "Nothing to undo."
+    unrecorded = [step["statement"] for step in change["steps"] if step["kind"] == "unrecorded"]
+    if unrecorded:
+        raise ValueError(f"The last change cannot be undone, no snapshot was taken for: {'; '.join(unrecorded)}")
+
+    conn = backend.connect()
+    try:
+        cursor = backend.cursor(conn)
+        cursor.execute("BEGIN;")
+        for step in reversed(change["steps"]):
+            _revert_step(cursor, step)
+        _drop_shadows(cursor, change)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    _append(backend, {"undone": change["change_id"], "time": datetime.now(timezone.utc).isoformat()})
+    conn = backend.connect()
+    try:
+        invalidate_summaries(backend, conn, [step["table"] for step in change["steps"]])
+    finally:
+        conn.close()
+    return f"Undone {describe_change(change)}"
@@ -0,0 +1,172 @@
+"""
+Cross-validated evaluation of candidate models.
+
+Folds run in parallel worker processes, boosting and neural models use early stopping,
+each model gets a wall-clock budget, and successive halving drops weak candidates on
+small subsamples before the strong ones are evaluated on the full data.
+
+The preprocessing is fitted once per fold (`transform_folds`) and the transformed fold
+matrices are shared by every candidate model evaluated on them.
+"""
+import math
+import time
+from cli_data_ai.tools.ml.models import build_model, fit_model, score_model, is_classification, task_name
+
+def transform_folds(X, y, preprocessor, target_type: str, cv_folds: int = 5, random_state: int = 42) -> list:
+    """
+    Split the rows in k folds and fit a copy of the (unfitted) preprocessor on each training part.
+
+    Returns:
+        A list of (X_train, y_train, X_val, y_val) transformed matrices, one per fold.
+    """
+    import numpy as np
+    from sklearn.base import clone
+    from sklearn.model_selection import KFold, StratifiedKFold
+
+    y = np.asarray(y)
+    splitter_cls = StratifiedKFold if is_classification(target_type) else KFold
+    splitter = splitter_cls(n_splits=cv_folds, shuffle=True, random_state=random_state)
+    folds = []
+    for train_idx, val_idx in splitter.split(X, y):
+        fold_preprocessor = clone(preprocessor)
+        X_train = fold_preprocessor.fit_transform(X.iloc[train_idx], y[train_idx])
+        folds.append((X_train, y[train_idx], fold_preprocessor.transform(X.iloc[val_idx]), y[val_idx]))
+    return folds
+
+def _fit_fold(model_type, target_type, X_train, y_train, X_val, y_val, params, early_stopping):
+    start = time.perf_counter()
+    model = build_model(model_type, target_type, params=params, early_stopping=early_stopping)
+    fit_model(model, model_type, X_train, y_train)
+    fit_time = time.perf_counter() - start
+    return score_model(model, X_val, y_val, target_type), fit_time, model
+
+def cross_validate_model(model_type: str, folds: list, target_type: str, params: dict = None,
+                         early_stopping: bool = True, time_budget: float = None, n_jobs: int = -1) -> dict:
+    """
+    Score a model with k-fold cross-validation on the matrices of `transform_folds`, running
+    the folds in parallel.
+
+    With a `time_budget` (seconds) the folds run in waves: the first fold alone, to measure how
+    long a fold takes, then one fold per worker. A wave is only started when it is expected to end
+    within the budget, otherwise the scores of the completed folds are returned. Running folds are
+    not interrupted, so the budget can still be exceeded when a wave is slower than the previous one.
+
+    Returns:
+        dict with score (mean), score_std, fit_time (mean seconds per fold), folds_completed,
+        timed_out and model (the estimator of the last completed fold).
+    """
+    import numpy as np
+    from joblib import Parallel, delayed, effective_n_jobs
+
+    def run(batch):
+        return Parallel(n_jobs=min(effective_n_jobs(n_jobs), len(batch)))(
+            delayed(_fit_fold)(model_type, target_type, X_train, y_train, X_val, y_val, params, early_stopping)
+            for X_train, y_train, X_val, y_val in batch
+        )
+
+    if time_budget:
+        start = time.perf_counter()
+        results, remaining, wave_size, wave_time = [], list(folds), 1, 0.0
+        while remaining and (not results or time.perf_counter() - start + wave_time <= time_budget):
+            batch, remaining = remaining[:wave_size], remaining[wave_size:]
+            wave_start = time.perf_counter()
+            results += run(batch)
+            wave_time = time.perf_counter() - wave_start
+            wave_size = effective_n_jobs(n_jobs)
+    else:
+        results = run(folds)
+    if not results:
+        raise ValueError("No fold to evaluate the model on")
+    scores = [score for score, _, _ in results]
+    fit_times = [fit_time for _, fit_time, _ in results]
+
+    return {
+        "score": float(np.mean(scores)),
+        "score_std": float(np.std(scores)),
+        "fit_time": float(np.mean(fit_times)),
+        "folds_completed": len(scores),
+        "timed_out": len(scores) < len(folds),
+        "model": results[-1][2],
+    }
+
+def successive_halving(model_types: list, X, y, target_type: str, preprocessor, cv_folds: int = 5,
+                       time_budget: float = None, min_rows: int = None, random_state: int = 42) -> list:
+    """
+    Evaluate candidates on a growing subsample of rows, keeping the best half at each rung
+    until the survivors are evaluated on all the rows. For classification the subsamples are
+    stratified and the smallest one holds at least `cv_folds` rows of the rarest class, so no
+    candidate is eliminated by a fold missing a class.
+
+    Args:
+        X: Raw feature frame.
+        y: Encoded target.
+        preprocessor: Unfitted preprocessing, fitted per fold and shared by the candidates of a rung.
+
+    Returns:
+        A list of results, one per candidate, best first. Each result has model, score, score_std,
+        fit_time, rows (of the last rung reached), folds_completed, eliminated and type. The final
+        survivors also have their estimator refitted on all rows under `estimator` and its fitted
+        preprocessing under `preprocessor`; eliminated candidates have neither, their score was
+        measured on a subsample only.
+    """
+    import numpy as np
+    from sklearn.base import clone
+    from sklearn.model_selection import train_test_split
+
+    y = np.asarray(y)
+    n_rows = len(X)
+    classification = is_classification(target_type)
+    n_rungs = max(1, math.ceil(math.log2(max(len(model_types), 1)))) + 1 if len(model_types) > 1 else 1
+    min_rows = max(min_rows or n_rows // 2 ** (n_rungs - 1), cv_folds * 10)
+    if classification:
+        rarest = np.unique(y, return_counts=True)[1].min()
+        min_rows = max(min_rows, math.ceil(cv_folds * n_rows / rarest))
+
+    results = {}
+    candidates = list(model_types)
+    for rung in range(n_rungs):
+        rows = n_rows if rung == n_rungs - 1 else min(n_rows, min_rows * 2 ** rung)
+        if rows < n_rows and classification:
+            sample, _ = train_test_split(np.arange(n_rows), train_size=rows, stratify=y, random_state=random_state)
+        else:
+            sample = np.random.RandomState(random_state).permutation(n_rows)[:rows]
+        try:
+            folds = transform_folds(X.iloc[sample], y[sample], preprocessor, target_type, cv_folds, random_state)
+        except Exception as e:
+            if rows < n_rows:
+                # The subsample cannot be split in cv_folds (e.g. too few rows of a class), try a larger one
+                continue
+            for model_type in candidates:
+                results[model_type] = {"model": model_type, "error": str(e), "score": float("-inf"), "rows": rows}
+            break
+
+        for model_type in candidates:
+            try:
+                evaluation = cross_validate_model(model_type, folds, target_type, time_budget=time_budget)
+            except Exception as e:
+                results[model_type] = {"model": model_type, "error": str(e), "score": float("-inf"), "rows": rows}
+                continue
+            # Fold estimators were fitted with their fold's preprocessing, only refitted survivors are kept
+            evaluation.pop("model")
+            results[model_type] = {"model": model_type, **evaluation, "rows": rows}
+
+        ranked = sorted(candidates, key=lambda m: results[m]["score"], reverse=True)
+        if rows == n_rows or len(ranked) == 1:
+            candidates = ranked
+            break
+        candidates = ranked[:math.ceil(len(ranked) / 2)]
+
+    # Survivors are refitted on every row so they can be used for importance and scoring
+    survivors = [m for m in candidates if "error" not in results[m]]
+    if survivors:
+        full_preprocessor = clone(preprocessor)
+        X_full = full_preprocessor.fit_transform(X, y)
+        for model_type in survivors:
+            estimator = build_model(model_type, target_type, early_stopping=True)
+            results[model_type]["estimator"] = fit_model(estimator, model_type, X_full, y)
+            results[model_type]["preprocessor"] = full_preprocessor
+
+    for model_type, result in results.items():
+        result["eliminated"] = model_type not in candidates
+        result["type"] = task_name(target_type)
+    return sorted(results.values(), key=lambda r: r["score"], reverse=True)
@@ -0,0 +1,135 @@
+"""
+Model-agnostic feature importance, reported on the raw input columns.
+
+- xgboost: mean absolute SHAP contributions from the booster's native `pred_contribs`.
+- every other model: permutation importance on a held-out sample, each raw column shuffled
+  in parallel and the preprocessing re-applied, so text or datetime columns expanded into
+  several features are ranked as one column.
+- without held-out data (models refitted on all rows after cross-validation, tuning or out-of-core
+  training): the model's own `feature_importances_` or mean absolute `coef_` over all classes.
+
+The number of rows used is capped by a sample budget, and results are cached in the
+model artifact so asking again is free.
+"""
+IMPORTANCE_SAMPLE_ROWS = 2_000
+PERMUTATION_REPEATS = 5
+
+def feature_sources(preprocessor) -> list:
+    """Raw input column of each transformed feature, in the order of `preprocessing.feature_names`"""
+    if hasattr(preprocessor, "steps"):
+        preprocessor = preprocessor.steps[0][1]
+    sources = []
+    for name, _, cols in preprocessor.transformers_:
+        if name == "remainder" or not len(cols):
+            continue
+        output = preprocessor.output_indices_[name]
+        width = output.stop - output.start
+        # Every transformer emits the features of an input column next to each other
+        per_column = max(width // len(cols), 1)
+        sources.extend(cols[min(i // per_column, len(cols) - 1)] for i in range(width))
+    return sources
+
+def _by_column(values, sources: list) -> dict:
+    """Sum feature-level importances per raw column"""
+    totals = {}
+    for source, value in zip(sources, values):
+        totals[source] = totals.get(source, 0.0) + float(value)
+    return totals
+
+def _booster(model):
+    get_booster = getattr(model, "get_booster", None)
+    if get_booster is None:
+        return None
+    try:
+        return get_booster()
+    except Exception:
+        return None
+
+def shap_importance(booster, X, sources: list) -> dict:
+    """Mean absolute SHAP value per raw column from xgboost's `pred_contribs`"""
+    import numpy as np
+    import xgboost
+    contribs = booster.predict(xgboost.DMatrix(X), pred_contribs=True)
+    # (rows, features + bias) or (rows, classes, features + bias) for multiclass
+    contribs = np.abs(contribs[..., :-1])
+    if contribs.ndim == 3:
+        contribs = contribs.mean(axis=1)
+    return _by_column(contribs.mean(axis=0), sources)
+
+class _RawInputModel:
+    """Applies the fitted preprocessing before predicting, so raw columns can be permuted"""
+    def __init__(self, model, preprocessor):
+        self.model = model
+        self.preprocessor = preprocessor
+
+    def fit(self, X, y):
+        return self
+
+    def predict(self, X):
+        return self.model.predict(self.preprocessor.transform(X))
+
+def permutation_importance_raw(model, artifact: dict, X_raw, y, n_repeats: int = PERMUTATION_REPEATS,
+                               n_jobs: int = -1, random_state: int = 42) -> dict:
+    """Mean drop of the validation score when each raw column is shuffled, columns in parallel"""
+    from sklearn.inspection import permutation_importance
+    from cli_data_ai.tools.ml.models import score_model
+
+    target_type = artifact["target_type"]
+    result = permutation_importance(
+        _RawInputModel(model, artifact["preprocessor"]), X_raw, y,
+        scoring=lambda estimator, X, y_true: score_model(estimator, X, y_true, target_type),
+        n_repeats=n_repeats, n_jobs=n_jobs, random_state=random_state,
+    )
+    return dict(zip(X_raw.columns, result.importances_mean.tolist()))
+
+def native_importance(model, sources: list) -> dict:
+    """feature_importances_, or mean absolute coefficient across classes, per raw column"""
+    import numpy as np
+    if hasattr(model, "feature_importances_"):
+        values = np.asarray(model.feature_importances_)
+    elif hasattr(model, "coef_"):
+        coef = np.abs(np.asarray(model.coef_))
+        values = coef.mean(axis=0) if coef.ndim == 2 else coef
+    else:
+        return None
+    return _by_column(values, sources)
+
+def compute_importance(model, artifact: dict, sample_rows: int = IMPORTANCE_SAMPLE_ROWS, random_state: int = 42) -> dict:
+    """
+    Importance of each raw input column for a trained model, cached in the artifact.
+
+    Returns:
+        dict with method and importances (list of [column, value], most important first).
+    """
+    cached = artifact.get("importance")
+    if cached and cached["sample_rows"] >= sample_rows:
+        return cached
+
+    X_raw, y = artifact.get("validation") or (None, None)
+    if X_raw is not None and len(X_raw) > sample_rows:
+        import numpy as np
+        idx = np.random.RandomState(random_state).choice(len(X_raw), sample_rows, replace=False)
+        X_raw, y = X_raw.iloc[idx], y[idx]
+
+    sources = feature_sources(artifact["preprocessor"])
+    booster = _booster(model)
+    if booster is not None and X_raw is not None:
+        X = artifact["preprocessor"].transform(X_raw[list(artifact["plan"])])
+        method, values = "mean |SHAP| (xgboost pred_contribs)", shap_importance(booster, X, sources)
+    elif X_raw is not None:
+        method, values = "permutation importance (score drop)", permutation_importance_raw(model, artifact, X_raw, y)
+    else:
+        values = native_importance(model, sources)
+        if values is None:
+            raise ValueError("No held-out data available and the model has no native importances.")
+        method = "model importances"
+
+    # Identifier columns are not used by the model
+    values = {col: value for col, value in values.items() if artifact["plan"].get(col) != "id"}
+    result = {
+        "method": method,
+        "sample_rows": sample_rows,
+        "importances": sorted(([col, value] for col, value in values.items()), key=lambda item: -abs(item[1])),
+    }
+    artifact["importance"] = result
+    return result
@@ -0,0 +1,308 @@
+"""
+Size-aware training for input data that does not fit comfortably in memory.
+
+`get_input_data` estimates the size of the result set before loading it. When it exceeds the
+memory budget only a random sample is kept in the context and `run_model` picks a strategy
+per model type:
+
+- subsample: quadratic models (svm) and models without incremental training are fitted on a
+  stratified subsample.
+- incremental: linear models (as SGD) and mlp are trained with `partial_fit` on chunks read
+  from the database.
+- external_memory: xgboost is trained from a chunk iterator through its external memory
+  `ExtMemQuantileDMatrix` (or `QuantileDMatrix`) path.
+
+Chunks are encoded with the preprocessing fitted on the in-memory sample (see `preprocessing`),
+and every 5th chunk is held out for validation, mirroring the 80/20 split of the in-memory path.
+Results with fewer than 5 chunks hold out every 5th row of each chunk instead. Held-out rows
+are never trained on. For xgboost half of them drive early stopping and the other half is
+scored, so the reported score is not biased by the choice of the number of trees.
+"""
+import os
+import tempfile
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+SAMPLE_ROWS = 100_000
+CHUNK_SIZE = 50_000
+QUADRATIC_MODELS = {"svm"}
+QUADRATIC_MAX_ROWS = 20_000
+INCREMENTAL_MODELS = {"linear_regression", "logistic_regression", "mlp"}
+VALIDATION_EVERY = 5  # Every 5th chunk is used for validation
+VALIDATION_MAX_ROWS = 200_000
+SIZE_PROBE_ROWS = 1_000
+MEMORY_OVERHEAD = 3  # Encoding and model fitting make copies of the frame
+
+def _strip(query: str) -> str:
+    return query.strip().rstrip(";")
+
+def count_rows(cursor, query: str) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM ({_strip(query)});")
+    return cursor.fetchone()[0]
+
+def _frame(cursor, rows):
+    import pandas as pd
+    return pd.DataFrame(rows, columns=[desc[0] for desc in cursor.description])
+
+def iter_chunks(backend, query: str, chunk_size: int = CHUNK_SIZE, params: list = None):
+    """Yield the query results as DataFrames of up to `chunk_size` rows"""
+    conn = backend.connect(read_only=True)
+    cursor = backend.cursor(conn)
+    try:
+        cursor.execute(query, params or [])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield _frame(cursor, rows)
+    finally:
+        conn.close()
+
+def load_input(backend, query: str, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Load the query results, or a random sample of them when the estimated in-memory
+    size exceeds the budget.
+
+    Returns:
+        (df, info) with info = {rows, estimated_mb, out_of_core}
+    """
+    conn = backend.connect(read_only=True)
+    cursor = backend.cursor(conn)
+    try:
+        cursor.execute(query)
+        probe_rows = cursor.fetchmany(SIZE_PROBE_ROWS)
+        probe = _frame(cursor, probe_rows)
+        # Only results larger than the probe are counted, on a second cursor to keep this one open
+        n_rows = len(probe_rows) if len(probe_rows) < SIZE_PROBE_ROWS else count_rows(backend.stream_cursor(conn), query)
+        bytes_per_row = probe.memory_usage(deep=True).sum() / max(len(probe), 1)
+        estimated_mb = bytes_per_row * n_rows * MEMORY_OVERHEAD / 1024 ** 2
+
+        if estimated_mb <= memory_budget_mb:
+            # The probe's DB-API rows are reused as is, going through the frame would coerce their types
+            df = _frame(cursor, probe_rows + cursor.fetchall()) if probe_rows else probe
+            return df, {"rows": n_rows, "estimated_mb": round(estimated_mb, 1), "out_of_core": False}
+
+        cursor.execute(f"SELECT * FROM ({_strip(query)}) ORDER BY RANDOM() LIMIT {SAMPLE_ROWS};")
+        df = _frame(cursor, cursor.fetchall())
+        return df, {"rows": n_rows, "estimated_mb": round(estimated_mb, 1), "out_of_core": True}
+    finally:
+        conn.close()
+
+def training_strategy(model_type: str, n_rows: int, out_of_core: bool) -> str:
+    """Return one of: in_memory, subsample, incremental, external_memory"""
+    if out_of_core:
+        if model_type == "xgboost":
+            return "external_memory"
+        if model_type in INCREMENTAL_MODELS:
+            return "incremental"
+        return "subsample"
+    if model_type in QUADRATIC_MODELS and n_rows > QUADRATIC_MAX_ROWS:
+        return "subsample"
+    return "in_memory"
+
+def stratified_subsample(X, y, max_rows: int, classification: bool, random_state: int = 42):
+    """Subsample rows keeping the class proportions of the target for classification"""
+    from sklearn.model_selection import train_test_split
+    if len(X) <= max_rows:
+        return X, y
+    X_sample, _, y_sample, _ = train_test_split(
+        X, y, train_size=max_rows, random_state=random_state, stratify=y if classification else None,
+    )
+    return X_sample, y_sample
+
+
+def encode_chunk(chunk, preprocessor, target_column: str, label_classes):
+    """
+    Return (X, y) for a chunk with the preprocessing fitted on the in-memory sample, dropping
+    rows whose class was not seen in the sample (or without a target for regression).
+    """
+    import numpy as np
+    from cli_data_ai.tools.ml.preprocessing import encode_target
+    chunk = chunk[chunk[target_column].notna()]
+    X = preprocessor.transform(chunk.drop(columns=[target_column]))
+    y = encode_target(chunk[target_column], label_classes)
+    if label_classes is not None:
+        known = y >= 0
+        X, y = X[known], y[known]
+    return np.asarray(X, dtype=float), y
+
+
+class BoosterModel:
+    """Minimal estimator interface around an xgboost Booster trained from external memory"""
+    def __init__(self, booster, n_classes: int, feature_names: list, params: dict = None):
+        self.booster = booster
+        self.n_classes = n_classes
+        self.feature_names = feature_names
+        self.params = params or {}  # Training parameters, needed to continue boosting
+
+    def get_booster(self):
+        return self.booster
+
+    def _raw_predict(self, X):
+        import xgboost
+        # Early stopping keeps training EARLY_STOPPING_ROUNDS trees past the best one
+        best_iteration = self.booster.attr("best_iteration")
+        iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+        return self.booster.predict(xgboost.DMatrix(X), iteration_range=iteration_range)
+
+    def predict_proba(self, X):
+        import numpy as np
+        proba = self._raw_predict(X)
+        return np.column_stack([1 - proba, proba]) if self.n_classes == 2 else proba
+
+    def predict(self, X):
+        if not self.n_classes:
+            return self._raw_predict(X)
+        return self.predict_proba(X).argmax(axis=1)
+
+    @property
+    def feature_importances_(self):
+        import numpy as np
+        scores = self.booster.get_score(importance_type="gain")
+        importances = np.array([scores.get(f"f{i}", 0.0) for i in range(len(self.feature_names))])
+        total = importances.sum()
+        return importances / total if total else importances
+
+
+def _holdout_by_row(n_rows: int, chunk_size: int) -> bool:
+    """True when the result has fewer chunks than the validation period"""
+    return n_rows < chunk_size * VALIDATION_EVERY
+
+def _split_chunks(backend, query: str, chunk_size: int, by_row: bool, validation: bool):
+    """Yield the validation (or training) part of the query results, chunk by chunk"""
+    import numpy as np
+    for idx, chunk in enumerate(iter_chunks(backend, query, chunk_size)):
+        if by_row:
+            held_out = np.arange(len(chunk)) % VALIDATION_EVERY == VALIDATION_EVERY - 1
+            part = chunk[held_out if validation else ~held_out]
+            if len(part):
+                yield part
+        elif (idx % VALIDATION_EVERY == VALIDATION_EVERY - 1) == validation:
+            yield chunk
+
+def _training_chunks(backend, query: str, encode, chunk_size: int, by_row: bool):
+    """Yield encoded (X, y) training chunks, without the validation rows"""
+    for chunk in _split_chunks(backend, query, chunk_size, by_row, validation=False):
+        yield encode(chunk)
+
+def _validation_data(backend, query: str, encode, chunk_size: int, by_row: bool):
+    import numpy as np
+    X_parts, y_parts, n_rows = [], [], 0
+    for chunk in _split_chunks(backend, query, chunk_size, by_row, validation=True):
+        if n_rows >= VALIDATION_MAX_ROWS:
+            break
+        X, y = encode(chunk)
+        X_parts.append(X)
+        y_parts.append(y)
+        n_rows += len(y)
+    if not X_parts:
+        raise ValueError("Not enough rows to hold out validation data")
+    return np.vstack(X_parts), np.concatenate(y_parts)
+
+def train_incremental(backend, query: str, prepared, model_type: str, n_rows: int, chunk_size: int = CHUNK_SIZE):
+    """
+    Train an SGD (linear models) or MLP estimator with partial_fit over the database chunks.
+
+    Args:
+        prepared: `PreparedData` of the in-memory sample, whose fitted preprocessing is applied to every chunk.
+        n_rows: Rows returned by the query, as counted by `load_input`.
+
+    Returns:
+        (model, score, preprocessor), the preprocessor adding feature scaling to the sample's one.
+    """
+    import numpy as np
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from cli_data_ai.tools.ml.models import is_classification, score_model
+    target_type = prepared.target_type
+    classification = is_classification(target_type)
+    # Gradient based models need standardised features
+    scaler = StandardScaler().fit(prepared.X_train)
+    preprocessor = Pipeline([("preprocess", prepared.preprocessor), ("scale", scaler)])
+
+    def encode(chunk):
+        return encode_chunk(chunk, preprocessor, prepared.target_column, prepared.label_classes)
+
+    if model_type in ("linear_regression", "logistic_regression"):
+        from sklearn.linear_model import SGDClassifier, SGDRegressor
+        model = SGDClassifier(loss="log_loss") if classification else SGDRegressor()
+    else:
+        from sklearn.neural_network import MLPClassifier, MLPRegressor
+        model = MLPClassifier() if classification else MLPRegressor()
+
+    classes = np.arange(len(prepared.label_classes)) if classification else None
+    by_row = _holdout_by_row(n_rows, chunk_size)
+    for X, y in _training_chunks(backend, query, encode, chunk_size, by_row):
+        if len(y) == 0:
+            continue
+        if classification:
+            model.partial_fit(X, y, classes=classes)
+        else:
+            model.partial_fit(X, y)
+
+    X_val, y_val = _validation_data(backend, query, encode, chunk_size, by_row)
+    score = score_model(model, X_val, y_val, target_type)
+    return model, score, preprocessor
+
+def train_external_memory(backend, query: str, prepared, n_rows: int, chunk_size: int = CHUNK_SIZE):
+    """
+    Train xgboost from a chunk iterator without materialising the full matrix in memory.
+    `n_rows` is the row count of the query, as counted by `load_input`.
+
+    Returns:
+        (model, score, preprocessor), the preprocessor being the one fitted on the sample.
+    """
+    import xgboost
+    from cli_data_ai.tools.ml.models import is_classification, score_model, EARLY_STOPPING_ROUNDS
+    target_type = prepared.target_type
+    classification = is_classification(target_type)
+    preprocessor = prepared.preprocessor
+
+    def encode(chunk):
+        return encode_chunk(chunk, preprocessor, prepared.target_column, prepared.label_classes)
+
+    class _ChunkIter(xgboost.DataIter):
+        def __init__(self, cache_dir):
+            self._chunks = None
+            super().__init__(cache_prefix=os.path.join(cache_dir, "xgb"))
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = _training_chunks(backend, query, encode, chunk_size, by_row)
+            try:
+                X, y = next(self._chunks)
+            except StopIteration:
+                return False
+            input_data(data=X, label=y)
+            return True
+
+        def reset(self):
+            self._chunks = None
+
+    n_classes = len(prepared.label_classes) if classification else 0
+    params = {"tree_method": "hist"}
+    if n_classes == 2:
+        params["objective"] = "binary:logistic"
+    elif n_classes > 2:
+        params.update({"objective": "multi:softprob", "num_class": n_classes})
+
+    by_row = _holdout_by_row(n_rows, chunk_size)
+    X_val, y_val = _validation_data(backend, query, encode, chunk_size, by_row)
+    if len(y_val) < 2:
+        raise ValueError("Not enough rows to hold out validation data")
+    # Alternate held-out rows: even ones for early stopping, odd ones for the reported score
+    X_stop, y_stop, X_val, y_val = X_val[::2], y_val[::2], X_val[1::2], y_val[1::2]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        iterator = _ChunkIter(cache_dir)
+        matrix_cls = getattr(xgboost, "ExtMemQuantileDMatrix", xgboost.QuantileDMatrix)
+        dtrain = matrix_cls(iterator)
+        dstop = xgboost.DMatrix(X_stop, label=y_stop)
+        booster = xgboost.train(
+            params, dtrain, num_boost_round=1000, evals=[(dstop, "validation")],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False,
+        )
+        # Release the matrix while its cache files still exist
+        del dtrain, iterator
+
+    model = BoosterModel(booster, n_classes, prepared.feature_names, params)
+    score = score_model(model, X_val, y_val, target_type)
+    return model, score, preprocessor
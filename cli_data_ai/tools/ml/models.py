@@ -0,0 +1,94 @@
+"""
+Model construction, fitting and scoring shared by the ML tools.
+Heavy imports (sklearn, xgboost) are done inside the functions so importing this module stays cheap.
+"""
+
+MODEL_TYPES = [
+    "linear_regression", "logistic_regression", "random_forest", "decision_tree",
+    "gradient_boosting", "xgboost", "mlp", "svm",
+]
+
+# Upper bound on boosting rounds / epochs when early stopping decides when to stop
+EARLY_STOPPING_MAX_ITER = 1000
+EARLY_STOPPING_ROUNDS = 20
+EARLY_STOPPING_FRACTION = 0.1
+
+def is_classification(target_type: str) -> bool:
+    return target_type in ["binary", "multiclass"]
+
+def task_name(target_type: str) -> str:
+    return "classification" if is_classification(target_type) else "regression"
+
+def build_model(model_type: str, target_type: str, params: dict = None, early_stopping: bool = False):
+    """
+    Return an unfitted estimator of the given type for the target type.
+
+    Args:
+        model_type: One of MODEL_TYPES.
+        target_type: sklearn `type_of_target` of the target column.
+        params: Hyperparameters overriding the library defaults.
+        early_stopping: Configure boosting and neural models to stop when a held-out
+            validation score stops improving, instead of a fixed number of iterations.
+    """
+    classification = is_classification(target_type)
+    params = dict(params or {})
+
+    if model_type == "linear_regression":
+        from sklearn.linear_model import LinearRegression
+        return LinearRegression(**params)
+    elif model_type == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        if target_type != "binary":
+            raise ValueError("Logistic regression requires a binary classification target.")
+        return LogisticRegression(**params)
+    elif model_type == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+        return RandomForestClassifier(**params) if classification else RandomForestRegressor(**params)
+    elif model_type == "decision_tree":
+        from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+        return DecisionTreeClassifier(**params) if classification else DecisionTreeRegressor(**params)
+    elif model_type == "gradient_boosting":
+        from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
+        if early_stopping:
+            params.setdefault("n_estimators", EARLY_STOPPING_MAX_ITER)
+            params.setdefault("n_iter_no_change", EARLY_STOPPING_ROUNDS)
+            params.setdefault("validation_fraction", EARLY_STOPPING_FRACTION)
+        return GradientBoostingClassifier(**params) if classification else GradientBoostingRegressor(**params)
+    elif model_type == "xgboost":
+        from xgboost import XGBClassifier, XGBRegressor
+        if early_stopping:
+            params.setdefault("n_estimators", EARLY_STOPPING_MAX_ITER)
+            params.setdefault("early_stopping_rounds", EARLY_STOPPING_ROUNDS)
+        return XGBClassifier(**params) if classification else XGBRegressor(**params)
+    elif model_type == "mlp":
+        from sklearn.neural_network import MLPClassifier, MLPRegressor
+        if early_stopping:
+            params.setdefault("max_iter", EARLY_STOPPING_MAX_ITER)
+            params.setdefault("early_stopping", True)
+            params.setdefault("validation_fraction", EARLY_STOPPING_FRACTION)
+        return MLPClassifier(**params) if classification else MLPRegressor(**params)
+    elif model_type == "svm":
+        from sklearn.svm import SVC, SVR
+        return SVC(**params) if classification else SVR(**params)
+    else:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+def fit_model(model, model_type: str, X, y, random_state: int = 42):
+    """
+    Fit the estimator. xgboost with early stopping needs an explicit evaluation set,
+    which is carved out of the training data.
+    """
+    if model_type == "xgboost" and model.get_params().get("early_stopping_rounds"):
+        from sklearn.model_selection import train_test_split
+        X_fit, X_stop, y_fit, y_stop = train_test_split(X, y, test_size=EARLY_STOPPING_FRACTION, random_state=random_state)
+        model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+    else:
+        model.fit(X, y)
+    return model
+
+def score_model(model, X_val, y_val, target_type: str) -> float:
+    """Accuracy for classification, R² for regression"""
+    from sklearn.metrics import accuracy_score, r2_score
+    y_pred = list(model.predict(X_val))
+    y_val = list(y_val)
+    return accuracy_score(y_val, y_pred) if is_classification(target_type) else r2_score(y_val, y_pred)
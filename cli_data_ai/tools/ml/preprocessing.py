@@ -0,0 +1,247 @@
+"""
+Fitted preprocessing shared by every candidate model.
+
+The feature columns of the input frame are classified once (numeric, datetime, low/mid/high
+cardinality text, identifiers) and turned into a sklearn ColumnTransformer:
+
+- numeric: median imputation
+- datetime (e.g. `timestamp`): year, month, day, day of week, hour and epoch seconds
+- low cardinality text: ordinal codes, unseen values become -1
+- mid cardinality text: target encoding (cross-fitted by sklearn to avoid leakage)
+- high cardinality free text (e.g. `description`): hashed word tokens
+- identifiers (e.g. `email`, `*_id` columns unique per row): dropped
+
+The prepared data (split, fitted transformer, transformed matrices) is cached by a
+fingerprint of the data, so all the models trained on the same frame reuse it, and the
+fitted transformer is stored next to each model to rebuild its feature matrix later.
+"""
+import hashlib
+import re
+from collections import OrderedDict
+
+LOW_CARDINALITY = 20
+HIGH_CARDINALITY = 1000
+ID_UNIQUE_RATIO = 0.95
+HASH_FEATURES = 32
+DATETIME_NAME_RE = re.compile(r"(date|time|timestamp|_at$)", re.I)
+ID_NAME_RE = re.compile(r"(^id$|_id$|^id_|uuid|email|phone)", re.I)
+DATETIME_FEATURES = ["year", "month", "day", "dayofweek", "hour", "epoch"]
+CACHE_SIZE = 4
+
+_cache = OrderedDict()
+
+def fingerprint(df, target_column: str) -> str:
+    """Hash of the frame contents, column names and dtypes"""
+    import pandas as pd
+    digest = hashlib.sha1()
+    digest.update(target_column.encode())
+    digest.update(str(list(zip(df.columns, map(str, df.dtypes)))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _looks_like_datetime(column) -> bool:
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return True
+    if column.dtype != object:
+        return False
+    sample = column.dropna().astype(str).head(200)
+    if sample.empty or sample.str.fullmatch(r"-?\d+(\.\d+)?").all():
+        return False
+    parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    return parsed.notna().mean() > 0.9
+
+def plan_columns(X) -> dict:
+    """Assign each feature column a role: numeric, datetime, ordinal, target, hashing or id"""
+    import pandas as pd
+    plan = {}
+    n_rows = max(len(X), 1)
+    for col in X.columns:
+        column = X[col]
+        n_unique = column.nunique(dropna=True)
+        unique_ratio = n_unique / n_rows
+        is_text = not pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+        if unique_ratio > ID_UNIQUE_RATIO and n_rows > LOW_CARDINALITY and (
+            ID_NAME_RE.search(str(col)) or (is_text and column.astype(str).str.contains("@").mean() > 0.9)
+        ):
+            plan[col] = "id"
+        elif (is_text or DATETIME_NAME_RE.search(str(col))) and _looks_like_datetime(column):
+            plan[col] = "datetime"
+        elif not is_text:
+            plan[col] = "numeric"
+        elif n_unique <= LOW_CARDINALITY:
+            plan[col] = "ordinal"
+        elif n_unique <= HIGH_CARDINALITY:
+            plan[col] = "target"
+        else:
+            plan[col] = "hashing"
+    return plan
+
+def datetime_features(X):
+    """Expand datetime columns into numeric calendar features"""
+    import numpy as np
+    import pandas as pd
+    features = []
+    for col in X.columns:
+        values = pd.to_datetime(X[col], errors="coerce", format="mixed")
+        if values.dt.tz is not None:
+            values = values.dt.tz_convert(None)
+        epoch = (values - pd.Timestamp(0)).dt.total_seconds()
+        features.extend([values.dt.year, values.dt.month, values.dt.day, values.dt.dayofweek, values.dt.hour, epoch])
+    return np.column_stack([np.asarray(f, dtype=float) for f in features]) if features else np.empty((len(X), 0))
+
+def datetime_feature_names(transformer, input_features):
+    return [f"{col}_{name}" for col in input_features for name in DATETIME_FEATURES]
+
+def as_text(X):
+    return X.astype(str)
+
+def hash_tokens(X):
+    """One list of lowercase word tokens per row, for FeatureHasher"""
+    column = X.iloc[:, 0].astype(str).str.lower()
+    return [re.findall(r"\w+", value) for value in column]
+
+def build_preprocessor(plan: dict):
+    """Unfitted ColumnTransformer for a column plan"""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.feature_extraction import FeatureHasher
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer, OrdinalEncoder, TargetEncoder
+
+    def columns(role):
+        return [col for col, col_role in plan.items() if col_role == role]
+
+    transformers = []
+    if columns("numeric"):
+        transformers.append(("numeric", SimpleImputer(strategy="median", keep_empty_features=True), columns("numeric")))
+    if columns("datetime"):
+        transformers.append(("datetime", Pipeline([
+            ("extract", FunctionTransformer(datetime_features, feature_names_out=datetime_feature_names)),
+            ("impute", SimpleImputer(strategy="median", keep_empty_features=True)),
+        ]), columns("datetime")))
+    if columns("ordinal"):
+        transformers.append(("ordinal", Pipeline([
+            ("text", FunctionTransformer(as_text, feature_names_out="one-to-one")),
+            ("encode", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)),
+        ]), columns("ordinal")))
+    if columns("target"):
+        transformers.append(("target", Pipeline([
+            ("text", FunctionTransformer(as_text, feature_names_out="one-to-one")),
+            ("encode", TargetEncoder(random_state=42)),
+        ]), columns("target")))
+    for col in columns("hashing"):
+        transformers.append((f"hash_{col}", Pipeline([
+            ("tokens", FunctionTransformer(hash_tokens)),
+            ("hash", FeatureHasher(n_features=HASH_FEATURES, input_type="string")),
+        ]), [col]))
+
+    return ColumnTransformer(transformers, remainder="drop", sparse_threshold=0)
+
+def feature_names(preprocessor) -> list:
+    """Names of the transformed features, with a positional fallback for hashed columns"""
+    if hasattr(preprocessor, "steps"):
+        # Pipeline of the column transformer followed by feature-wise steps (e.g. scaling)
+        preprocessor = preprocessor.steps[0][1]
+    names = []
+    for name, transformer, cols in preprocessor.transformers_:
+        if name == "remainder":
+            continue
+        output = preprocessor.output_indices_[name]
+        width = output.stop - output.start
+        try:
+            names.extend(transformer.get_feature_names_out(cols))
+        except Exception:
+            names.extend(f"{name}_{i}" for i in range(width))
+    return [str(n) for n in names]
+
+def encode_target(y, label_classes):
+    """Map class labels to 0..k-1 for classification, floats for regression"""
+    import numpy as np
+    if label_classes is None:
+        return np.asarray(y, dtype=float)
+    mapping = {str(value): code for code, value in enumerate(label_classes)}
+    return y.astype(str).map(mapping).fillna(-1).astype(int).to_numpy()
+
+def decode_target(codes, label_classes):
+    import numpy as np
+    if label_classes is None:
+        return codes
+    return np.asarray(label_classes)[np.asarray(codes, dtype=int)]
+
+
+class PreparedData:
+    """Train/validation split and fitted preprocessing of one input frame"""
+    def __init__(self, df, target_column: str, target_type: str, test_size: float = 0.2, random_state: int = 42):
+        import numpy as np
+        from sklearn.base import clone
+        from sklearn.model_selection import train_test_split
+        from cli_data_ai.tools.ml.models import is_classification
+
+        if target_column not in df.columns:
+            raise ValueError(f"Target column '{target_column}' not found in input data.")
+        df = df[df[target_column].notna()]
+        self.target_column = target_column
+        self.target_type = target_type
+        self.X = df.drop(columns=[target_column])
+        self.label_classes = sorted(df[target_column].unique(), key=str) if is_classification(target_type) else None
+        self.y = encode_target(df[target_column], self.label_classes)
+        self.plan = plan_columns(self.X)
+        self.template = build_preprocessor(self.plan)
+
+        self.train_idx, self.val_idx = train_test_split(np.arange(len(self.X)), test_size=test_size, random_state=random_state)
+        self.y_train, self.y_val = self.y[self.train_idx], self.y[self.val_idx]
+        self.preprocessor = clone(self.template)
+        self.X_train = self.preprocessor.fit_transform(self.X.iloc[self.train_idx], self.y_train)
+        self.X_val = self.preprocessor.transform(self.X.iloc[self.val_idx])
+        self.feature_names = feature_names(self.preprocessor)
+        self._full = None
+        self._folds = {}
+
+    def fit_full(self):
+        """Preprocessor fitted on every row and the transformed rows, for models refitted on all the data"""
+        if self._full is None:
+            from sklearn.base import clone
+            preprocessor = clone(self.template)
+            self._full = (preprocessor, preprocessor.fit_transform(self.X, self.y))
+        return self._full
+
+    def folds(self, cv_folds: int) -> list:
+        """Transformed cross-validation folds, see `evaluation.transform_folds`"""
+        if cv_folds not in self._folds:
+            from cli_data_ai.tools.ml.evaluation import transform_folds
+            self._folds[cv_folds] = transform_folds(self.X, self.y, self.template, self.target_type, cv_folds)
+        return self._folds[cv_folds]
+
+    def artifact(self, preprocessor=None, held_out: bool = False) -> dict:
+        """
+        What has to be stored next to a model to rebuild its inputs and decode its outputs.
+        `held_out` tells that the model was fitted without the validation rows of the split, which
+        are then kept for permutation importance. Models refitted on all rows must not get them.
+        """
+        preprocessor = self.preprocessor if preprocessor is None else preprocessor
+        artifact = {
+            "preprocessor": preprocessor,
+            "feature_names": feature_names(preprocessor),
+            "plan": self.plan,
+            "label_classes": self.label_classes,
+            "target_column": self.target_column,
+            "target_type": self.target_type,
+        }
+        if held_out:
+            artifact["validation"] = (self.X.iloc[self.val_idx], self.y_val)
+        return artifact
+
+def prepare_data(df, target_column: str, target_type: str) -> PreparedData:
+    """Return the cached PreparedData for this frame, building it on first use"""
+    key = (fingerprint(df, target_column), target_type)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    prepared = PreparedData(df, target_column, target_type)
+    prepared.fingerprint = key[0]
+    _cache[key] = prepared
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return prepared
@@ -0,0 +1,139 @@
+"""
+Incremental refresh of registered models on rows that arrived after they were trained.
+
+Only rows above the model's high-water mark (`transaction_id` or `timestamp`) are read.
+The stored preprocessing is reused unchanged and the model is updated in place:
+
+- xgboost: more boosting rounds on the new rows, continuing from the current booster.
+- SGD models (linear models trained out of core) and MLP models: `partial_fit` on the new rows.
+  Linear and logistic regressions trained in memory have no incremental update and cannot be
+  registered.
+
+A fifth of the new rows is held out to compare the score of the model before and after the
+update, and the new rows are compared with a profile of the training data using the
+population stability index (PSI) per column.
+"""
+from cli_data_ai.tools.db.backends import quote_identifier
+from cli_data_ai.tools.db.materialize import WATERMARK_COLUMNS
+from cli_data_ai.tools.ml.large_data import iter_chunks, _strip
+
+PROFILE_BINS = 10
+PROFILE_TOP_CATEGORIES = 20
+REFRESH_ROUNDS = 100
+REFRESH_HOLDOUT = 0.2
+# Usual PSI reading: < 0.1 stable, 0.1-0.2 moderate shift, > 0.2 significant shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.2
+
+def watermark_column(columns) -> str:
+    """First high-water mark column returned by the training query, or None"""
+    return next((c for c in WATERMARK_COLUMNS if c in columns), None)
+
+def current_watermark(backend, query: str, column: str):
+    conn = backend.connect(read_only=True)
+    cursor = backend.cursor(conn)
+    try:
+        cursor.execute(f"SELECT MAX({quote_identifier(column)}) FROM ({_strip(query)});")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def new_rows(backend, query: str, column: str, watermark):
+    """Rows of the query above the high-water mark, as one DataFrame (None when there are none)"""
+    import pandas as pd
+    new_query = (
+        f"SELECT * FROM ({_strip(query)}) WHERE {quote_identifier(column)} > ? "
+        f"ORDER BY {quote_identifier(column)};"
+    )
+    chunks = list(iter_chunks(backend, new_query, params=[watermark]))
+    return pd.concat(chunks, ignore_index=True) if chunks else None
+
+def reference_profile(df, columns: list) -> dict:
+    """Bin edges and proportions of numeric columns, top category frequencies of the others"""
+    import numpy as np
+    import pandas as pd
+    profile = {}
+    for col in columns:
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        if pd.api.types.is_numeric_dtype(values) and values.nunique() > PROFILE_BINS:
+            edges = np.unique(np.quantile(values, np.linspace(0, 1, PROFILE_BINS + 1)))
+            counts = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)[0]
+            profile[col] = {"kind": "numeric", "edges": edges.tolist(), "proportions": (counts / counts.sum()).tolist()}
+        else:
+            frequencies = values.astype(str).value_counts(normalize=True)
+            top = frequencies.head(PROFILE_TOP_CATEGORIES)
+            profile[col] = {
+                "kind": "categorical",
+                "proportions": {**top.to_dict(), "__other__": float(1 - top.sum())},
+            }
+    return profile
+
+def _psi(expected, actual, epsilon: float = 1e-4) -> float:
+    import numpy as np
+    expected = np.clip(np.asarray(expected, dtype=float), epsilon, None)
+    actual = np.clip(np.asarray(actual, dtype=float), epsilon, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def drift_report(profile: dict, df) -> dict:
+    """PSI of each profiled column between the training data and the new rows"""
+    import numpy as np
+    report = {}
+    for col, reference in profile.items():
+        if col not in df.columns:
+            continue
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        if reference["kind"] == "numeric":
+            edges = np.asarray(reference["edges"])
+            counts = np.histogram(np.clip(values.astype(float), edges[0], edges[-1]), bins=edges)[0]
+            psi = _psi(reference["proportions"], counts / counts.sum())
+        else:
+            frequencies = values.astype(str).value_counts(normalize=True)
+            categories = [c for c in reference["proportions"] if c != "__other__"]
+            actual = [frequencies.get(c, 0.0) for c in categories]
+            psi = _psi(list(reference["proportions"].values()), actual + [max(1 - sum(actual), 0.0)])
+        level = "significant" if psi > PSI_SIGNIFICANT else "moderate" if psi > PSI_MODERATE else "stable"
+        report[col] = {"psi": round(psi, 4), "shift": level}
+    return dict(sorted(report.items(), key=lambda item: -item[1]["psi"]))
+
+REFRESHABLE_MODELS = "xgboost or mlp models, or linear models trained out of core (SGD)"
+
+def supports_refresh(model) -> bool:
+    return hasattr(model, "get_booster") or hasattr(model, "partial_fit")
+
+def update_model(model, X, y, label_classes):
+    """Continue training on the new (preprocessed) rows, returns the updated model"""
+    import numpy as np
+    from cli_data_ai.tools.ml.large_data import BoosterModel
+    if isinstance(model, BoosterModel):
+        import xgboost
+        model.booster = xgboost.train(
+            model.params, xgboost.DMatrix(X, label=y),
+            num_boost_round=REFRESH_ROUNDS, xgb_model=model.booster,
+        )
+        # `BoosterModel` predicts up to the best iteration, which would hide the new trees
+        model.booster.set_attr(best_iteration=None, best_score=None)
+        return model
+    if hasattr(model, "get_booster"):
+        # Continue boosting from the current trees with the native API and the model's parameters:
+        # the sklearn wrapper infers the classes from y and fails when the new rows lack some of them
+        import xgboost
+        params = {key: value for key, value in model.get_xgb_params().items() if value is not None}
+        if label_classes is not None and len(label_classes) > 2:
+            params["num_class"] = len(label_classes)
+        booster = xgboost.train(
+            params, xgboost.DMatrix(X, label=y),
+            num_boost_round=REFRESH_ROUNDS, xgb_model=model.get_booster(),
+        )
+        # The best iteration of the first fit's early stopping would hide the new trees from predict
+        booster.set_attr(best_iteration=None, best_score=None)
+        model._Booster = booster
+        return model
+    if label_classes is not None:
+        model.partial_fit(X, y, classes=np.arange(len(label_classes)))
+    else:
+        model.partial_fit(X, y)
+    return model
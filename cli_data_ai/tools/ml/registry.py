@@ -0,0 +1,136 @@
+"""
+Model registry kept in internal tables of the database, next to the data it was trained on.
+
+Hyperparameter configurations found by `tune_model` are recorded with their cross-validated
+score, keyed by model type and a signature of the training data (feature columns and target),
+so a later search on the same kind of data starts from the best known configurations.
+
+Registered models are stored with their fitted preprocessing, the query they were trained on,
+the high-water mark of the rows they saw and a profile of the training data, so they can be
+refreshed on newly arrived rows (see `refresh`). Models are stored pickled, so the agents' SQL
+tools refuse statements naming the internal tables.
+"""
+import hashlib
+import json
+import pickle
+from datetime import datetime, timezone
+from cli_data_ai.tools.db.backends import INTERNAL_TABLE_PREFIX
+from cli_data_ai.tools.db.profiler import metadata_write
+
+CONFIGS_TABLE = f"{INTERNAL_TABLE_PREFIX}ml_configs"
+MODELS_TABLE = f"{INTERNAL_TABLE_PREFIX}ml_models"
+WARM_START_CONFIGS = 3
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def data_signature(feature_columns: list, target_column: str) -> str:
+    """Identifies training data by its columns, independently of the rows it holds"""
+    key = json.dumps({"features": sorted(map(str, feature_columns)), "target": target_column})
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def _ensure_configs(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {CONFIGS_TABLE} ("
+        "model_type TEXT, target_type TEXT, signature TEXT, params TEXT, score REAL, trials INTEGER, created_at TEXT);"
+    )
+
+def record_config(backend, model_type: str, target_type: str, signature: str, params: dict, score: float, trials: int):
+    """Store the best configuration of a search"""
+    with metadata_write(backend.path):
+        conn = backend.connect()
+        cursor = backend.cursor(conn)
+        try:
+            _ensure_configs(cursor)
+            cursor.execute(
+                f"INSERT INTO {CONFIGS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?);",
+                [model_type, target_type, signature, json.dumps(params, sort_keys=True), score, trials, _now()],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+def best_configs(backend, model_type: str, target_type: str, signature: str, limit: int = WARM_START_CONFIGS) -> list:
+    """
+    Best previous configurations for the model type, those found on the same data signature first.
+    Returns an empty list when nothing was recorded yet.
+    """
+    with metadata_write(backend.path):
+        conn = backend.connect()
+        cursor = backend.cursor(conn)
+        try:
+            _ensure_configs(cursor)
+            cursor.execute(
+                f"SELECT params FROM {CONFIGS_TABLE} WHERE model_type = ? AND target_type = ? "
+                "ORDER BY (signature = ?) DESC, score DESC;",
+                [model_type, target_type, signature],
+            )
+            configs = []
+            for (params,) in cursor.fetchall():
+                if params not in configs:
+                    configs.append(params)
+            conn.commit()
+            return [json.loads(params) for params in configs[:limit]]
+        finally:
+            conn.close()
+
+def _ensure_models(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {MODELS_TABLE} ("
+        "name TEXT PRIMARY KEY, model_type TEXT, query TEXT, watermark_column TEXT, watermark TEXT, "
+        "rows_seen INTEGER, model BLOB, artifact BLOB, profile TEXT, "
+        "created_at TEXT, refreshed_at TEXT, refresh_count INTEGER);"
+    )
+
+def save_model(backend, entry: dict):
+    """
+    Insert or replace a registered model. `entry` holds name, model_type, query, watermark_column,
+    watermark, rows_seen, model, artifact, profile and refresh_count.
+    """
+    # Held-out rows and cached importances are only useful in the session that trained the model
+    artifact = {k: v for k, v in entry["artifact"].items() if k not in ("validation", "importance")}
+    with metadata_write(backend.path):
+        conn = backend.connect()
+        cursor = backend.cursor(conn)
+        try:
+            _ensure_models(cursor)
+            cursor.execute(f"SELECT created_at FROM {MODELS_TABLE} WHERE name = ?;", [entry["name"]])
+            row = cursor.fetchone()
+            cursor.execute(f"DELETE FROM {MODELS_TABLE} WHERE name = ?;", [entry["name"]])
+            cursor.execute(
+                f"INSERT INTO {MODELS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                [
+                    entry["name"], entry["model_type"], entry["query"], entry["watermark_column"],
+                    json.dumps(entry["watermark"]), entry["rows_seen"],
+                    pickle.dumps(entry["model"]), pickle.dumps(artifact), json.dumps(entry["profile"]),
+                    row[0] if row else _now(), _now(), entry.get("refresh_count", 0),
+                ],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+def load_model(backend, name: str) -> dict:
+    """Return the registered model entry, or None when no model has this name"""
+    with metadata_write(backend.path):
+        conn = backend.connect()
+        cursor = backend.cursor(conn)
+        try:
+            _ensure_models(cursor)
+            cursor.execute(
+                f"SELECT name, model_type, query, watermark_column, watermark, rows_seen, model, artifact, profile, "
+                f"created_at, refreshed_at, refresh_count FROM {MODELS_TABLE} WHERE name = ?;",
+                [name],
+            )
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+    if row is None:
+        return None
+    return {
+        "name": row[0], "model_type": row[1], "query": row[2], "watermark_column": row[3],
+        "watermark": json.loads(row[4]), "rows_seen": row[5],
+        "model": pickle.loads(row[6]), "artifact": pickle.loads(row[7]), "profile": json.loads(row[8]),
+        "created_at": row[9], "refreshed_at": row[10], "refresh_count": row[11],
+    }
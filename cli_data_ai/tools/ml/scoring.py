@@ -0,0 +1,97 @@
+"""
+Batch scoring of a query with a trained model, written back to the database.
+
+Rows are streamed from the query in chunks, transformed with the preprocessing stored with
+the model (see `preprocessing`), predicted in one vectorized call per chunk and inserted with
+`executemany`. The output table is created and filled in a single transaction, so a failed
+run leaves no partial table behind, and its creation is recorded for `undo_last_change`.
+"""
+import re
+from cli_data_ai.tools.db.backends import quote_identifier
+from cli_data_ai.tools.ml.preprocessing import decode_target
+
+SCORE_CHUNK_SIZE = 50_000
+
+def _sql_type(values) -> str:
+    import numpy as np
+    values = np.asarray(values)
+    if values.dtype.kind in "biu":
+        return "INTEGER"
+    if values.dtype.kind == "f":
+        return "DOUBLE"
+    return "TEXT"
+
+def _python_values(values) -> list:
+    """Convert numpy scalars to Python values the DB-API drivers accept"""
+    import numpy as np
+    values = np.asarray(values)
+    if values.dtype.kind == "O":
+        return [value.item() if hasattr(value, "item") else value for value in values]
+    return values.tolist()
+
+def predict_chunk(model, artifact: dict, chunk) -> dict:
+    """
+    Predict a raw chunk of rows.
+
+    Returns:
+        An ordered dict of output column -> values: `prediction` (decoded class or value) and,
+        for classifiers exposing `predict_proba`, one `probability_<class>` column per class.
+    """
+    missing = [col for col in artifact["plan"] if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Columns used to train the model are missing from the query: {', '.join(missing)}")
+
+    X = artifact["preprocessor"].transform(chunk[list(artifact["plan"])])
+    label_classes = artifact["label_classes"]
+    outputs = {"prediction": decode_target(model.predict(X), label_classes)}
+    if label_classes is not None and hasattr(model, "predict_proba"):
+        proba = model.predict_proba(X)
+        for idx, label in enumerate(label_classes):
+            outputs["probability_" + re.sub(r"\W+", "_", str(label))] = proba[:, idx]
+    return outputs
+
+def score_query(backend, conn, query: str, model, artifact: dict, output_table: str, key_columns: list,
+                chunk_size: int = SCORE_CHUNK_SIZE, recorder=None) -> dict:
+    """
+    Score every row of `query` and insert the key columns and predictions into `output_table`.
+    The caller owns the transaction: commit on success, roll back on failure. The creation of
+    the table is snapshotted with `recorder` (an undo `ChangeRecorder`) when one is given.
+
+    Returns:
+        dict with rows (scored) and columns (of the output table).
+    """
+    read_cursor = backend.stream_cursor(conn)
+    write_cursor = backend.cursor(conn)
+    read_cursor.execute(query)
+    columns = [desc[0] for desc in read_cursor.description]
+    missing_keys = [col for col in key_columns if col not in columns]
+    if missing_keys:
+        raise ValueError(f"Key columns not returned by the query: {', '.join(missing_keys)}")
+
+    import pandas as pd
+    insert, output_columns, n_rows = None, None, 0
+    while True:
+        rows = read_cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = pd.DataFrame(rows, columns=columns)
+        outputs = {col: chunk[col].to_numpy() for col in key_columns}
+        outputs.update(predict_chunk(model, artifact, chunk))
+
+        if insert is None:
+            # Column types are taken from the first chunk
+            output_columns = list(outputs)
+            definitions = ", ".join(f"{quote_identifier(col)} {_sql_type(outputs[col])}" for col in output_columns)
+            create = f"CREATE TABLE {quote_identifier(output_table)} ({definitions});"
+            if recorder is not None:
+                recorder.before(write_cursor, create)
+            write_cursor.execute(create)
+            placeholders = ", ".join("?" for _ in output_columns)
+            insert = f"INSERT INTO {quote_identifier(output_table)} VALUES ({placeholders});"
+
+        write_cursor.executemany(insert, list(zip(*(_python_values(outputs[col]) for col in output_columns))))
+        n_rows += len(chunk)
+
+    if insert is None:
+        raise ValueError("The query returned no rows to score.")
+    return {"rows": n_rows, "columns": output_columns}
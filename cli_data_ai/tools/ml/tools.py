@@ -1,14 +1,25 @@
+import sys
 from io import StringIO
 from pydantic import BaseModel, ConfigDict
-import pandas as pd
 from agents import Agent, RunContextWrapper, Runner, function_tool
-import sqlite3
 from typing import List
 import json
 from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.tools.db.backends import get_backend
+from cli_data_ai.tools.db.sqlite.tools import _internal_tables_error
+from cli_data_ai.tools.db.undo import ChangeRecorder
+from cli_data_ai.tools.ml.models import build_model, fit_model, score_model, task_name, is_classification
+from cli_data_ai.tools.ml.evaluation import cross_validate_model, successive_halving
+from cli_data_ai.tools.ml.preprocessing import prepare_data
+from cli_data_ai.tools.ml.scoring import score_query
+from cli_data_ai.tools.ml import large_data
+from cli_data_ai.tools.ml.large_data import load_input, training_strategy
+from cli_data_ai.tools.output import shape_output
+from cli_data_ai.tools.safeguards.human_in_the_loop import take_confirmation
 
 @function_tool  
-def get_input_data(wrapper: RunContextWrapper[InputData], query: str) -> str:
+@shape_output()
+def get_input_data(wrapper: RunContextWrapper[InputData], query: str, dataset_id: str) -> str:
     """
     Executes an SQL query and returns the results as a pandas DataFrame encoded as a JSON string.
 
@@ -16,22 +27,45 @@ def get_input_data(wrapper: RunContextWrapper[InputData], query: str) -> str:
     - The query must return a full table or result set with **both input features and a target variable**.
     - All columns must have the same number of rows.
 
+    Arguments:
+        query: The SQL query returning features and target.
+        dataset_id: ID of a result already fetched by the SQL agent for this query (e.g. "ds_1a2b3c4d"),
+                    used instead of running the query again. Empty string to run the query.
+
+    Result sets larger than the memory budget are not loaded entirely: a random sample is kept
+    and models are trained from chunks read from the database (see `run_model`).
+
     Returns:
         An extract (up to 5 rows) of the input dataframe retrieved
     """
-    cursor = sqlite3.connect(f"{wrapper.context.database_name}.sqlite").cursor()
+    from cli_data_ai.tools import datasets
+
+    dataset = datasets.get(dataset_id) if dataset_id else None
+    if dataset is not None:
+        # Result handed over by the SQL agent, no need to query the database again
+        df = datasets.to_pandas(dataset_id)
+        wrapper.context.df = df
+        wrapper.context.input_query = dataset["query"]
+        wrapper.context.input_rows = len(df)
+        wrapper.context.out_of_core = False
+        return df.head(5).to_json(orient='records')
+
+    backend = get_backend(wrapper.context)
     try:
-        import pandas as pd
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
+        df, info = load_input(backend, query, memory_budget_mb=wrapper.context.memory_budget_mb)
         wrapper.context.df = df
-        return df.head(5).to_json(orient='records') # JSON string of first 5 rows of a pandas dataframe
+        wrapper.context.input_query = query
+        wrapper.context.input_rows = info["rows"]
+        wrapper.context.out_of_core = info["out_of_core"]
+        preview = df.head(5).to_json(orient='records') # JSON string of first 5 rows of a pandas dataframe
+        if info["out_of_core"]:
+            return json.dumps({"rows": info["rows"], "estimated_mb": info["estimated_mb"], "sampled_rows": len(df), "preview": json.loads(preview)})
+        return preview
     except Exception as e:
         return json.dumps({"error": str(e)})
 
 @function_tool
+@shape_output()
 def choose_model(wrapper: RunContextWrapper[InputData], target_column: str) -> List[str]:
     """
     Infers the type of prediction task (classification vs regression) from the target column,
@@ -49,7 +83,7 @@ def choose_model(wrapper: RunContextWrapper[InputData], target_column: str) -> L
     try:
         df = wrapper.context.df
     except ValueError:
-        print("Cannot fetch df from context")
+        print("Cannot fetch df from context", file=sys.stderr)
         
     y = df[target_column]
     target_type = type_of_target(y)
@@ -62,7 +96,8 @@ def choose_model(wrapper: RunContextWrapper[InputData], target_column: str) -> L
         return ["random_forest"]
 
 @function_tool
-def run_model(wrapper: RunContextWrapper[InputData], target_column: str, model_type: str) -> str:
+@shape_output()
+def run_model(wrapper: RunContextWrapper[InputData], target_column: str, model_type: str, cv_folds: int) -> str:
     """
     Trains and evaluates a model of the specified type on the input data.
 
@@ -70,105 +105,358 @@ def run_model(wrapper: RunContextWrapper[InputData], target_column: str, model_t
         target_column: Name of the target variable to predict.
         model_type: One of: linear_regression, logistic_regression, random_forest, decision_tree,
                     gradient_boosting, xgboost, mlp, svm
+        cv_folds: 0 for a single 80/20 train/validation split. 2 or more to score with k-fold
+                  cross-validation (folds in parallel, early stopping for boosting and mlp models).
 
     Requirements:
         - The input data must include the target column.
         - All columns must be equal in length.
 
+    Large inputs are handled automatically: svm is fitted on a stratified subsample, and when the input
+    did not fit in memory linear models and mlp are trained incrementally and xgboost from external memory.
+
     Returns:
         A JSON string with: {model, score, type}, where type = regression or classification.
+        With cross-validation score is the mean over folds and score_std, fit_time and folds_completed are added.
+        For large inputs `strategy` tells how the model was trained.
     """
-    import pandas as pd
-    import numpy as np
     import json
-    from sklearn.model_selection import train_test_split
-    from sklearn.preprocessing import LabelEncoder
-    from sklearn.metrics import accuracy_score, r2_score
     from sklearn.utils.multiclass import type_of_target
 
     # Load input data
     try:
         df = wrapper.context.df
     except ValueError:
-        print("Error reading input dataframe from context")
+        print("Error reading input dataframe from context", file=sys.stderr)
         
-    if target_column not in df.columns:
-        raise ValueError(f"Target column '{target_column}' not found in input data.")
-    X = df.drop(columns=[target_column])
-    y = df[target_column]
-
     # Detect target type
-    target_type = type_of_target(y)
+    target_type = type_of_target(df[target_column].dropna())
 
-    # Encode categorical features
-    for col in X.select_dtypes(include="object").columns:
-        X[col] = LabelEncoder().fit_transform(X[col].astype(str))
-    if y.dtype == "object":
-        y = LabelEncoder().fit_transform(y.astype(str))
-
-    # Train/test split
-    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Select appropriate model
-    model = None
-    if model_type == "linear_regression":
-        from sklearn.linear_model import LinearRegression
-        model = LinearRegression()
-    elif model_type == "logistic_regression":
-        from sklearn.linear_model import LogisticRegression
-        if target_type != "binary":
-            raise ValueError("Logistic regression requires a binary classification target.")
-        model = LogisticRegression()
-    elif model_type == "random_forest":
-        from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-        model = RandomForestClassifier() if target_type in ["binary", "multiclass"] else RandomForestRegressor()
-    elif model_type == "decision_tree":
-        from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
-        model = DecisionTreeClassifier() if target_type in ["binary", "multiclass"] else DecisionTreeRegressor()
-    elif model_type == "gradient_boosting":
-        from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
-        model = GradientBoostingClassifier() if target_type in ["binary", "multiclass"] else GradientBoostingRegressor()
-    elif model_type == "xgboost":
-        from xgboost import XGBClassifier, XGBRegressor
-        model = XGBClassifier() if target_type in ["binary", "multiclass"] else XGBRegressor()
-    elif model_type == "mlp":
-        from sklearn.neural_network import MLPClassifier, MLPRegressor
-        model = MLPClassifier() if target_type in ["binary", "multiclass"] else MLPRegressor()
-    elif model_type == "svm":
-        from sklearn.svm import SVC, SVR
-        model = SVC() if target_type in ["binary", "multiclass"] else SVR()
-    else:
-        raise ValueError(f"Unsupported model type: {model_type}")
+    # Split and fitted preprocessing are cached per input data, shared by every model
+    try:
+        prepared = prepare_data(df, target_column, target_type)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
 
-    # Train model
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_val)
+    n_rows = wrapper.context.input_rows or len(df)
+    strategy = training_strategy(model_type, n_rows, wrapper.context.out_of_core)
+    if strategy in ("incremental", "external_memory"):
+        # Train from chunks of the full result set, df only holds a sample
+        backend = get_backend(wrapper.context)
+        if strategy == "incremental":
+            model, score, preprocessor = large_data.train_incremental(backend, wrapper.context.input_query, prepared, model_type, n_rows)
+        else:
+            model, score, preprocessor = large_data.train_external_memory(backend, wrapper.context.input_query, prepared, n_rows)
+        # The chunks cover the whole result set, the sample's validation rows included
+        artifact = prepared.artifact(preprocessor)
+        results = {"model": model_type, "score": score, "type": task_name(target_type)}
+    elif cv_folds and cv_folds >= 2 and strategy == "in_memory":
+        evaluation = cross_validate_model(model_type, prepared.folds(cv_folds), target_type)
+        evaluation.pop("model")
+        # The reported scores come from the folds, the stored model is trained on all rows
+        preprocessor, X_full = prepared.fit_full()
+        model = fit_model(build_model(model_type, target_type, early_stopping=True), model_type, X_full, prepared.y)
+        artifact = prepared.artifact(preprocessor)
+        results = {"model": model_type, **evaluation, "type": task_name(target_type)}
+    else:
+        X_train, y_train = prepared.X_train, prepared.y_train
+        if strategy == "subsample":
+            # Quadratic models get a small stratified subsample, other models the in-memory sample
+            max_rows = large_data.QUADRATIC_MAX_ROWS if model_type in large_data.QUADRATIC_MODELS else len(y_train)
+            X_train, y_train = large_data.stratified_subsample(X_train, y_train, max_rows, is_classification(target_type))
+            n_rows = len(y_train)
+
+        # Train and score model on the cached train/validation split
+        model = build_model(model_type, target_type)
+        model.fit(X_train, y_train)
+        score = score_model(model, prepared.X_val, prepared.y_val, target_type)
+        artifact = prepared.artifact(held_out=True)
+
+        # Return results
+        results = {
+            "model": model_type,
+            "score": score,
+            "type": task_name(target_type)
+        }
+
+    if strategy != "in_memory":
+        results.update({"strategy": strategy, "rows": n_rows})
+    
+    if wrapper.context.trained_models is None:
+        wrapper.context.trained_models = {}
+    wrapper.context.trained_models[model_type] = model
+    if wrapper.context.model_artifacts is None:
+        wrapper.context.model_artifacts = {}
+    wrapper.context.model_artifacts[model_type] = artifact
 
-    y_pred, y_val = list(y_pred), list(y_val)
     
-    # Score model
-    score = accuracy_score(y_val, y_pred) if target_type in ["binary", "multiclass"] else r2_score(y_val, y_pred)
+    if wrapper.context.model_results is None:
+        wrapper.context.model_results = []
+    wrapper.context.model_results.append(results)
+
+    return json.dumps(results)
+
+@function_tool
+@shape_output()
+def evaluate_models(wrapper: RunContextWrapper[InputData], target_column: str, model_types: List[str], cv_folds: int, time_budget_seconds: float) -> str:
+    """
+    Evaluates several candidate models at once with k-fold cross-validation and successive halving:
+    all candidates are scored on a subsample of the rows, only the best half moves on to twice as
+    many rows, until the remaining models are scored on all the rows. Weak models are dropped early.
+
+    Arguments:
+        target_column: Name of the target variable to predict.
+        model_types: Candidate models, e.g. the list returned by `choose_model`.
+        cv_folds: Number of cross-validation folds (e.g. 5).
+        time_budget_seconds: Cross-validation time per model and rung: a wave of folds is only started when it is expected to finish within it.
+                             Best-effort: folds already running are finished.
+
+    Returns:
+        A JSON list with, per model: model, score (mean over folds), score_std, fit_time (seconds per fold),
+        rows (rows used in the last round reached), eliminated and type. Best model first. Only the models
+        that were not eliminated are trained on all rows and can be selected with `select_best_model`.
+    """
+    import json
+    from sklearn.utils.multiclass import type_of_target
+
+    df = wrapper.context.df
+    if df is None or target_column not in df.columns:
+        return json.dumps({"error": f"Input data is missing or target column '{target_column}' not found."})
+
+    target_type = type_of_target(df[target_column].dropna())
+    prepared = prepare_data(df, target_column, target_type)
+    ranked = successive_halving(
+        model_types, prepared.X, prepared.y, target_type, prepared.template,
+        cv_folds=cv_folds, time_budget=time_budget_seconds,
+    )
+
+    if wrapper.context.trained_models is None:
+        wrapper.context.trained_models = {}
+    if wrapper.context.model_artifacts is None:
+        wrapper.context.model_artifacts = {}
+    if wrapper.context.model_results is None:
+        wrapper.context.model_results = []
+
+    report = []
+    for result in ranked:
+        estimator = result.pop("estimator", None)
+        preprocessor = result.pop("preprocessor", None)
+        if "error" in result:
+            result["score"] = None
+        elif estimator is not None and not result["eliminated"]:
+            wrapper.context.trained_models[result["model"]] = estimator
+            wrapper.context.model_artifacts[result["model"]] = prepared.artifact(preprocessor)
+            wrapper.context.model_results.append(result)
+        report.append(result)
+
+    return json.dumps(report)
+
+
+@function_tool
+@shape_output()
+def tune_model(wrapper: RunContextWrapper[InputData], target_column: str, model_type: str, n_trials: int, cv_folds: int, time_budget_seconds: float) -> str:
+    """
+    Searches the hyperparameters of one model type, then trains it on all rows with the best configuration.
+    Trials are cross-validated in parallel and start from the best configurations found previously on
+    similar data. Use it after `evaluate_models` to improve the best candidate.
+
+    Arguments:
+        target_column: Name of the target variable to predict.
+        model_type: One of: linear_regression, logistic_regression, random_forest, decision_tree,
+                    gradient_boosting, xgboost, mlp, svm
+        n_trials: Maximum number of configurations to evaluate (e.g. 30).
+        cv_folds: Number of cross-validation folds per trial (e.g. 3).
+        time_budget_seconds: No new trial is started after this many seconds.
+
+    Returns:
+        A JSON string with: model, score (mean over folds of the best trial), score_std, params, trials,
+        method (bayesian or random search), timed_out and type.
+    """
+    import json
+    from sklearn.utils.multiclass import type_of_target
+    from cli_data_ai.tools.ml import registry
+    from cli_data_ai.tools.ml.tuning import tune, model_params
+
+    df = wrapper.context.df
+    if df is None or target_column not in df.columns:
+        return json.dumps({"error": f"Input data is missing or target column '{target_column}' not found."})
+
+    target_type = type_of_target(df[target_column].dropna())
+    prepared = prepare_data(df, target_column, target_type)
+    backend = get_backend(wrapper.context)
+    signature = registry.data_signature(prepared.X.columns, target_column)
+    try:
+        warm_start = registry.best_configs(backend, model_type, target_type, signature)
+    except Exception:
+        warm_start = []
+
+    try:
+        search = tune(
+            model_type, prepared.folds(max(cv_folds, 2)), target_type, n_trials=max(n_trials, 1),
+            time_budget=time_budget_seconds, warm_start=warm_start,
+            progress_callback=wrapper.context.progress_callback,
+        )
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+    # Refit the best configuration on every row
+    preprocessor, X_full = prepared.fit_full()
+    params = model_params(model_type, search["best_params"])
+    model = fit_model(build_model(model_type, target_type, params=params, early_stopping=True), model_type, X_full, prepared.y)
+    try:
+        registry.record_config(backend, model_type, target_type, signature, search["best_params"], search["score"], search["trials"])
+    except Exception:
+        pass  # A read-only database only loses the warm start for next time
 
-    # Return results
     results = {
         "model": model_type,
-        "score": score,
-        "type": "classification" if target_type in ["binary", "multiclass"] else "regression"
+        "score": search["score"],
+        "score_std": search["score_std"],
+        "fit_time": search["fit_time"],
+        "folds_completed": search["folds_completed"],
+        "params": search["best_params"],
+        "trials": search["trials"],
+        "method": search["method"],
+        "timed_out": search["timed_out"],
+        "type": task_name(target_type),
     }
-    
     if wrapper.context.trained_models is None:
         wrapper.context.trained_models = {}
     wrapper.context.trained_models[model_type] = model
-
-    
+    if wrapper.context.model_artifacts is None:
+        wrapper.context.model_artifacts = {}
+    wrapper.context.model_artifacts[model_type] = prepared.artifact(preprocessor)
     if wrapper.context.model_results is None:
         wrapper.context.model_results = []
-    wrapper.context.model_results.append(results)
+    # The tuned model replaces the earlier results of the same type
+    wrapper.context.model_results = [r for r in wrapper.context.model_results if r["model"] != model_type] + [results]
 
     return json.dumps(results)
 
+@function_tool
+@shape_output()
+def register_model(wrapper: RunContextWrapper[InputData], name: str, model_type: str) -> str:
+    """
+    Saves a trained model in the database model registry so it can be refreshed later on new rows
+    with `refresh_model` instead of being retrained from scratch.
+    The query passed to `get_input_data` must return a `transaction_id` or `timestamp` column,
+    used as the high-water mark of the rows the model has seen.
+
+    Arguments:
+        name: Name to register the model under, e.g. "fraud_xgboost". An existing model with this name is replaced.
+        model_type: Type of the trained model to register, e.g. "xgboost".
+
+    Returns:
+        A confirmation with the high-water mark recorded.
+    """
+    from cli_data_ai.tools.ml import refresh, registry
+
+    model = (wrapper.context.trained_models or {}).get(model_type)
+    artifact = (wrapper.context.model_artifacts or {}).get(model_type)
+    df = wrapper.context.df
+    if model is None or artifact is None or df is None:
+        return f"❌ No trained {model_type} model found in context. Please run a model first."
+    if not refresh.supports_refresh(model):
+        return f"❌ This {model_type} model cannot be updated incrementally. Register {refresh.REFRESHABLE_MODELS}."
+    column = refresh.watermark_column(df.columns)
+    if column is None:
+        return f"❌ The input query must return one of {', '.join(refresh.WATERMARK_COLUMNS)} to track new rows."
+
+    backend = get_backend(wrapper.context)
+    try:
+        watermark = refresh.current_watermark(backend, wrapper.context.input_query, column)
+        registry.save_model(backend, {
+            "name": name,
+            "model_type": model_type,
+            "query": wrapper.context.input_query,
+            "watermark_column": column,
+            "watermark": watermark,
+            "rows_seen": wrapper.context.input_rows or len(df),
+            "model": model,
+            "artifact": artifact,
+            "profile": refresh.reference_profile(df, list(artifact["plan"]) + [artifact["target_column"]]),
+        })
+    except Exception as e:
+        return f"❌ Error registering model: {e}"
+    return f"✅ Model `{name}` ({model_type}) registered, trained on rows up to {column} = {watermark}."
 
 @function_tool
+@shape_output()
+def refresh_model(wrapper: RunContextWrapper[InputData], name: str) -> str:
+    """
+    Updates a registered model with the rows that arrived since it was last trained or refreshed,
+    continuing training (more boosting rounds for xgboost, partial_fit for mlp and out-of-core linear models)
+    instead of retraining from scratch. Also reports drift between the training data and the new rows.
+
+    Arguments:
+        name: Name the model was registered under with `register_model`.
+
+    Returns:
+        A JSON string with: model, new_rows, score_before and score_after (on a held-out fifth of the
+        new rows), watermark and drift (PSI and shift level per column, most shifted first).
+    """
+    import json
+    from sklearn.model_selection import train_test_split
+    from cli_data_ai.tools.ml import refresh, registry
+    from cli_data_ai.tools.ml.large_data import encode_chunk
+
+    backend = get_backend(wrapper.context)
+    try:
+        entry = registry.load_model(backend, name)
+    except Exception as e:
+        return json.dumps({"error": f"Cannot read the model registry: {e}"})
+    if entry is None:
+        return json.dumps({"error": f"No registered model named '{name}'."})
+
+    column, artifact = entry["watermark_column"], entry["artifact"]
+    df = refresh.new_rows(backend, entry["query"], column, entry["watermark"])
+    if df is None:
+        return json.dumps({"model": name, "new_rows": 0, "watermark": entry["watermark"]})
+
+    target_type = artifact["target_type"]
+    drift = refresh.drift_report(entry["profile"], df)
+    X, y = encode_chunk(df, artifact["preprocessor"], artifact["target_column"], artifact["label_classes"])
+    result = {"model": name, "new_rows": len(df)}
+    if len(y) >= 10:
+        X_update, X_holdout, y_update, y_holdout = train_test_split(X, y, test_size=refresh.REFRESH_HOLDOUT, random_state=42)
+        result["score_before"] = score_model(entry["model"], X_holdout, y_holdout, target_type)
+    else:
+        X_update, y_update, X_holdout = X, y, None
+
+    try:
+        model = refresh.update_model(entry["model"], X_update, y_update, artifact["label_classes"])
+    except Exception as e:
+        return json.dumps({"error": f"Error updating the model: {e}"})
+    if X_holdout is not None:
+        result["score_after"] = score_model(model, X_holdout, y_holdout, target_type)
+
+    watermark = df[column].max()
+    entry.update({
+        "model": model,
+        "watermark": watermark.item() if hasattr(watermark, "item") else watermark,
+        "rows_seen": entry["rows_seen"] + len(df),
+        "refresh_count": entry["refresh_count"] + 1,
+    })
+    try:
+        registry.save_model(backend, entry)
+    except Exception as e:
+        return json.dumps({"error": f"Model updated but not saved to the registry: {e}"})
+
+    # The refreshed model becomes the active one
+    if wrapper.context.trained_models is None:
+        wrapper.context.trained_models = {}
+    if wrapper.context.model_artifacts is None:
+        wrapper.context.model_artifacts = {}
+    wrapper.context.trained_models[entry["model_type"]] = model
+    wrapper.context.model_artifacts[entry["model_type"]] = artifact
+    wrapper.context.trained_model = model
+    wrapper.context.best_model_type = entry["model_type"]
+
+    result.update({"watermark": entry["watermark"], "drift": drift})
+    return json.dumps(result)
+
+@function_tool
+@shape_output()
 def model_card_report(results_json: str) -> str:
     """
     Takes a JSON string of model results and returns a report.
@@ -180,12 +468,20 @@ def model_card_report(results_json: str) -> str:
     for res in results:
         report += f"**Model**: {res['model']}\n"
         report += f"**Type**: {res['type']}\n"
-        report += f"**Validation Score**: {res['score']:.4f}\n\n"
+        if "score_std" in res:
+            report += f"**Validation Score**: {res['score']:.4f} ± {res['score_std']:.4f} ({res.get('folds_completed', '?')} folds)\n"
+            report += f"**Training Time**: {res.get('fit_time', 0):.2f}s per fold\n"
+            if res.get("params"):
+                report += f"**Tuned Parameters**: {res['params']} ({res.get('trials', '?')} trials)\n"
+            report += "\n"
+        else:
+            report += f"**Validation Score**: {res['score']:.4f}\n\n"
     best = max(results, key=lambda r: r["score"])
     report += f"### Recommended Model: {best['model']} (Score: {best['score']:.4f})\n"
     return report
 
 @function_tool
+@shape_output()
 def select_best_model(wrapper: RunContextWrapper[InputData]) -> str:
     """
     Selects the best model from previously trained models based on score and sets it as the active model.
@@ -199,57 +495,91 @@ def select_best_model(wrapper: RunContextWrapper[InputData]) -> str:
 
     if best_model:
         wrapper.context.trained_model = best_model
+        wrapper.context.best_model_type = best_model_type
         return f"Best model selected: {best_model_type} with score {best['score']:.4f}"
     else:
         return f"Could not find model instance for '{best_model_type}' in context."
 
 @function_tool
-def feature_importance(wrapper: RunContextWrapper[InputData], model_type: str, target_column: str) -> str:
+@shape_output()
+def score_table(wrapper: RunContextWrapper[InputData], query: str, output_table: str, key_columns: List[str]) -> str:
+    """
+    Scores rows with the best model (see `select_best_model`) and writes the predictions to a new table.
+    Rows are streamed from the database in chunks, so queries returning millions of rows can be scored.
+    Requires human confirmation, the table is created and filled in a single transaction that
+    `undo_last_change` can revert.
+
+    Arguments:
+        query: SQL query returning the feature columns the model was trained on (the target is not needed).
+        output_table: Name of the table to create, it must not exist yet.
+        key_columns: Columns of the query copied to the output table to identify each row, e.g. ["transaction_id"].
+
+    Returns:
+        A summary with the number of rows scored and the output columns: the key columns, `prediction` and,
+        for classification, one `probability_<class>` column per class.
+    """
+    model = wrapper.context.trained_model
+    artifact = (wrapper.context.model_artifacts or {}).get(wrapper.context.best_model_type)
+    if model is None or artifact is None:
+        return "❌ No selected model found in context. Please run models and call `select_best_model` first."
+    error = _internal_tables_error(query, output_table)
+    if error:
+        return error
+    if not take_confirmation(wrapper.context):
+        return "❌ Human confirmation required. Please confirm the action."
+
+    backend = get_backend(wrapper.context)
+    conn = backend.connect()
+    recorder = ChangeRecorder(backend, conn, "score_table")
+    try:
+        backend.cursor(conn).execute("BEGIN;")
+        summary = score_query(backend, conn, query, model, artifact, output_table, key_columns, recorder=recorder)
+        conn.commit()
+        recorder.save()
+    except Exception as e:
+        conn.rollback()
+        return f"❌ Error scoring rows, no table was created: {e}"
+    finally:
+        conn.close()
+
+    return (
+        f"✅ Scored {summary['rows']} rows with {wrapper.context.best_model_type} into `{output_table}`.\n"
+        f"Columns: {', '.join(summary['columns'])}"
+    )
+
+@function_tool
+@shape_output()
+def feature_importance(wrapper: RunContextWrapper[InputData], model_type: str, target_column: str, sample_rows: int) -> str:
     """
-    Returns feature importances from the best trained model if available.
+    Returns the importance of each input column for a trained model, for every model type:
+    SHAP contributions for xgboost, permutation importance on held-out rows for the others.
 
     Arguments:
         model_type: One of: linear_regression, logistic_regression, random_forest, decision_tree,
                     gradient_boosting, xgboost, mlp, svm
         target_column: The name of the column to predict.
+        sample_rows: Maximum held-out rows used to compute the importances, e.g. 2000. 0 for the default.
 
     Returns:
-        A string with the ranked features and their importance scores.
+        A string with the method used and the ranked columns with their importance scores.
     """
-    import numpy as np
+    from cli_data_ai.tools.ml.importance import compute_importance, IMPORTANCE_SAMPLE_ROWS
 
-    # Access model and data from context
-    model = wrapper.context.trained_model
-    df = wrapper.context.df
+    # Access model and its preprocessing from context
+    model = (wrapper.context.trained_models or {}).get(model_type, wrapper.context.trained_model)
+    artifact = (wrapper.context.model_artifacts or {}).get(model_type)
 
-    if model is None:
+    if model is None or artifact is None:
         return "❌ No trained model found in context. Please run a model first."
 
-    if df is None or target_column not in df.columns:
-        return f"❌ Input data is missing or target column '{target_column}' not found."
-
-    # Prepare feature matrix
-    X = df.drop(columns=[target_column])
+    if artifact["target_column"] != target_column:
+        return f"❌ The {model_type} model was trained to predict '{artifact['target_column']}', not '{target_column}'."
 
-    # Try to extract importances
     try:
-        if hasattr(model, "feature_importances_"):
-            importances = model.feature_importances_
-        elif hasattr(model, "coef_"):
-            coef = model.coef_
-            if hasattr(coef, "ndim"):
-                importances = coef if coef.ndim == 1 else coef[0]
-            else:
-                importances = coef
-        else:
-            return f"⚠️ The model type '{model_type}' does not support feature importances."
+        result = compute_importance(model, artifact, sample_rows=sample_rows or IMPORTANCE_SAMPLE_ROWS)
     except Exception as e:
-        return f"❌ Error extracting feature importances: {e}"
+        return f"❌ Error computing feature importances: {e}"
 
-    # Format output
-    try:
-        importances = np.asarray(importances)
-        ranked = sorted(zip(X.columns, importances), key=lambda x: -abs(x[1]))
-        return "\n".join([f"{f}: {round(imp, 4)}" for f, imp in ranked])
-    except Exception as e:
-        return f"❌ Failed to format importances: {e}"
\ No newline at end of file
+    lines = [f"Method: {result['method']}"]
+    lines += [f"{col}: {round(value, 4)}" for col, value in result["importances"]]
+    return "\n".join(lines)
@@ -0,0 +1,250 @@
+"""
+Hyperparameter search for the candidate models.
+
+Trials sample a configuration from the model's search space and score it with k-fold
+cross-validation on the cached, already preprocessed folds (see `PreparedData.folds`).
+Trials run in parallel in a process pool, the folds are sent once to each worker. Workers are
+started with `forkserver` (or `spawn`): forking the CLI process would copy its running threads'
+locks. Trials still running when the budget runs out are terminated.
+
+With `optuna` installed the search is Bayesian (TPE sampler), otherwise configurations are
+drawn at random. Previous best configurations from the model registry are tried first.
+The search stops after `n_trials` or when the wall-clock budget runs out.
+"""
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from cli_data_ai.tools.ml.evaluation import cross_validate_model
+
+# Parameter -> ("int" | "float", low, high, log scale) or ("choice", [values])
+SEARCH_SPACES = {
+    "linear_regression": {
+        "fit_intercept": ("choice", [True, False]),
+    },
+    "logistic_regression": {
+        "C": ("float", 1e-3, 1e2, True),
+        "class_weight": ("choice", [None, "balanced"]),
+    },
+    "random_forest": {
+        "n_estimators": ("int", 50, 500, True),
+        "max_depth": ("choice", [None, 4, 8, 16, 32]),
+        "min_samples_leaf": ("int", 1, 20, True),
+        "max_features": ("choice", ["sqrt", "log2", 0.5, 1.0]),
+    },
+    "decision_tree": {
+        "max_depth": ("choice", [None, 3, 5, 8, 12, 20]),
+        "min_samples_leaf": ("int", 1, 50, True),
+    },
+    "gradient_boosting": {
+        "learning_rate": ("float", 0.01, 0.3, True),
+        "max_depth": ("int", 2, 8, False),
+        "subsample": ("float", 0.5, 1.0, False),
+        "min_samples_leaf": ("int", 1, 50, True),
+    },
+    "xgboost": {
+        "learning_rate": ("float", 0.01, 0.3, True),
+        "max_depth": ("int", 2, 10, False),
+        "subsample": ("float", 0.5, 1.0, False),
+        "colsample_bytree": ("float", 0.5, 1.0, False),
+        "min_child_weight": ("float", 0.5, 10.0, True),
+        "reg_lambda": ("float", 1e-3, 10.0, True),
+    },
+    "mlp": {
+        # Layer sizes as strings, e.g. "128-64", so every choice is a plain value
+        "hidden_layer_sizes": ("choice", ["64", "128", "64-32", "128-64"]),
+        "alpha": ("float", 1e-5, 1e-1, True),
+        "learning_rate_init": ("float", 1e-4, 1e-2, True),
+    },
+    "svm": {
+        "C": ("float", 1e-2, 1e2, True),
+        "gamma": ("choice", ["scale", "auto"]),
+        "kernel": ("choice", ["rbf", "linear"]),
+    },
+}
+
+def model_params(model_type: str, params: dict) -> dict:
+    """Convert sampled values into estimator arguments"""
+    params = dict(params)
+    if model_type == "mlp" and isinstance(params.get("hidden_layer_sizes"), str):
+        params["hidden_layer_sizes"] = tuple(int(size) for size in params["hidden_layer_sizes"].split("-"))
+    return params
+
+def sample_params(space: dict, rng) -> dict:
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == "choice":
+            params[name] = spec[1][rng.randint(len(spec[1]))]
+            continue
+        low, high, log = spec[1], spec[2], spec[3]
+        value = math.exp(rng.uniform(math.log(low), math.log(high))) if log else rng.uniform(low, high)
+        params[name] = int(round(value)) if kind == "int" else float(value)
+    return params
+
+
+class _RandomSampler:
+    """Warm start configurations first, then random draws from the space"""
+    method = "random search"
+
+    def __init__(self, space: dict, warm_start: list, random_state: int):
+        import numpy as np
+        self.space = space
+        self.queue = list(warm_start)
+        self.rng = np.random.RandomState(random_state)
+
+    def ask(self):
+        params = self.queue.pop(0) if self.queue else sample_params(self.space, self.rng)
+        return None, params
+
+    def tell(self, handle, score):
+        pass
+
+
+class _OptunaSampler:
+    """TPE sampler through optuna's ask/tell interface, warm start configurations enqueued first"""
+    method = "bayesian search (optuna TPE)"
+
+    def __init__(self, space: dict, warm_start: list, random_state: int):
+        import optuna
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        self.space = space
+        self.study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=random_state))
+        for params in warm_start:
+            self.study.enqueue_trial(params, skip_if_exists=True)
+
+    def ask(self):
+        trial = self.study.ask()
+        params = {}
+        for name, spec in self.space.items():
+            if spec[0] == "choice":
+                params[name] = trial.suggest_categorical(name, spec[1])
+            elif spec[0] == "int":
+                params[name] = trial.suggest_int(name, spec[1], spec[2], log=spec[3])
+            else:
+                params[name] = trial.suggest_float(name, spec[1], spec[2], log=spec[3])
+        return trial, params
+
+    def tell(self, handle, score):
+        from optuna.trial import TrialState
+        if score is None:
+            self.study.tell(handle, state=TrialState.FAIL)
+        else:
+            self.study.tell(handle, score)
+
+def _sampler(space: dict, warm_start: list, random_state: int):
+    try:
+        return _OptunaSampler(space, warm_start, random_state)
+    except ImportError:
+        return _RandomSampler(space, warm_start, random_state)
+
+
+_worker_folds = None
+
+def _init_worker(folds):
+    global _worker_folds
+    _worker_folds = folds
+
+def _run_trial(model_type: str, target_type: str, params: dict):
+    evaluation = cross_validate_model(
+        model_type, _worker_folds, target_type, params=model_params(model_type, params), n_jobs=1,
+    )
+    return evaluation["score"], evaluation["score_std"], evaluation["fit_time"], evaluation["folds_completed"]
+
+def _start_method() -> str:
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _terminate(pool):
+    """Stop the pool and kill the trials still running"""
+    if hasattr(pool, "terminate_workers"):  # Python 3.14+
+        pool.terminate_workers()
+        return
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+def tune(model_type: str, folds: list, target_type: str, n_trials: int = 20, time_budget: float = None,
+         warm_start: list = None, n_workers: int = None, progress_callback=None, random_state: int = 42) -> dict:
+    """
+    Search the hyperparameters of one model type.
+
+    Args:
+        folds: Transformed cross-validation folds, see `evaluation.transform_folds`.
+        time_budget: Seconds after which no new trial is started. Trials still running are
+            terminated, their results are ignored.
+        warm_start: Configurations to evaluate first, e.g. from `registry.best_configs`.
+        progress_callback: Called as (stage, done, total, label) after each trial.
+
+    Returns:
+        dict with best_params, score, score_std, fit_time, folds_completed (by the best trial),
+        trials (completed), failed_trials, timed_out, method and warm_started.
+    """
+    if model_type not in SEARCH_SPACES:
+        raise ValueError(f"No search space for model type: {model_type}")
+
+    space = SEARCH_SPACES[model_type]
+    warm_start = [params for params in (warm_start or []) if set(params) <= set(space)]
+    sampler = _sampler(space, warm_start, random_state)
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, n_trials))
+
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget else math.inf
+    best, completed, failed, submitted, timed_out = None, 0, 0, 0, False
+    pool = ProcessPoolExecutor(
+        max_workers=n_workers, mp_context=multiprocessing.get_context(_start_method()),
+        initializer=_init_worker, initargs=(folds,),
+    )
+    pending = {}
+    try:
+        while submitted < n_trials or pending:
+            while submitted < n_trials and len(pending) < n_workers and time.perf_counter() < deadline:
+                handle, params = sampler.ask()
+                pending[pool.submit(_run_trial, model_type, target_type, params)] = (handle, params)
+                submitted += 1
+            if not pending:
+                timed_out = submitted < n_trials
+                break
+
+            timeout = None if deadline == math.inf else max(deadline - time.perf_counter(), 0)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                timed_out = True
+                break
+
+            for future in done:
+                handle, params = pending.pop(future)
+                try:
+                    score, score_std, fit_time, folds_completed = future.result()
+                except Exception:
+                    sampler.tell(handle, None)
+                    failed += 1
+                    continue
+                sampler.tell(handle, score)
+                completed += 1
+                if best is None or score > best["score"]:
+                    best = {
+                        "best_params": params, "score": score, "score_std": score_std,
+                        "fit_time": fit_time, "folds_completed": folds_completed,
+                    }
+                if progress_callback:
+                    progress_callback(f"Tuning {model_type}", completed + failed, n_trials, f"best score {best['score']:.4f}")
+    finally:
+        if timed_out:
+            _terminate(pool)
+        else:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    if best is None:
+        raise RuntimeError(f"No trial completed for {model_type} ({failed} failed) within the time budget.")
+    return {
+        **best,
+        "trials": completed,
+        "failed_trials": failed,
+        "timed_out": timed_out,
+        "method": sampler.method,
+        "warm_started": len(warm_start),
+    }
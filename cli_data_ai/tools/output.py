@@ -0,0 +1,144 @@
+"""
+Shaping of tool outputs before they enter the model context.
+
+Every tool is decorated with `shape_output` under `@function_tool`:
+
+    @function_tool
+    @shape_output(max_chars=8_000)
+    def profile_database(wrapper: RunContextWrapper[InputData]) -> str:
+        ...
+
+The output is re-encoded compactly: lists of records (JSON or Python) become a header line and
+one `|`-separated line per record instead of repeating the keys, other JSON loses its
+whitespace. When the result is still over the tool's budget, the full output is kept in an
+in-process store and the model gets the beginning and the end of it with a handle that
+`fetch_output` reads further from.
+"""
+import functools
+import inspect
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from agents import function_tool
+
+DEFAULT_MAX_CHARS = 6_000  # About 1500 tokens
+TAIL_CHARS = 300  # End of a cut output kept as well, results often end with IDs and totals
+OUTPUT_STORE_MB = 64
+
+_outputs = OrderedDict()  # handle -> full output
+_outputs_lock = threading.Lock()
+_stats = {}  # tool name -> {"calls", "raw_chars", "shaped_chars", "stored"}
+_stats_lock = threading.Lock()
+
+def _is_records(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str) and not any(ch in value for ch in "|\n"):
+        return value
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+def encode_records(records: list) -> str:
+    """Header line of the keys, then one line of values per record"""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    lines = ["|".join(columns)]
+    lines.extend("|".join(_cell(record.get(column)) for column in columns) for record in records)
+    return "\n".join(lines)
+
+def encode(value) -> str:
+    """Compact text encoding of a tool result"""
+    if isinstance(value, str):
+        stripped = value.strip()
+        if not stripped.startswith(("{", "[")):
+            return value
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            return value
+    if _is_records(value):
+        return encode_records(value)
+    if isinstance(value, dict) and any(_is_records(item) for item in value.values()):
+        parts = []
+        for key, item in value.items():
+            if _is_records(item):
+                parts.append(f"{key}:\n{encode_records(item)}")
+            else:
+                parts.append(f"{key}: {json.dumps(item, separators=(',', ':'), default=str)}")
+        return "\n".join(parts)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), default=str)
+    return value
+
+def store(text: str) -> str:
+    """Keep a full output and return its handle"""
+    handle = f"out_{uuid.uuid4().hex[:8]}"
+    with _outputs_lock:
+        _outputs[handle] = text
+        # Evict the oldest outputs beyond the memory budget, always keeping the new one
+        while len(_outputs) > 1 and sum(len(t) for t in _outputs.values()) > OUTPUT_STORE_MB * 1024 ** 2:
+            _outputs.popitem(last=False)
+    return handle
+
+def shape(tool_name: str, result, max_chars: int = DEFAULT_MAX_CHARS):
+    """Compact encoding of the result, cut to `max_chars` with the full text stored"""
+    if not isinstance(result, (str, dict, list)):
+        return result
+    raw_chars = len(result) if isinstance(result, str) else len(str(result))
+    text = encode(result)
+    stored = len(text) > max_chars
+    if stored:
+        handle = store(text)
+        tail = text[-TAIL_CHARS:] if max_chars > 2 * TAIL_CHARS else ""
+        head = text[:max_chars - len(tail)]
+        text = (
+            f"{head}\n[… output cut: {len(text)} characters in total, stored as handle {handle}. "
+            f"Call fetch_output with this handle and offset={len(head)} to read the rest]\n{tail}"
+        )
+    with _stats_lock:
+        stats = _stats.setdefault(tool_name, {"calls": 0, "raw_chars": 0, "shaped_chars": 0, "stored": 0})
+        stats["calls"] += 1
+        stats["raw_chars"] += raw_chars
+        stats["shaped_chars"] += len(text)
+        stats["stored"] += stored
+    return text
+
+def shape_output(max_chars: int = DEFAULT_MAX_CHARS):
+    """Decorator shaping the output of a tool function, sync or async, see the module docstring"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return shape(func.__name__, await func(*args, **kwargs), max_chars)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return shape(func.__name__, func(*args, **kwargs), max_chars)
+        return wrapper
+    return decorator
+
+def output_stats() -> dict:
+    """Characters returned by each tool before and after shaping, since the process started"""
+    with _stats_lock:
+        return {tool: dict(stats) for tool, stats in _stats.items()}
+
+@function_tool
+def fetch_output(handle: str, offset: int, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """
+    Read part of a tool output that was cut because it was too long.
+
+    Args:
+        handle: Handle given in the cut output, e.g. "out_1a2b3c4d".
+        offset: Position of the first character to read, as given in the cut output.
+        max_chars: Maximum number of characters to return.
+    """
+    with _outputs_lock:
+        text = _outputs.get(handle)
+    if text is None:
+        return f"Unknown or expired handle: {handle}"
+    end = min(offset + max_chars, len(text))
+    more = f" Call again with offset={end} for the rest." if end < len(text) else ""
+    return f"{text[offset:end]}\n[characters {offset}-{end} of {len(text)}.{more}]"
@@ -1,7 +1,17 @@
+import sys
 from agents import function_tool
 from agents import RunContextWrapper
 from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.tools.output import shape_output
+
+def take_confirmation(context: InputData) -> bool:
+    """Whether the user confirmed the action, consuming the confirmation so each write needs its own"""
+    confirmed = context.human_confirmation
+    context.human_confirmation = False
+    return confirmed
+
 @function_tool  
+@shape_output()
 def ask_for_confirmation(wrapper: RunContextWrapper[InputData], text: str) -> str:
     """
     Ask the user for confirmation before taking an action
@@ -12,8 +22,13 @@ def ask_for_confirmation(wrapper: RunContextWrapper[InputData], text: str) -> st
     Returns:
         str: The clarification response from the user.
     """
-    print(f"\n📝 The agent is asking for clarification:\n{text}\n")
-    clarification = input("Your clarification: (yes/no)")
+    if not wrapper.context.interactive:
+        wrapper.context.human_confirmation = False
+        return "no (nobody can confirm in this session, the action must not be taken)"
+    # Prompts go to stderr, stdout may be carrying the output of the run (e.g. `--events -`)
+    print(f"\n📝 The agent is asking for clarification:\n{text}\n", file=sys.stderr)
+    print("Your clarification: (yes/no)", end="", file=sys.stderr, flush=True)
+    clarification = input()
     if clarification.lower() in ["yes"]:
         wrapper.context.human_confirmation = True
     else:
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
@@ -27,6 +28,15 @@ class Settings(BaseSettings):
     LLM_PROVIDER: Optional[str] = None  # Can be "openai" or "groq"
     OPENAI_API_KEY: Optional[str] = None
     GROQ_API_KEY: Optional[str] = None
+    # Model per agent role (sql_analyst, manager, data_scientist, dashboard_analyst, guardrail_agent)
+    # or per step of a role (`<role>.turn`, `<role>.tool_output`), as JSON,
+    # e.g. AGENT_MODELS='{"dashboard_analyst": "gpt-4.1"}'. See cli_data_ai.llm.router
+    AGENT_MODELS: Dict[str, str] = {}
+
+    # Disk cache of model responses, for development and replayed runs (see cli_data_ai.llm.cache)
+    LLM_CACHE: bool = False
+    LLM_CACHE_TTL_SECONDS: int = 24 * 3600
+    LLM_CACHE_PATH: str = ".llm_cache.sqlite"
 
     @field_validator("LLM_PROVIDER")
     @classmethod
@@ -49,10 +59,7 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
-# Create global settings instance
-settings = Settings()
-
-
+@lru_cache(maxsize=None)
 def get_settings() -> Settings:
-    """Return the settings instance."""
-    return settings
\ No newline at end of file
+    """Return the settings instance, created on first use so `--help` works without a .env file."""
+    return Settings()
\ No newline at end of file
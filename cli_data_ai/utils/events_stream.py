@@ -1,64 +1,114 @@
 import asyncio
+import time
 from openai.types.responses import ResponseTextDeltaEvent
 from agents import Agent, ItemHelpers, Runner, function_tool
-import logging 
+import logging
 from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
+from cli_data_ai.utils.renderers import Renderer, default_renderer
 
 console = Console()
 
-async def stream_events(agent, input_question, context, max_turns):
+def to_event(event) -> dict:
+    """Convert an SDK stream event into a plain dict for the renderers, None for ignored events"""
+    match event.type:
+        case "raw_response_event":
+            if isinstance(event.data, ResponseTextDeltaEvent):
+                return {"type": "text_delta", "delta": event.data.delta}
+            return None
+
+        case "agent_updated_stream_event":
+            return {"type": "agent_updated", "agent": event.new_agent.name}
+
+        case "run_item_stream_event":
+            item = event.item
+            match item.type:
+                case "message_output_item":
+                    return {"type": "message_output", "text": ItemHelpers.text_message_output(item)}
+                case "tool_call_item":
+                    raw_call = item.raw_item
+                    return {
+                        "type": "tool_call", "name": raw_call.name, "arguments": raw_call.arguments,
+                        "call_id": getattr(raw_call, "call_id", None),
+                    }
+                case "tool_call_output_item":
+                    raw_output = item.raw_item
+                    call_id = raw_output.get("call_id") if isinstance(raw_output, dict) else getattr(raw_output, "call_id", None)
+                    return {"type": "tool_output", "output": item.output, "call_id": call_id}
+                case "final_output_item":
+                    return {"type": "final_output", "output": item.output}
+                case "planning_start_item":
+                    return {"type": "planning_started"}
+                case "planning_response_item":
+                    return {"type": "plan_selected", "description": str(item.response)}
+                case _:
+                    return {"type": "other", "description": f"Unhandled run_item_stream_event type: {item.type}"}
+
+        case "run_step_stream_event":
+            return {"type": "step", "description": str(event.step)}
+
+        case "tool_start_stream_event":
+            return {"type": "tool_started", "name": event.tool.name}
+
+        case "tool_finish_stream_event":
+            return {"type": "tool_finished", "name": event.tool.name}
+
+        case "agent_finish_stream_event":
+            return {"type": "agent_finished", "agent": event.agent.name}
+
+        case "handoff_event":
+            return {"type": "handoff", "agent": event.handoff.agent.name, "input": str(event.handoff.input)}
+
+        case "error_stream_event":
+            return {"type": "error", "error": str(event.error)}
+
+        case _:
+            return {"type": "other", "description": f"Unknown event type: {event.type} — Raw: {event}"}
+
+def serialize(output):
+    """Structured agent outputs (SQLOutput, MLReport, ...) as dicts, other values unchanged"""
+    if hasattr(output, "model_dump"):
+        return output.model_dump(mode="json")
+    return output
+
+async def stream_events(agent, input_question, context, max_turns, renderer: Renderer = None):
+    """
+    Run the agent in streaming mode and render its events as they arrive.
+
+    Tool outputs carry the `duration_seconds` since the matching tool call, and the run ends
+    with a `result` event holding the final output of the last agent as a dict.
+
+    Args:
+        renderer: Where the events go, see `utils.renderers`. Defaults to rich output on a
+            terminal and plain text otherwise.
+
+    Returns:
+        The final output of the run.
+    """
+    renderer = renderer or default_renderer(console)
+    context.progress_callback = renderer.progress
     result = Runner.run_streamed(agent, input=(input_question), context=context, max_turns=max_turns)
+    started = {}  # call_id -> start time of the tool calls still running
+    start = time.perf_counter()
 
-    async for event in result.stream_events():
-        match event.type:
-            case "raw_response_event":
-                if isinstance(event.data, ResponseTextDeltaEvent):
-                    console.print(event.data.delta, end="")
-
-            case "agent_updated_stream_event":
-                console.print(f"\n🧠 Agent switched to: {event.new_agent.name}")
-
-            case "run_item_stream_event":
-                item = event.item
-                match item.type:
-                    case "message_output_item":
-                        console.print(f"\n📤 Message output:\n{ItemHelpers.text_message_output(item)}\n")
-                    case "tool_call_item":
-                        raw_call = event.item.raw_item
-                        console.print(f"\n🛠️ Tool called: {raw_call.name}")
-                        console.print(f"   Arguments: {raw_call.arguments}")
-                    case "tool_call_output_item":
-                        console.print(Markdown(f"\n✅ Tool output: {item.output}"))
-                    case "final_output_item":
-                        console.print(Markdown(f"\n🏁 Final output:\n{item.output}"))
-                    case "planning_start_item":
-                        console.print(f"\n📍 Planning started...")
-                    case "planning_response_item":
-                        console.print(f"\n🧭 Plan selected: {item.response}")
-                    case _:
-                        console.print(f"\n🔹 Unhandled run_item_stream_event type: {item.type}")
-
-            case "run_step_stream_event":
-                console.print(f"\n🔄 Step: {event.step}")
-
-            case "tool_start_stream_event":
-                console.print(f"\n⚙️ Tool execution started: {event.tool.name}")
-
-            case "tool_finish_stream_event":
-                console.print(f"\n✅ Tool execution finished: {event.tool.name}")
-
-            case "agent_finish_stream_event":
-                console.print(f"\n🚪 Agent '{event.agent.name}' finished its turn")
-
-            case "handoff_event":
-                console.print(f"\n🔁 Handoff to agent: {event.handoff.agent.name} with input: {event.handoff.input}")
-
-            case "error_stream_event":
-                console.print(f"\n❌ Error occurred: {event.error}")
-
-            case _:
-                console.print(f"\n🌀 Unknown event type: {event.type} — Raw: {event}")
-
-    console.print("\n=== ✅ Run complete ===")
\ No newline at end of file
+    try:
+        async for event in result.stream_events():
+            converted = to_event(event)
+            if converted is None:
+                continue
+            if converted["type"] == "tool_call":
+                started[converted["call_id"]] = time.perf_counter()
+            elif converted["type"] == "tool_output" and converted["call_id"] in started:
+                converted["duration_seconds"] = round(time.perf_counter() - started.pop(converted["call_id"]), 3)
+            renderer.handle(converted)
+        renderer.handle({
+            "type": "result",
+            "agent": result.last_agent.name,
+            "output": serialize(result.final_output),
+        })
+        renderer.handle({"type": "run_complete", "duration_seconds": round(time.perf_counter() - start, 3)})
+    except Exception as e:
+        renderer.handle({"type": "error", "error": str(e)})
+        raise
+    finally:
+        renderer.close()
+    return result.final_output
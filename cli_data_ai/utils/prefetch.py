@@ -0,0 +1,81 @@
+"""
+Background warm-up of the interactive session.
+
+As soon as an agent is selected, the setup its first answer would otherwise wait for runs in
+background tasks while the user types the question:
+
+- "schema" / "profile": the schema catalog (`profiler.catalog`) and its search index, which also
+  opens the database and loads its pages in the OS cache.
+- "metabase": the Metabase login, the session token is cached for the dashboard tools.
+- "ml_imports": the data science stack (pandas, scikit-learn, xgboost).
+
+Each step runs in a daemon thread. Failures are ignored, the tools then do the work themselves
+and report the error to the agent.
+"""
+import asyncio
+import logging
+from importlib import import_module
+from cli_data_ai.utils.threads import run_in_daemon_thread
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_STEPS = {
+    "SQL Analyst": ["schema", "profile"],
+    "Data Manager": ["schema", "profile", "metabase"],
+    "Data Scientist": ["ml_imports"],
+}
+ML_MODULES = ["pandas", "sklearn", "xgboost"]
+
+def _schema(context):
+    from cli_data_ai.tools.db.backends import get_backend
+    from cli_data_ai.tools.db.schema_search import schema_index
+    schema_index(get_backend(context))
+
+def _profile(context):
+    from cli_data_ai.tools.db.backends import get_backend
+    from cli_data_ai.tools.db.profiler import catalog
+    catalog(get_backend(context), "profile")
+
+def _metabase(context):
+    from cli_data_ai.tools.dashboard.metabase.tools import metabase_session
+    metabase_session(context.metabase_url, context.metabase_user_name, context.metabase_password)
+
+def _ml_imports(context):
+    for module in ML_MODULES:
+        import_module(module)
+
+STEPS = {
+    "schema": _schema,
+    "profile": _profile,
+    "metabase": _metabase,
+    "ml_imports": _ml_imports,
+}
+
+async def _run(step: str, context):
+    try:
+        await run_in_daemon_thread(STEPS[step], context)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.debug("Prefetch step %s failed: %s", step, e)
+
+def start_prefetch(agent_name: str, context) -> list:
+    """Start the warm-up tasks of the agent on the running loop and return them"""
+    # Profiling reads every table, so it waits for the schema which is needed first
+    async def schema_then_profile():
+        await _run("schema", context)
+        await _run("profile", context)
+
+    steps = PREFETCH_STEPS.get(agent_name, [])
+    tasks = []
+    if "schema" in steps:
+        tasks.append(asyncio.create_task(schema_then_profile() if "profile" in steps else _run("schema", context)))
+    for step in steps:
+        if step not in {"schema", "profile"}:
+            tasks.append(asyncio.create_task(_run(step, context)))
+    return tasks
+
+def cancel_prefetch(tasks: list):
+    """Stop waiting for the warm-up tasks, steps already running finish in their thread"""
+    for task in tasks:
+        task.cancel()
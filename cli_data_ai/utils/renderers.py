@@ -0,0 +1,263 @@
+"""
+Renderers for the events of a streamed agent run.
+
+`stream_events` turns the SDK events into plain dicts (`{"type": "text_delta", "delta": ...}`,
+`{"type": "tool_call", "name": ..., "arguments": ...}`, ...) and hands them to a renderer:
+
+- RichRenderer: terminal output. Text deltas are buffered and drawn by a rich `Live` display
+  at a bounded frame rate instead of one print per token, and large tool outputs are truncated
+  and printed as plain text rather than parsed as Markdown.
+- PlainRenderer: plain text for non-TTY runs (pipes, logs), no styling or live display.
+- JsonlRenderer: one JSON object per line (NDJSON) per event, for programs consuming the run,
+  written to stdout or a Unix socket (see `event_sink`).
+
+This module only depends on rich so the renderers can be benchmarked without the agents SDK.
+"""
+import json
+import socket
+import sys
+import threading
+import time
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.text import Text
+
+REFRESH_PER_SECOND = 8
+MAX_OUTPUT_CHARS = 2_000
+LIVE_TAIL_LINES = 20  # Lines of the streamed message kept on screen while it is being written
+
+def truncate(text: str, max_chars: int = MAX_OUTPUT_CHARS) -> str:
+    text = str(text)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n… [{len(text) - max_chars} more characters]"
+
+def _details(event: dict) -> str:
+    return event.get("description") or event.get("name") or event.get("agent") or ""
+
+def progress_step(done: int, total: int) -> bool:
+    """True roughly every 10% of the work, to throttle progress lines"""
+    return not total or done == total or done * 10 // total != (done - 1) * 10 // total
+
+
+class Renderer:
+    """Dispatches each event to `on_<type>`, unknown types go to `on_other`"""
+
+    def handle(self, event: dict):
+        getattr(self, f"on_{event['type']}", self.on_other)(event)
+
+    def progress(self, stage, done, total, label):
+        """Progress callback for long running tools (see InputData.progress_callback)"""
+        self.handle({"type": "progress", "stage": stage, "done": done, "total": total, "label": label})
+
+    def on_result(self, event: dict):
+        """Final structured output, already shown by the message events when rendering for people"""
+        pass
+
+    def on_other(self, event: dict):
+        pass
+
+    def close(self):
+        pass
+
+
+class RichRenderer(Renderer):
+    def __init__(self, console: Console = None, refresh_per_second: int = REFRESH_PER_SECOND,
+                 max_output_chars: int = MAX_OUTPUT_CHARS):
+        self.console = console or Console()
+        self.refresh_per_second = refresh_per_second
+        self.max_output_chars = max_output_chars
+        self._deltas = []
+        self._lock = threading.Lock()
+        self._live = None
+
+    def _render_tail(self):
+        # Called by the Live refresh thread once per frame, deltas received since the last frame are joined here
+        with self._lock:
+            text = "".join(self._deltas)
+            self._deltas = [text]
+        return Text("\n".join(text.splitlines()[-LIVE_TAIL_LINES:]))
+
+    def _flush_text(self):
+        """End the live display of the current message and print it once in full"""
+        if self._live is None:
+            return
+        self._live.stop()
+        self._live = None
+        self.console.print(Text("".join(self._deltas)))
+        self._deltas = []
+
+    def _print(self, *args, **kwargs):
+        self._flush_text()
+        self.console.print(*args, **kwargs)
+
+    def on_text_delta(self, event: dict):
+        with self._lock:
+            self._deltas.append(event["delta"])
+        if self._live is None:
+            self._live = Live(
+                get_renderable=self._render_tail, console=self.console,
+                refresh_per_second=self.refresh_per_second, transient=True,
+            )
+            self._live.start()
+
+    def on_agent_updated(self, event: dict):
+        self._print(f"\n🧠 Agent switched to: {event['agent']}")
+
+    def on_message_output(self, event: dict):
+        self._print(f"\n📤 Message output:\n{truncate(event['text'], self.max_output_chars)}\n", markup=False)
+
+    def on_tool_call(self, event: dict):
+        self._print(f"\n🛠️ Tool called: {event['name']}")
+        self._print(Text(f"   Arguments: {truncate(event['arguments'], self.max_output_chars)}"))
+
+    def on_tool_output(self, event: dict):
+        duration = f" ({event['duration_seconds']}s)" if "duration_seconds" in event else ""
+        self._print(Text(f"\n✅ Tool output{duration}: {truncate(event['output'], self.max_output_chars)}"))
+
+    def on_final_output(self, event: dict):
+        self._print(Markdown(f"\n🏁 Final output:\n{event['output']}"))
+
+    def on_tool_started(self, event: dict):
+        self._print(f"\n⚙️ Tool execution started: {event['name']}")
+
+    def on_tool_finished(self, event: dict):
+        self._print(f"\n✅ Tool execution finished: {event['name']}")
+
+    def on_agent_finished(self, event: dict):
+        self._print(f"\n🚪 Agent '{event['agent']}' finished its turn")
+
+    def on_planning_started(self, event: dict):
+        self._print("\n📍 Planning started...")
+
+    def on_plan_selected(self, event: dict):
+        self._print(Text(f"\n🧭 Plan selected: {event['description']}"))
+
+    def on_step(self, event: dict):
+        self._print(Text(f"\n🔄 Step: {event['description']}"))
+
+    def on_handoff(self, event: dict):
+        self._print(f"\n🔁 Handoff to agent: {event['agent']}")
+
+    def on_error(self, event: dict):
+        self._print(f"\n❌ Error occurred: {event['error']}")
+
+    def on_progress(self, event: dict):
+        if progress_step(event["done"], event["total"]):
+            self._print(f"   ⏳ {event['stage']}: {event['done']}/{event['total']} ({event['label']})")
+
+    def on_run_complete(self, event: dict):
+        self._print("\n=== ✅ Run complete ===")
+
+    def on_other(self, event: dict):
+        self._print(Text(f"\n🔹 {event['type']}: {_details(event)}"))
+
+    def close(self):
+        self._flush_text()
+
+
+class PlainRenderer(Renderer):
+    """Unstyled text, deltas written as they come and flushed at the end of each message"""
+    def __init__(self, stream=None, max_output_chars: int = MAX_OUTPUT_CHARS):
+        self.stream = stream or sys.stdout
+        self.max_output_chars = max_output_chars
+        self._in_text = False
+
+    def _line(self, line: str):
+        if self._in_text:
+            self.stream.write("\n")
+            self._in_text = False
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def on_text_delta(self, event: dict):
+        self.stream.write(event["delta"])
+        self._in_text = True
+
+    def on_agent_updated(self, event: dict):
+        self._line(f"[agent] {event['agent']}")
+
+    def on_message_output(self, event: dict):
+        self._line(f"[message] {truncate(event['text'], self.max_output_chars)}")
+
+    def on_tool_call(self, event: dict):
+        self._line(f"[tool call] {event['name']} {truncate(event['arguments'], self.max_output_chars)}")
+
+    def on_tool_output(self, event: dict):
+        duration = f" ({event['duration_seconds']}s)" if "duration_seconds" in event else ""
+        self._line(f"[tool output{duration}] {truncate(event['output'], self.max_output_chars)}")
+
+    def on_final_output(self, event: dict):
+        self._line(f"[final output]\n{event['output']}")
+
+    def on_handoff(self, event: dict):
+        self._line(f"[handoff] {event['agent']}")
+
+    def on_error(self, event: dict):
+        self._line(f"[error] {event['error']}")
+
+    def on_progress(self, event: dict):
+        if progress_step(event["done"], event["total"]):
+            self._line(f"[progress] {event['stage']}: {event['done']}/{event['total']} ({event['label']})")
+
+    def on_run_complete(self, event: dict):
+        self._line("[done]")
+
+    def on_other(self, event: dict):
+        self._line(f"[{event['type']}] {_details(event)}")
+
+    def close(self):
+        if self._in_text:
+            self._line("")
+
+
+class JsonlRenderer(Renderer):
+    """
+    One JSON object per line and per event, flushed at every event except text deltas.
+
+    Each event gets `ts` (Unix time) and `seq` (position in the run) fields. Closing the
+    renderer also closes the socket when writing to one.
+    """
+    def __init__(self, stream=None, sock: socket.socket = None):
+        self.stream = stream or sys.stdout
+        self.sock = sock
+        self._seq = 0
+
+    def handle(self, event: dict):
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "ts": round(time.time(), 3), **event}, default=str)
+        self.stream.write(line + "\n")
+        if event["type"] != "text_delta":
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+
+
+RENDERERS = {
+    "rich": RichRenderer,
+    "plain": PlainRenderer,
+    "jsonl": JsonlRenderer,
+}
+
+def event_sink(target: str) -> JsonlRenderer:
+    """
+    NDJSON renderer for `target`: "-" for stdout or "unix:<path>" for a Unix socket that a
+    consumer is listening on.
+    """
+    if target == "-":
+        return JsonlRenderer(sys.stdout)
+    if target.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[len("unix:"):])
+        return JsonlRenderer(sock.makefile("w", encoding="utf-8"), sock=sock)
+    raise ValueError(f"Unsupported event target: {target} (use '-' or 'unix:<path>')")
+
+def default_renderer(console: Console = None) -> Renderer:
+    """Rich output on a terminal, plain text otherwise"""
+    console = console or Console()
+    return RichRenderer(console) if console.is_terminal else PlainRenderer()
@@ -0,0 +1,27 @@
+import asyncio
+import threading
+
+def run_in_daemon_thread(func, *args):
+    """
+    Await a blocking call (prompts, background warm-up) without blocking the event loop. The
+    call runs in a daemon thread so a pending call does not keep the process alive on exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(set_value, value):
+        if not future.done():
+            set_value(value)
+
+    def target():
+        try:
+            outcome = (future.set_result, func(*args))
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(settle, *outcome)
+        except RuntimeError:
+            pass  # The loop was closed in the meantime, nobody is waiting for the result
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
@@ -0,0 +1,31 @@
+import asyncio
+import json
+import pytest
+from agents import RunContextWrapper
+from cli_data_ai.agents.context.context import InputData
+from cli_data_ai.tools.db.backends import SQLiteBackend
+
+@pytest.fixture
+def backend(tmp_path):
+    """SQLite backend on an empty database file of the test's temp directory"""
+    return SQLiteBackend(str(tmp_path / "test"))
+
+@pytest.fixture
+def conn(backend):
+    conn = backend.connect()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def context(backend):
+    return InputData(
+        database_name=backend.database_name, metabase_url="", metabase_user_name="", metabase_password="",
+        interactive=False,
+    )
+
+@pytest.fixture
+def call_tool():
+    """`call_tool(tool, context, **arguments)` invokes a function tool as the agents runner does"""
+    def call(tool, context: InputData, **arguments) -> str:
+        return asyncio.run(tool.on_invoke_tool(RunContextWrapper(context), json.dumps(arguments)))
+    return call
@@ -0,0 +1,54 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from cli_data_ai.tools.ml import evaluation
+from cli_data_ai.tools.ml.evaluation import cross_validate_model, successive_halving, transform_folds
+from cli_data_ai.tools.ml.preprocessing import build_preprocessor, plan_columns
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame({"x1": rng.normal(size=400), "x2": rng.normal(size=400)})
+    y = (X["x1"] + X["x2"] > 0).astype(int).to_numpy()
+    return X, y
+
+def _folds(X, y, cv_folds=4):
+    return transform_folds(X, y, build_preprocessor(plan_columns(X)), "binary", cv_folds)
+
+def test_cross_validation_completes_every_fold(data):
+    result = cross_validate_model("logistic_regression", _folds(*data), "binary", n_jobs=1)
+
+    assert result["folds_completed"] == 4
+    assert not result["timed_out"]
+    assert result["score"] > 0.8
+
+def test_budget_stops_starting_new_waves(data, monkeypatch):
+    fit_fold = evaluation._fit_fold
+    def slow_fit_fold(*args):
+        time.sleep(0.2)
+        return fit_fold(*args)
+    monkeypatch.setattr(evaluation, "_fit_fold", slow_fit_fold)
+
+    result = cross_validate_model("logistic_regression", _folds(*data), "binary", time_budget=0.3, n_jobs=1)
+
+    assert result["folds_completed"] == 1
+    assert result["timed_out"]
+    assert not np.isnan(result["score"])
+
+def test_no_fold_raises(data):
+    with pytest.raises(ValueError):
+        cross_validate_model("logistic_regression", [], "binary", n_jobs=1)
+
+def test_halving_survives_a_rung_that_cannot_be_stratified(data):
+    X, y = data
+    # 6 rows of the rare class: the first rungs' subsamples cannot give each of 5 folds one of them
+    y = np.zeros(len(y), dtype=int)
+    y[:6] = 1
+
+    results = successive_halving(["logistic_regression", "decision_tree", "random_forest"], X, y, "binary",
+                                 build_preprocessor(plan_columns(X)), cv_folds=5, min_rows=50)
+
+    assert not any("error" in result for result in results)
+    survivors = [result for result in results if not result["eliminated"]]
+    assert survivors and all(result["rows"] == 400 for result in survivors)
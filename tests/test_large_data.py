@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cli_data_ai.tools.ml import large_data
+from cli_data_ai.tools.ml.preprocessing import prepare_data
+
+QUERY = "SELECT id, x1, x2, label FROM samples"
+
+@pytest.fixture
+def samples(conn):
+    rng = np.random.RandomState(0)
+    x1, x2 = rng.normal(size=2000), rng.normal(size=2000)
+    conn.execute("CREATE TABLE samples (id INTEGER, x1 REAL, x2 REAL, label INTEGER);")
+    conn.executemany(
+        "INSERT INTO samples VALUES (?, ?, ?, ?);",
+        [(i, float(a), float(b), int(a + b > 0)) for i, (a, b) in enumerate(zip(x1, x2))],
+    )
+    conn.commit()
+    return conn
+
+def _ids(chunks) -> list:
+    return [int(i) for chunk in chunks for i in chunk["id"]]
+
+@pytest.mark.parametrize("by_row, chunk_size", [(True, 300), (False, 100)])
+def test_validation_rows_are_never_trained_on(backend, samples, by_row, chunk_size):
+    training = _ids(large_data._split_chunks(backend, QUERY, chunk_size, by_row, validation=False))
+    validation = _ids(large_data._split_chunks(backend, QUERY, chunk_size, by_row, validation=True))
+
+    assert not set(training) & set(validation)
+    assert sorted(training + validation) == list(range(2000))
+    assert len(validation) == 2000 // large_data.VALIDATION_EVERY
+
+def test_holdout_by_row_below_validation_period():
+    assert large_data._holdout_by_row(4 * 100, chunk_size=100)
+    assert not large_data._holdout_by_row(5 * 100, chunk_size=100)
+
+def test_small_result_is_loaded_without_counting(backend, samples, monkeypatch):
+    def count_rows(cursor, query):
+        raise AssertionError("small results must not be counted")
+    monkeypatch.setattr(large_data, "count_rows", count_rows)
+    monkeypatch.setattr(large_data, "SIZE_PROBE_ROWS", 5000)
+
+    df, info = large_data.load_input(backend, QUERY)
+
+    assert info == {"rows": 2000, "estimated_mb": info["estimated_mb"], "out_of_core": False}
+    assert len(df) == 2000
+    assert df["label"].dtype.kind == "i"
+
+def test_large_result_is_counted_once_and_sampled(backend, samples, monkeypatch):
+    counted = []
+    count_rows = large_data.count_rows
+    monkeypatch.setattr(large_data, "count_rows", lambda cursor, query: counted.append(query) or count_rows(cursor, query))
+    monkeypatch.setattr(large_data, "SAMPLE_ROWS", 500)
+
+    df, info = large_data.load_input(backend, QUERY, memory_budget_mb=0.001)
+
+    assert counted == [QUERY]
+    assert info["rows"] == 2000 and info["out_of_core"]
+    assert len(df) == 500
+
+def _prepared(backend):
+    df, _ = large_data.load_input(backend, QUERY)
+    return prepare_data(df.drop(columns=["id"]), "label", "binary")
+
+def test_external_memory_predicts_up_to_the_best_iteration(backend, samples):
+    pytest.importorskip("xgboost")
+    prepared = _prepared(backend)
+
+    model, score, _ = large_data.train_external_memory(
+        backend, "SELECT x1, x2, label FROM samples", prepared, n_rows=2000, chunk_size=250,
+    )
+
+    assert 0.5 < score <= 1.0
+    best_iteration = model.booster.best_iteration
+    assert best_iteration + 1 < model.booster.num_boosted_rounds()
+    X = np.random.RandomState(1).normal(size=(20, 2))
+    import xgboost
+    expected = model.booster.predict(xgboost.DMatrix(X), iteration_range=(0, best_iteration + 1))
+    np.testing.assert_allclose(model.predict_proba(X)[:, 1], expected)
+
+def test_incremental_training_uses_the_given_row_count(backend, samples, monkeypatch):
+    prepared = _prepared(backend)
+    monkeypatch.setattr(large_data, "count_rows", lambda cursor, query: pytest.fail("rows are counted by load_input"))
+
+    model, score, preprocessor = large_data.train_incremental(
+        backend, "SELECT x1, x2, label FROM samples", prepared, "logistic_regression", n_rows=2000, chunk_size=250,
+    )
+
+    assert score > 0.8
+    assert preprocessor.transform(pd.DataFrame({"x1": [0.0], "x2": [1.0]})).shape == (1, 2)
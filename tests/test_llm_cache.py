@@ -0,0 +1,55 @@
+import asyncio
+from agents import Model, ModelSettings
+from cli_data_ai.llm.cache import CachedModel, ResponseCache
+
+class CountingModel(Model):
+    """Model answering with the number of calls it received"""
+    def __init__(self):
+        self.calls = 0
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                           tracing, *, previous_response_id):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs,
+                              tracing, *, previous_response_id):
+        self.calls += 1
+        for event in ("a", "b"):
+            yield event
+
+def _cached(tmp_path):
+    model = CountingModel()
+    return model, CachedModel("test/model", model, ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60))
+
+def test_positional_and_keyword_calls_share_a_key(tmp_path):
+    model, cached = _cached(tmp_path)
+    positional = asyncio.run(cached.get_response("be brief", "hi", ModelSettings(), [], None, [], "tracing", previous_response_id=None))
+    keywords = asyncio.run(cached.get_response(
+        system_instructions="be brief", input="hi", model_settings=ModelSettings(), tools=[], output_schema=None,
+        handoffs=[], tracing="other tracing", previous_response_id=None,
+    ))
+
+    assert positional == keywords == "answer 1"
+    assert model.calls == 1
+
+def test_different_calls_are_not_shared(tmp_path):
+    model, cached = _cached(tmp_path)
+    arguments = ("be brief", "hi", ModelSettings(), [], None, [], None)
+    asyncio.run(cached.get_response(*arguments, previous_response_id=None))
+    asyncio.run(cached.get_response("be brief", "hello", *arguments[2:], previous_response_id=None))
+    asyncio.run(cached.get_response(*arguments, previous_response_id="resp_1"))
+
+    assert model.calls == 3
+
+def test_streams_are_replayed(tmp_path):
+    model, cached = _cached(tmp_path)
+
+    async def collect():
+        return [event async for event in cached.stream_response(
+            system_instructions=None, input="hi", model_settings=ModelSettings(), tools=[], output_schema=None,
+            handoffs=[], tracing=None, previous_response_id=None,
+        )]
+
+    assert asyncio.run(collect()) == asyncio.run(collect()) == ["a", "b"]
+    assert model.calls == 1
@@ -0,0 +1,100 @@
+import sqlite3
+from cli_data_ai.tools.db.materialize import (
+    MATERIALIZE_AFTER_RUNS, SUMMARY_PREFIX, invalidate_summaries, materialized_query, parse_aggregate_query,
+)
+
+def _create_transactions(conn):
+    conn.execute("CREATE TABLE t (transaction_id INTEGER, currency TEXT, amount REAL);")
+    conn.executemany(
+        "INSERT INTO t VALUES (?, ?, ?);",
+        [(i, "EUR" if i % 2 else "USD", float(i)) for i in range(10)],
+    )
+    conn.commit()
+
+def _run(backend, conn, query: str):
+    """(executed SQL, rows) of the query as sql_query_tool runs it"""
+    executed = materialized_query(backend, conn, query)
+    return executed, conn.execute(executed).fetchall()
+
+def _run_until_served(backend, conn, query: str):
+    for _ in range(MATERIALIZE_AFTER_RUNS):
+        executed, rows = _run(backend, conn, query)
+    return executed, rows
+
+def test_repeated_query_is_served_from_summary(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, SUM(amount) AS total FROM t GROUP BY currency ORDER BY total DESC LIMIT 5"
+    expected = conn.execute(query).fetchall()
+
+    for _ in range(MATERIALIZE_AFTER_RUNS - 1):
+        executed, rows = _run(backend, conn, query)
+        assert executed == query
+    executed, rows = _run(backend, conn, query)
+
+    assert executed.startswith(f"SELECT * FROM {SUMMARY_PREFIX}")
+    assert rows == expected
+
+def test_tail_with_expressions_keeps_the_original_query(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, SUM(amount) AS amount FROM t GROUP BY currency ORDER BY SUM(amount) DESC"
+
+    executed, rows = _run_until_served(backend, conn, query)
+    executed, rows = _run(backend, conn, query)
+
+    assert executed == query
+    assert rows == [("EUR", 25.0), ("USD", 20.0)]
+
+def test_positional_tail_is_served_from_summary(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, COUNT(*) FROM t GROUP BY currency ORDER BY 2 DESC, 1"
+
+    executed, rows = _run_until_served(backend, conn, query)
+
+    assert executed.startswith(f"SELECT * FROM {SUMMARY_PREFIX}")
+    assert rows == conn.execute(query).fetchall()
+
+def test_appends_from_another_connection_are_merged(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, SUM(amount) AS total, COUNT(*) AS n FROM t GROUP BY currency"
+    _run_until_served(backend, conn, query)
+
+    other = sqlite3.connect(backend.path)
+    other.execute("INSERT INTO t VALUES (100, 'EUR', 1000.0), (101, 'GBP', 5.0);")
+    other.commit()
+    other.close()
+
+    executed, rows = _run(backend, conn, query)
+    assert executed.startswith(f"SELECT * FROM {SUMMARY_PREFIX}")
+    assert sorted(rows) == [("EUR", 1025.0, 6), ("GBP", 5.0, 1), ("USD", 20.0, 5)]
+
+def test_in_place_update_after_invalidation_is_recomputed(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, SUM(amount) AS total FROM t GROUP BY currency"
+    _run_until_served(backend, conn, query)
+
+    # An update together with an append moves the high-water mark: only the invalidation
+    # keeps the update from being merged as new rows
+    conn.execute("UPDATE t SET amount = 0 WHERE currency = 'USD';")
+    conn.execute("INSERT INTO t VALUES (100, 'EUR', 1.0);")
+    conn.commit()
+    invalidate_summaries(backend, conn, ["t"])
+
+    _, rows = _run(backend, conn, query)
+    assert sorted(rows) == [("EUR", 26.0), ("USD", 0.0)]
+
+def test_subquery_is_recomputed_in_full(backend, conn):
+    _create_transactions(conn)
+    query = "SELECT currency, SUM(amount) AS total FROM t WHERE amount > (SELECT AVG(amount) FROM t) GROUP BY currency"
+    assert not parse_aggregate_query(query)["incremental"]
+    _run_until_served(backend, conn, query)
+
+    conn.execute("INSERT INTO t VALUES (100, 'EUR', 100.0);")
+    conn.commit()
+
+    _, rows = _run(backend, conn, query)
+    assert sorted(rows) == sorted(conn.execute(query).fetchall())
+
+def test_comma_join_is_not_incremental():
+    spec = parse_aggregate_query("SELECT a.x, SUM(b.y) FROM a, b WHERE a.id = b.id GROUP BY a.x")
+    assert spec["sources"] == ["a", "b"]
+    assert not spec["incremental"]
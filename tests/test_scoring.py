@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from cli_data_ai.tools.db.sqlite.tools import undo_last_change
+from cli_data_ai.tools.ml.preprocessing import prepare_data
+from cli_data_ai.tools.ml.tools import score_table
+
+@pytest.fixture
+def selected_model(context, conn):
+    """Context holding a logistic regression selected as best model, trained on `payments`"""
+    conn.execute("CREATE TABLE payments (payment_id INTEGER, amount REAL, fraud TEXT);")
+    conn.executemany(
+        "INSERT INTO payments VALUES (?, ?, ?);",
+        [(i, float(i), "yes" if i >= 60 else "no") for i in range(100)],
+    )
+    conn.commit()
+    df = pd.read_sql("SELECT amount, fraud FROM payments;", conn)
+    prepared = prepare_data(df, "fraud", "binary")
+    context.trained_model = LogisticRegression().fit(prepared.X_train, prepared.y_train)
+    context.best_model_type = "logistic_regression"
+    context.model_artifacts = {"logistic_regression": prepared.artifact()}
+    return context
+
+def _tables(conn) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+
+def test_scores_are_written_and_undoable(selected_model, conn, call_tool):
+    selected_model.human_confirmation = True
+    result = call_tool(score_table, selected_model, query="SELECT payment_id, amount FROM payments",
+                       output_table="fraud_scores", key_columns=["payment_id"])
+
+    assert "Scored 100 rows" in result
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(fraud_scores);")]
+    assert columns == ["payment_id", "prediction", "probability_no", "probability_yes"]
+    assert conn.execute("SELECT COUNT(*) FROM fraud_scores;").fetchone()[0] == 100
+    assert selected_model.human_confirmation is False
+
+    selected_model.human_confirmation = True
+    assert "Undone score_table" in call_tool(undo_last_change, selected_model)
+    assert "fraud_scores" not in _tables(conn)
+
+def test_failed_scoring_leaves_no_table(selected_model, conn, call_tool):
+    selected_model.human_confirmation = True
+    result = call_tool(score_table, selected_model, query="SELECT payment_id FROM payments",
+                       output_table="fraud_scores", key_columns=["payment_id"])
+
+    assert "no table was created" in result
+    assert "fraud_scores" not in _tables(conn)
+
+@pytest.mark.parametrize("output_table, query", [
+    ("_cli_mv_registry", "SELECT payment_id, amount FROM payments"),
+    ("fraud_scores", "SELECT * FROM _cli_ml_registry"),
+])
+def test_internal_tables_are_rejected(selected_model, conn, call_tool, output_table, query):
+    selected_model.human_confirmation = True
+    result = call_tool(score_table, selected_model, query=query, output_table=output_table, key_columns=["payment_id"])
+
+    assert "managed by the CLI" in result
+    assert _tables(conn) == {"payments"}
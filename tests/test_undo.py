@@ -0,0 +1,110 @@
+import pytest
+from cli_data_ai.tools.db.undo import UNDO_MAX_CHANGES, ChangeRecorder, last_change, undo_last_change
+
+def _create_people(conn):
+    conn.executescript(
+        """
+        CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        CREATE INDEX people_name ON people (name);
+        CREATE TRIGGER people_audit AFTER INSERT ON people BEGIN SELECT 1; END;
+        CREATE TABLE orders (id INTEGER, person_id INTEGER REFERENCES people (id));
+        CREATE VIEW adults AS SELECT * FROM people WHERE age >= 18;
+        INSERT INTO people (name, age) VALUES ('ann', 30), ('bob', 12), ('cid', 45);
+        """
+    )
+    conn.commit()
+
+def _write(backend, conn, tool: str, statement: str):
+    recorder = ChangeRecorder(backend, conn, tool)
+    cursor = conn.cursor()
+    recorder.before(cursor, statement)
+    cursor.execute(statement)
+    conn.commit()
+    recorder.save()
+
+def _drop(backend, conn, table: str):
+    recorder = ChangeRecorder(backend, conn, "drop_table")
+    recorder.drop(conn.cursor(), table)
+    conn.commit()
+    recorder.save()
+
+def _schema(conn, table: str) -> list:
+    return conn.execute("SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? ORDER BY name;", (table,)).fetchall()
+
+def _people(backend) -> list:
+    conn = backend.connect()
+    try:
+        return conn.execute("SELECT id, name, age FROM people ORDER BY id;").fetchall()
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("statement", [
+    "UPDATE people SET age = age + 1 WHERE name <> 'bob'",
+    "DELETE FROM people WHERE age > 20",
+    "INSERT INTO people (name, age) VALUES ('dan', 50)",
+    "UPDATE people SET age = 0",
+])
+def test_undo_restores_rows(backend, conn, statement):
+    _create_people(conn)
+    before = _people(backend)
+
+    _write(backend, conn, "write", statement)
+    assert _people(backend) != before
+
+    assert undo_last_change(backend).startswith("Undone")
+    assert _people(backend) == before
+    assert last_change(backend) is None
+
+def test_undo_create_drops_the_table(backend, conn):
+    _write(backend, conn, "create_table", "CREATE TABLE scores AS SELECT 1 AS score")
+
+    undo_last_change(backend)
+
+    assert _schema(conn, "scores") == []
+
+def test_drop_really_drops_and_keeps_references(backend, conn):
+    _create_people(conn)
+    orders_sql = _schema(conn, "orders")
+    view_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'adults';").fetchone()
+
+    _drop(backend, conn, "people")
+
+    assert _schema(conn, "people") == []
+    # A rename would have pointed these at the shadow table
+    assert _schema(conn, "orders") == orders_sql
+    assert conn.execute("SELECT sql FROM sqlite_master WHERE name = 'adults';").fetchone() == view_sql
+
+def test_undo_drop_restores_table_indexes_and_triggers(backend, conn):
+    _create_people(conn)
+    schema = _schema(conn, "people")
+    before = _people(backend)
+
+    _drop(backend, conn, "people")
+    undo_last_change(backend)
+
+    assert _schema(conn, "people") == schema
+    assert _people(backend) == before
+    assert conn.execute("SELECT COUNT(*) FROM adults;").fetchone()[0] == 2
+
+def test_table_recreated_after_drop_is_referenced_once_snapshots_expire(backend, conn):
+    _create_people(conn)
+    _drop(backend, conn, "people")
+    conn.execute("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);")
+    conn.execute("INSERT INTO people (name, age) VALUES ('eve', 20);")
+    conn.commit()
+
+    # Expire the drop's snapshot
+    for i in range(UNDO_MAX_CHANGES):
+        _write(backend, conn, "insert_record", f"INSERT INTO people (name, age) VALUES ('p{i}', 1)")
+
+    assert conn.execute("SELECT name FROM adults;").fetchall() == [("eve",)]
+    assert "people" in _schema(conn, "orders")[0][2]
+
+def test_undo_drop_refuses_to_overwrite_a_new_table(backend, conn):
+    _create_people(conn)
+    _drop(backend, conn, "people")
+    conn.execute("CREATE TABLE people (id INTEGER);")
+    conn.commit()
+
+    with pytest.raises(ValueError, match="exists again"):
+        undo_last_change(backend)
@@ -0,0 +1,79 @@
+import pytest
+from cli_data_ai.tools.db.sqlite.tools import (
+    delete_records, drop_table, execute_many, execute_write_batch, insert_record, sql_query_tool, undo_last_change,
+    update_records,
+)
+
+@pytest.fixture
+def accounts(conn):
+    conn.execute("CREATE TABLE accounts (id INTEGER PRIMARY KEY, owner TEXT, balance REAL);")
+    conn.executemany("INSERT INTO accounts (owner, balance) VALUES (?, ?);", [("ann", 100.0), ("bob", 50.0)])
+    conn.commit()
+    return conn
+
+def _balances(conn) -> list:
+    return conn.execute("SELECT owner, balance FROM accounts ORDER BY id;").fetchall()
+
+def test_batch_is_rolled_back_when_a_statement_fails(context, accounts, call_tool):
+    context.human_confirmation = True
+    result = call_tool(execute_write_batch, context, dry_run=False, statements=[
+        "UPDATE accounts SET balance = balance - 10 WHERE owner = 'ann'",
+        "UPDATE missing_table SET balance = 0",
+    ])
+
+    assert "no changes were applied" in result
+    assert _balances(accounts) == [("ann", 100.0), ("bob", 50.0)]
+
+def test_batch_is_committed_and_undoable(context, accounts, call_tool):
+    context.human_confirmation = True
+    result = call_tool(execute_write_batch, context, dry_run=False, statements=[
+        "UPDATE accounts SET balance = balance - 10 WHERE owner = 'ann'",
+        "UPDATE accounts SET balance = balance + 10 WHERE owner = 'bob'",
+    ])
+
+    assert "committed" in result
+    assert _balances(accounts) == [("ann", 90.0), ("bob", 60.0)]
+
+    context.human_confirmation = True
+    call_tool(undo_last_change, context)
+    assert _balances(accounts) == [("ann", 100.0), ("bob", 50.0)]
+
+def test_dry_run_reports_counts_and_changes_nothing(context, accounts, call_tool):
+    result = call_tool(execute_many, context, dry_run=True,
+                       statement="INSERT INTO accounts (owner, balance) VALUES (?, ?)",
+                       rows_json='[["cid", 1], ["dan", 2]]')
+
+    assert "Dry run" in result
+    assert len(_balances(accounts)) == 2
+
+@pytest.mark.parametrize("tool, arguments", [
+    (update_records, {"update_query": "UPDATE accounts SET balance = 0 WHERE owner = 'ann'"}),
+    (insert_record, {"insert_query": "INSERT INTO accounts (owner, balance) VALUES ('cid', 1)"}),
+    (delete_records, {"delete_query": "DELETE FROM accounts WHERE owner = 'bob'"}),
+    (execute_write_batch, {"statements": ["DELETE FROM accounts WHERE owner = 'bob'"], "dry_run": False}),
+])
+def test_every_write_consumes_the_confirmation(context, accounts, tool, arguments, call_tool):
+    context.human_confirmation = True
+    assert "✅" in call_tool(tool, context, **arguments)
+    assert context.human_confirmation is False
+
+    before = _balances(accounts)
+    assert "confirmation required" in call_tool(tool, context, **arguments)
+    assert _balances(accounts) == before
+
+def test_internal_tables_cannot_be_changed(context, accounts, call_tool):
+    context.human_confirmation = True
+    assert "managed by the CLI" in call_tool(drop_table, context, table_name="_cli_mv_registry")
+    assert "managed by the CLI" in call_tool(sql_query_tool, context, query="SELECT * FROM _cli_mv_query_log")
+
+@pytest.mark.parametrize("statement", [
+    "DROP TABLE accounts",
+    "CREATE TABLE copy AS SELECT * FROM accounts",
+    "DELETE FROM accounts",
+])
+def test_sql_query_tool_cannot_write(context, accounts, statement, call_tool):
+    result = call_tool(sql_query_tool, context, query=statement)
+
+    assert result.startswith("Error executing query")
+    assert _balances(accounts) == [("ann", 100.0), ("bob", 50.0)]
+    assert accounts.execute("SELECT name FROM sqlite_master WHERE name = 'copy';").fetchone() is None